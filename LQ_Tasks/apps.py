@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class LqTasksConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'LQ_Tasks'
+
+    def ready(self):
+        import LQ_Tasks.signals
@@ -0,0 +1,174 @@
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from django.http.response import HttpResponseBase
+from django.views import View
+from rest_framework import filters
+from rest_framework.exceptions import APIException, NotAuthenticated, NotFound
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from accounts.authentication import StatelessJWTAuthentication
+from .models import Task, SubTask
+from .pagination import KeysetPagination
+from .serializers import TaskSerializer, SubTaskSerializer, NoteSerializer
+from .stats import auser_statistics
+from . import events
+from .views import TaskViewSet, note_queryset, plan_task_queryset
+
+
+async def authenticate(request):
+    # Tokens are checked inline since that is pure CPU, session users come
+    # from the async session API, and any other scheme runs the configured
+    # DRF authenticators in a worker thread
+    drf_request = Request(
+        request, authenticators=[authenticator() for authenticator in api_settings.DEFAULT_AUTHENTICATION_CLASSES],
+    )
+    for authenticator in drf_request.authenticators:
+        if isinstance(authenticator, StatelessJWTAuthentication):
+            result = authenticator.authenticate(drf_request)
+            if result is not None:
+                return result[0]
+    user = await request.auser()
+    if user.is_authenticated:
+        return user
+    return await sync_to_async(lambda: drf_request.user)()
+
+
+class AsyncAPIView(View):
+    """
+    Read-only endpoint served natively under ASGI: authentication, queries
+    and rendering never hold a request thread. Handlers return plain data,
+    which is rendered exactly like the DRF views render it. Writes stay on
+    the DRF viewsets.
+    """
+    http_method_names = ['get']
+    renderer = JSONRenderer()
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            user = await authenticate(request)
+            if not user.is_authenticated:
+                raise NotAuthenticated()
+            request.user = user
+            data = await super().dispatch(request, *args, **kwargs)
+        except APIException as exc:
+            return self.render({'detail': exc.detail}, exc.status_code)
+        if isinstance(data, HttpResponseBase):
+            return data
+        return self.render(data)
+
+    def render(self, data, status=200):
+        return HttpResponse(self.renderer.render(data), content_type='application/json', status=status)
+
+    async def paginate(self, queryset):
+        paginator = KeysetPagination()
+        request = Request(self.request)
+        rows = await paginator.apaginate_queryset(queryset, request, view=self)
+        return paginator, rows
+
+    @staticmethod
+    async def get_or_404(queryset):
+        instance = await queryset.afirst()
+        if instance is None:
+            raise NotFound()
+        return instance
+
+
+class AsyncTaskListView(AsyncAPIView):
+    filter_backends = [filters.OrderingFilter]
+    ordering_fields = TaskViewSet.ordering_fields
+    ordering = TaskViewSet.ordering
+
+    async def get(self, request):
+        paginator, tasks = await self.paginate(plan_task_queryset(Task.objects.filter(user=request.user)))
+        return paginator.get_paginated_response(TaskSerializer(tasks, many=True).data).data
+
+
+class AsyncTaskDetailView(AsyncAPIView):
+    async def get(self, request, pk):
+        task = await self.get_or_404(plan_task_queryset(Task.objects.filter(user=request.user, pk=pk)))
+        return TaskSerializer(task).data
+
+
+class AsyncHighPriorityView(AsyncAPIView):
+    async def get(self, request):
+        queryset = plan_task_queryset(Task.objects.filter(user=request.user, priority__gte=7))
+        tasks = [task async for task in queryset.aiterator(chunk_size=2000)]
+        return TaskSerializer(tasks, many=True).data
+
+
+class AsyncTaskStatsView(AsyncAPIView):
+    async def get(self, request):
+        return await auser_statistics(request.user)
+
+
+class AsyncTaskSubtasksView(AsyncAPIView):
+    async def get(self, request, pk):
+        if not await Task.objects.filter(user=request.user, pk=pk).acount():
+            raise NotFound()
+        subtasks = [subtask async for subtask in SubTask.objects.filter(task_id=pk).aiterator()]
+        return SubTaskSerializer(subtasks, many=True).data
+
+
+class AsyncSubTaskDetailView(AsyncAPIView):
+    async def get(self, request, task_pk, pk):
+        queryset = SubTask.objects.filter(task__user=request.user, task_id=task_pk, pk=pk)
+        return SubTaskSerializer(await self.get_or_404(queryset)).data
+
+
+async def anote_queryset(user, task_pk, subtask_pk):
+    # Built in a thread: the content type lookup queries on a cold cache
+    return await sync_to_async(note_queryset)(user, task_pk, subtask_pk)
+
+
+class AsyncNoteListView(AsyncAPIView):
+    async def get(self, request, task_pk, subtask_pk=None):
+        paginator, notes = await self.paginate(await anote_queryset(request.user, task_pk, subtask_pk))
+        return paginator.get_paginated_response(NoteSerializer(notes, many=True).data).data
+
+
+class AsyncNoteDetailView(AsyncAPIView):
+    async def get(self, request, task_pk, pk, subtask_pk=None):
+        note = await self.get_or_404((await anote_queryset(request.user, task_pk, subtask_pk)).filter(pk=pk))
+        return NoteSerializer(note).data
+
+
+class EventStreamView(AsyncAPIView):
+    """
+    Server-sent events for the user's task, subtask and note changes. Each
+    `change` event carries the object, whether it was deleted and a sync
+    token (also the event id), so a reconnecting client catches up through
+    /api/sync/?since=<last id>. A `resync` event means the client fell too
+    far behind and should sync from its last token. Needs ASGI: each stream
+    is a coroutine waiting on the broker, not a thread.
+    """
+
+    async def get(self, request):
+        response = StreamingHttpResponse(self.stream(request.user.pk), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    async def stream(self, user_id):
+        broker = events.get_broker()
+        subscription = broker.subscribe(user_id)
+        heartbeat = getattr(settings, 'TASK_EVENTS_HEARTBEAT', 15)
+        try:
+            yield 'retry: 5000\n\n'
+            while True:
+                batch = await subscription.get(heartbeat)
+                if batch is None:
+                    yield 'event: resync\ndata: {}\n\n'
+                elif not batch:
+                    # Keeps proxies from closing an idle connection
+                    yield ': ping\n\n'
+                else:
+                    yield ''.join(
+                        f'event: change\nid: {event["token"]}\ndata: {json.dumps(event)}\n\n' for event in batch
+                    )
+        finally:
+            broker.unsubscribe(subscription)
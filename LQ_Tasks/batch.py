@@ -0,0 +1,219 @@
+from itertools import chain
+
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import status
+
+from .models import Task, SubTask
+from .priorities import propagate_priorities
+from .serializers import TaskSerializer, SubTaskSerializer
+from .signals import bulk_saved
+
+
+OPERATIONS = ('create', 'update', 'delete')
+MODELS = {
+    'task': (Task, TaskSerializer),
+    'subtask': (SubTask, SubTaskSerializer),
+}
+
+
+class BatchError(Exception):
+    def __init__(self, status_code, errors):
+        super().__init__(errors)
+        self.status_code = status_code
+        self.errors = errors
+
+
+class TaskBatch:
+    """
+    Applies a list of create/update/delete operations on the user's tasks and
+    subtasks. Every operation is validated first; rows are written only when
+    the whole batch is valid, inside one transaction and with bulk queries.
+
+    An operation looks like {"op": "update", "model": "task", "id": 1, "data": {...}}.
+    Subtasks can only reference tasks that already exist.
+    """
+
+    def __init__(self, user, operations):
+        self.user = user
+        self.operations = operations
+        self.results = []
+        self.tasks = {}
+        self.subtasks = {}
+        self.created = {'task': [], 'subtask': []}
+        self.updated = {'task': {}, 'subtask': {}}
+        self.deleted = {'task': set(), 'subtask': set()}
+
+    @property
+    def is_valid(self):
+        return all(result['status'] < 400 for result in self.results)
+
+    def run(self):
+        self.preload()
+        for index, operation in enumerate(self.operations):
+            try:
+                result = self.prepare(operation)
+            except BatchError as error:
+                result = {'status': error.status_code, 'errors': error.errors}
+            self.results.append({'index': index, **result})
+        if self.is_valid:
+            self.apply()
+        for result in self.results:
+            # Rows created by a batch that was rejected have no id
+            instance = result.pop('instance', None)
+            if instance is not None and instance.id is not None:
+                result['id'] = instance.id
+        return self.results
+
+    def preload(self):
+        # Two queries fetch every task and subtask the batch may touch
+        task_ids, subtask_ids = set(), set()
+        for operation in self.operations:
+            if not isinstance(operation, dict):
+                continue
+            data = operation.get('data')
+            if operation.get('model') == 'task' and operation.get('id') is not None:
+                task_ids.add(operation['id'])
+            elif operation.get('model') == 'subtask':
+                if operation.get('id') is not None:
+                    subtask_ids.add(operation['id'])
+                if isinstance(data, dict) and data.get('task') is not None:
+                    task_ids.add(data['task'])
+
+        subtasks = SubTask.objects.filter(id__in=self._ids(subtask_ids), task__user=self.user).select_related('task')
+        for subtask in subtasks:
+            # Keep one instance per task so in-batch updates are seen by subtasks
+            task_ids.discard(subtask.task_id)
+            subtask.task = self.tasks.setdefault(subtask.task_id, subtask.task)
+            self.subtasks[subtask.id] = subtask
+        for task in Task.objects.filter(id__in=self._ids(task_ids), user=self.user):
+            self.tasks.setdefault(task.id, task)
+
+    @staticmethod
+    def _ids(values):
+        ids = []
+        for value in values:
+            try:
+                ids.append(int(value))
+            except (TypeError, ValueError):
+                pass
+        return ids
+
+    def prepare(self, operation):
+        if not isinstance(operation, dict):
+            raise BatchError(status.HTTP_400_BAD_REQUEST, {'non_field_errors': ['Expected an object.']})
+        op, model = operation.get('op'), operation.get('model')
+        if op not in OPERATIONS:
+            raise BatchError(status.HTTP_400_BAD_REQUEST, {'op': [f'Must be one of {", ".join(OPERATIONS)}.']})
+        if model not in MODELS:
+            raise BatchError(status.HTTP_400_BAD_REQUEST, {'model': [f'Must be one of {", ".join(MODELS)}.']})
+        return getattr(self, f'{op}_{model}')(operation)
+
+    def get_instance(self, model, operation):
+        objects = self.tasks if model == 'task' else self.subtasks
+        try:
+            instance = objects[int(operation.get('id'))]
+        except (KeyError, TypeError, ValueError):
+            raise BatchError(status.HTTP_404_NOT_FOUND, {'detail': 'Not found.'})
+        if instance.id in self.deleted[model]:
+            raise BatchError(status.HTTP_404_NOT_FOUND, {'detail': 'Deleted earlier in this batch.'})
+        return instance
+
+    def validate(self, model, operation, instance=None):
+        serializer_class = MODELS[model][1]
+        data = operation.get('data')
+        if not isinstance(data, dict):
+            raise BatchError(status.HTTP_400_BAD_REQUEST, {'data': ['Expected an object.']})
+        serializer = serializer_class(
+            instance, data=data, partial=instance is not None, context={'preloaded': self.tasks},
+        )
+        if not serializer.is_valid():
+            raise BatchError(status.HTTP_400_BAD_REQUEST, serializer.errors)
+        return serializer.validated_data
+
+    def check_parent(self, task):
+        if task.user_id != self.user.id:
+            raise BatchError(status.HTTP_403_FORBIDDEN, {'detail': 'You do not have permission to use this task.'})
+        if task.id in self.deleted['task']:
+            raise BatchError(status.HTTP_400_BAD_REQUEST, {'task': ['Deleted earlier in this batch.']})
+
+    def create_task(self, operation):
+        task = Task(user=self.user, **self.validate('task', operation))
+        self.created['task'].append(task)
+        return {'status': status.HTTP_201_CREATED, 'instance': task}
+
+    def update_task(self, operation):
+        task = self.get_instance('task', operation)
+        validated_data = self.validate('task', operation, task)
+        for field, value in validated_data.items():
+            setattr(task, field, value)
+        self.updated['task'].setdefault(task.id, (task, set()))[1].update(validated_data)
+        return {'status': status.HTTP_200_OK, 'id': task.id}
+
+    def delete_task(self, operation):
+        task = self.get_instance('task', operation)
+        if task.status != 'COMPLETED':
+            raise BatchError(status.HTTP_403_FORBIDDEN, {'detail': 'You can only delete task that are completed.'})
+        # Subtasks are written after tasks are deleted, so none may still point here
+        kept = chain(
+            self.created['subtask'],
+            (subtask for pk, (subtask, _) in self.updated['subtask'].items() if pk not in self.deleted['subtask']),
+        )
+        if any(subtask.task_id == task.id for subtask in kept):
+            raise BatchError(status.HTTP_400_BAD_REQUEST, {'detail': 'Has subtasks written earlier in this batch.'})
+        self.deleted['task'].add(task.id)
+        return {'status': status.HTTP_204_NO_CONTENT, 'id': task.id}
+
+    def create_subtask(self, operation):
+        validated_data = self.validate('subtask', operation)
+        self.check_parent(validated_data['task'])
+        subtask = SubTask(**validated_data)
+        self.created['subtask'].append(subtask)
+        return {'status': status.HTTP_201_CREATED, 'instance': subtask}
+
+    def update_subtask(self, operation):
+        subtask = self.get_instance('subtask', operation)
+        validated_data = self.validate('subtask', operation, subtask)
+        if 'task' in validated_data:
+            self.check_parent(validated_data['task'])
+        for field, value in validated_data.items():
+            setattr(subtask, field, value)
+        self.updated['subtask'].setdefault(subtask.id, (subtask, {'priority'}))[1].update(validated_data)
+        return {'status': status.HTTP_200_OK, 'id': subtask.id}
+
+    def delete_subtask(self, operation):
+        subtask = self.get_instance('subtask', operation)
+        self.deleted['subtask'].add(subtask.id)
+        return {'status': status.HTTP_204_NO_CONTENT, 'id': subtask.id}
+
+    @transaction.atomic
+    def apply(self):
+        # Subtask priorities follow their parent as the whole batch leaves it
+        for subtask in chain(self.created['subtask'], (subtask for subtask, _ in self.updated['subtask'].values())):
+            subtask.priority = SubTask.derive_priority(subtask.task.priority)
+        reprioritized = []
+        for model in ('task', 'subtask'):
+            model_class = MODELS[model][0]
+            if self.created[model]:
+                model_class.objects.bulk_create(self.created[model])
+                bulk_saved.send(sender=model_class, instances=self.created[model], created=True)
+            updated = [
+                (instance, fields) for pk, (instance, fields) in self.updated[model].items()
+                if pk not in self.deleted[model]
+            ]
+            if updated:
+                # bulk_update skips auto_now, so the timestamp is set here
+                fields = set().union(*(fields for _, fields in updated), {'updated_at'})
+                instances = [instance for instance, _ in updated]
+                now = timezone.now()
+                for instance in instances:
+                    instance.updated_at = now
+                model_class.objects.bulk_update(instances, sorted(fields))
+                bulk_saved.send(sender=model_class, instances=instances, created=False)
+                if model == 'task':
+                    reprioritized = [task for task, fields in updated if 'priority' in fields]
+            if self.deleted[model]:
+                model_class.objects.filter(id__in=self.deleted[model]).delete()
+        if reprioritized:
+            # Runs last: subtasks written above already match and are skipped
+            propagate_priorities(reprioritized)
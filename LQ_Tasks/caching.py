@@ -0,0 +1,113 @@
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags
+
+
+VERSION_KEY = 'lq:version:{user_id}'
+RESPONSE_KEY = 'lq:response:{user_id}:{etag}'
+PIN_KEY = 'lq:primary:{user_id}'
+
+
+def get_cache():
+    # Any Django cache alias works; it has to be shared between processes
+    # (memcached, redis, file) when more than one worker serves the API
+    return caches[getattr(settings, 'TASKS_RESPONSE_CACHE', 'default')]
+
+
+def get_version(user_id):
+    """
+    Returns the user's data version. A missing counter starts from the
+    current time in milliseconds, so it never goes back to a value an old
+    ETag was built from after the cache loses it.
+    """
+    cache = get_cache()
+    key = VERSION_KEY.format(user_id=user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, int(time.time() * 1000), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def pin_user(user_id):
+    # Shared cache, so the user's next requests read the primary whichever
+    # worker serves them
+    get_cache().set(PIN_KEY.format(user_id=user_id), True, timeout=getattr(settings, 'REPLICA_PIN_SECONDS', 5))
+
+
+def is_pinned(user_id):
+    return get_cache().get(PIN_KEY.format(user_id=user_id)) is not None
+
+
+def bump_versions(user_ids):
+    cache = get_cache()
+    # Any write, in a request or not, keeps the user on the primary until the
+    # replicas have it; otherwise a stale replica page would be cached under
+    # the new version. The bump on commit restarts the pin from the commit.
+    pin = bool(getattr(settings, 'DATABASE_REPLICAS', []))
+    for user_id in set(user_ids):
+        if user_id is None:
+            continue
+        if pin:
+            pin_user(user_id)
+        try:
+            cache.incr(VERSION_KEY.format(user_id=user_id))
+        except ValueError:
+            # Nothing was cached for this user yet
+            pass
+
+
+def invalidate(user_ids):
+    # Bump now so this request sees its own write, and again on commit so a
+    # response cached by another request before the commit is not reused
+    user_ids = list(user_ids)
+    bump_versions(user_ids)
+    transaction.on_commit(lambda: bump_versions(user_ids))
+
+
+def response_etag(request, version):
+    # Scheme and host are part of the variant: pagination links are absolute
+    variant = f'{request.user.pk}\n{request.build_absolute_uri()}\n{request.headers.get("Accept", "")}'
+    return f'"{version}-{hashlib.sha1(variant.encode()).hexdigest()[:16]}"'
+
+
+def cached_response(view_method):
+    """
+    Caches a GET handler's rendered response per user and data version, and
+    answers If-None-Match with 304 before the handler or any serializer runs.
+    Responses are only reused while the user's version is unchanged.
+    If-None-Match: * only gets a 304 once the handler found the resource.
+    """
+    @wraps(view_method)
+    def wrapper(view, request, *args, **kwargs):
+        if request.method != 'GET':
+            return view_method(view, request, *args, **kwargs)
+        etag = response_etag(request, get_version(request.user.pk))
+        if_none_match = parse_etags(request.headers.get('If-None-Match', ''))
+        if etag in if_none_match:
+            return HttpResponseNotModified(headers={'ETag': etag})
+
+        cache = get_cache()
+        key = RESPONSE_KEY.format(user_id=request.user.pk, etag=etag)
+        cached = cache.get(key)
+        if cached is not None:
+            content, content_type = cached
+            response = HttpResponse(content, content_type=content_type, headers={'ETag': etag})
+        else:
+            response = view_method(view, request, *args, **kwargs)
+            if response.status_code == 200:
+                timeout = getattr(settings, 'TASKS_RESPONSE_CACHE_TIMEOUT', 300)
+                response['ETag'] = etag
+                response.add_post_render_callback(
+                    lambda rendered: cache.set(key, (rendered.content, rendered['Content-Type']), timeout)
+                )
+        if '*' in if_none_match and response.status_code == 200:
+            return HttpResponseNotModified(headers={'ETag': etag})
+        return response
+    return wrapper
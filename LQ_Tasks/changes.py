@@ -0,0 +1,85 @@
+import binascii
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Max
+
+from .models import Task, SubTask, Note, ChangeLog
+from . import events
+
+
+MODEL_NAMES = {Task: 'task', SubTask: 'subtask', Note: 'note'}
+
+
+@transaction.atomic
+def record(changes, deleted=False):
+    """
+    Records that objects changed, given as [(user_id, instance)]. Each object
+    keeps only its latest change: the old row is replaced by one with a new,
+    higher seq, and a delete leaves a tombstone.
+    """
+    by_model = defaultdict(dict)
+    for user_id, instance in changes:
+        if user_id is not None:
+            by_model[MODEL_NAMES[type(instance)]][instance.pk] = user_id
+    rows = []
+    for model, objects in by_model.items():
+        ChangeLog.objects.filter(model=model, object_id__in=list(objects)).delete()
+        rows.extend(
+            ChangeLog(user_id=user_id, model=model, object_id=object_id, deleted=deleted)
+            for object_id, user_id in objects.items()
+        )
+    ChangeLog.objects.bulk_create(rows)
+
+    # Open event streams hear about the change once it is committed
+    user_events = defaultdict(list)
+    for row in rows:
+        user_events[row.user_id].append({
+            'model': row.model, 'id': row.object_id, 'deleted': row.deleted, 'token': encode_token(row.seq),
+        })
+    if user_events:
+        transaction.on_commit(lambda: events.publish(user_events))
+
+
+def encode_token(seq):
+    return urlsafe_b64encode(json.dumps({'s': seq}).encode('ascii')).decode('ascii')
+
+
+def decode_token(token):
+    """
+    Returns the seq a sync token stands for, or raises ValueError.
+    """
+    try:
+        seq = json.loads(urlsafe_b64decode(token.encode('ascii')))['s']
+    except (TypeError, KeyError, ValueError, binascii.Error):
+        raise ValueError('Invalid sync token')
+    if not isinstance(seq, int) or seq < 0:
+        raise ValueError('Invalid sync token')
+    return seq
+
+
+def latest_seq(user):
+    return ChangeLog.objects.filter(user=user).aggregate(seq=Max('seq'))['seq'] or 0
+
+
+def changes_since(user, seq, limit):
+    """
+    Returns ({model: upserted ids}, {model: deleted ids}, last seq, has more)
+    for at most `limit` changes after `seq`, in seq order.
+
+    Sequence numbers are handed out as rows are inserted, and writers on
+    SQLite are serialized, so a change can never become visible behind a
+    watermark a client already holds.
+    """
+    rows = list(
+        ChangeLog.objects.filter(user=user, seq__gt=seq).order_by('seq')
+        .values_list('seq', 'model', 'object_id', 'deleted')[:limit + 1]
+    )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    upserted, deleted = defaultdict(list), defaultdict(list)
+    for _, model, object_id, is_deleted in rows:
+        (deleted if is_deleted else upserted)[model].append(object_id)
+    return upserted, deleted, rows[-1][0] if rows else seq, has_more
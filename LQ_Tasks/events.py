@@ -0,0 +1,107 @@
+import asyncio
+import threading
+from functools import lru_cache
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class Subscription:
+    """
+    One open event stream. Events wait in a small buffer keyed by object,
+    so a burst of writes to the same row reaches a slow client as one event.
+    When more than `max_pending` objects pile up the buffer is dropped and
+    the client is told to resync instead, so a stalled connection never
+    holds more than that in memory.
+    """
+
+    def __init__(self, user_id, max_pending):
+        self.user_id = user_id
+        self.max_pending = max_pending
+        self.loop = asyncio.get_running_loop()
+        self.pending = {}
+        self.overflowed = False
+        self.ready = asyncio.Event()
+
+    def push(self, events):
+        # Runs on the subscriber's event loop
+        for event in events:
+            key = (event['model'], event['id'])
+            self.pending.pop(key, None)
+            self.pending[key] = event
+        if len(self.pending) > self.max_pending:
+            self.pending.clear()
+            self.overflowed = True
+        self.ready.set()
+
+    async def get(self, timeout):
+        """
+        Returns the buffered events, [] after `timeout` seconds without any,
+        or None when the buffer overflowed and the client has to resync.
+        """
+        try:
+            await asyncio.wait_for(self.ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return []
+        self.ready.clear()
+        if self.overflowed:
+            self.overflowed = False
+            return None
+        events, self.pending = list(self.pending.values()), {}
+        return events
+
+
+class InMemoryBroker:
+    """
+    Fans events out to the streams open in this process. Publishing is
+    thread-safe and never blocks on a subscriber. With several processes,
+    point TASK_EVENTS_BROKER at a broker with the same methods that relays
+    publish() through a shared channel (e.g. Redis pub/sub) to each
+    process's subscribers.
+    """
+
+    def __init__(self):
+        self._subscriptions = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id):
+        subscription = Subscription(user_id, getattr(settings, 'TASK_EVENTS_MAX_PENDING', 100))
+        with self._lock:
+            self._subscriptions.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id, set())
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                self._subscriptions.pop(subscription.user_id, None)
+
+    def publish(self, user_id, events):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(user_id, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.push, events)
+            except RuntimeError:
+                # The subscriber's loop is gone; its stream is closing
+                self.unsubscribe(subscription)
+
+    def size(self):
+        with self._lock:
+            return sum(len(subscriptions) for subscriptions in self._subscriptions.values())
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    path = getattr(settings, 'TASK_EVENTS_BROKER', 'LQ_Tasks.events.InMemoryBroker')
+    return import_string(path)()
+
+
+def publish(events):
+    """
+    Publishes change events given as {user_id: [event]}.
+    """
+    broker = get_broker()
+    for user_id, user_events in events.items():
+        broker.publish(user_id, user_events)
@@ -0,0 +1,124 @@
+import csv
+import json
+
+from django.db.models import Prefetch
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import Task, SubTask
+
+
+CHUNK_SIZE = 500
+# Rows are flushed to the response in pieces of about this many characters
+FLUSH_SIZE = 64 * 1024
+
+
+def task_tree(user, chunk_size=CHUNK_SIZE):
+    """
+    Yields the user's tasks with their subtasks and notes loaded. Rows come
+    from a server-side iterator in chunks, each chunk with its own
+    prefetches, so memory does not grow with the size of the account.
+    """
+    subtasks = SubTask.objects.order_by('id').prefetch_related('notes')
+    queryset = Task.objects.filter(user=user).order_by('id').prefetch_related(
+        'notes', Prefetch('subtasks', queryset=subtasks),
+    )
+    return queryset.iterator(chunk_size=chunk_size)
+
+
+def note_document(note):
+    return {
+        'id': note.id, 'title': note.title, 'content': note.content,
+        'created_at': note.created_at, 'updated_at': note.updated_at,
+    }
+
+
+def item_document(item):
+    return {
+        'id': item.id, 'title': item.title, 'description': item.description, 'priority': item.priority,
+        'status': item.status, 'deadline': item.deadline, 'updated_at': item.updated_at,
+        'notes': [note_document(note) for note in item.notes.all()],
+    }
+
+
+def task_document(task):
+    document = item_document(task)
+    document['subtasks'] = [item_document(subtask) for subtask in task.subtasks.all()]
+    return document
+
+
+def buffered(pieces):
+    buffer, size = [], 0
+    for piece in pieces:
+        buffer.append(piece)
+        size += len(piece)
+        if size >= FLUSH_SIZE:
+            yield ''.join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+class NDJSONRenderer(BaseRenderer):
+    """
+    One JSON document per line: a task with its notes and its subtasks,
+    each subtask with its own notes.
+    """
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # Used for error responses; exports go through stream()
+        return json.dumps(data, cls=JSONEncoder) + '\n'
+
+    def stream(self, tasks):
+        return buffered(json.dumps(task_document(task), cls=JSONEncoder) + '\n' for task in tasks)
+
+
+class Echo:
+    # File-like object whose write() hands the line back to the caller
+    def write(self, value):
+        return value
+
+
+class CSVRenderer(BaseRenderer):
+    """
+    Flat rows: each task, then its notes, then each subtask followed by its
+    notes. parent_type/parent_id point at the task a subtask belongs to or
+    the object a note is attached to.
+    """
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+    columns = ['type', 'id', 'parent_type', 'parent_id', 'title', 'body', 'priority', 'status', 'deadline',
+               'created_at', 'updated_at']
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        writer = csv.writer(Echo())
+        if isinstance(data, dict):
+            return ''.join(writer.writerow([key, value]) for key, value in data.items())
+        return writer.writerow([data])
+
+    def stream(self, tasks):
+        writer = csv.writer(Echo())
+        return buffered(writer.writerow(row) for row in self.rows(tasks))
+
+    def rows(self, tasks):
+        yield self.columns
+        for task in tasks:
+            yield from self.item_rows('task', task, None)
+            for subtask in task.subtasks.all():
+                yield from self.item_rows('subtask', subtask, ('task', task.id))
+
+    def item_rows(self, kind, item, parent):
+        parent_type, parent_id = parent or ('', '')
+        yield [kind, item.id, parent_type, parent_id, item.title, item.description or '', item.priority,
+               item.status, self.timestamp(item.deadline), '', self.timestamp(item.updated_at)]
+        for note in item.notes.all():
+            yield ['note', note.id, kind, item.id, note.title, note.content, '', '', '',
+                   self.timestamp(note.created_at), self.timestamp(note.updated_at)]
+
+    @staticmethod
+    def timestamp(value):
+        return value.isoformat() if value else ''
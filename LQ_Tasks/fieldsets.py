@@ -0,0 +1,75 @@
+from rest_framework.exceptions import ValidationError
+
+from . import timing
+
+
+def split_names(value):
+    return [name.strip() for name in value.split(',') if name.strip()]
+
+
+class ExpandableFieldsMixin:
+    """
+    Serializer that can drop fields and embed relations on request.
+    `fields` keeps only the named fields; `expand` adds the relations in
+    `expandable_fields` (name -> function building the field from the
+    expansion set), which are also handed down to nested serializers.
+    """
+    expandable_fields = {}
+
+    def __init__(self, *args, fields=None, expand=frozenset(), **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields) - set(expand):
+                self.fields.pop(name)
+        for name, build in self.expandable_fields.items():
+            # Rebuilt when shown anyway, so its own relations see `expand`
+            if name in expand or (expand and name in self.fields):
+                self.fields[name] = build(expand)
+
+    def to_representation(self, instance):
+        return timing.measure('serialize', super().to_representation, instance)
+
+
+class SparseFieldsetMixin:
+    """
+    Reads `?fields=` and `?expand=` on GET requests, passes them to the
+    serializer and narrows the queries to match: only() the columns the
+    response needs and prefetch only the relations it embeds. Writes always
+    answer with the full representation.
+    """
+
+    def sparse_fieldset(self, serializer_class=None):
+        serializer_class = serializer_class or self.get_serializer_class()
+        request = self.request
+        if request is None or request.method != 'GET':
+            return None, frozenset()
+        params = request.query_params
+        fields = split_names(params['fields']) if 'fields' in params else None
+        expand = frozenset(split_names(params.get('expand', '')))
+
+        errors = {}
+        unknown = [name for name in fields or () if name not in serializer_class().fields]
+        if unknown:
+            errors['fields'] = [f'Unknown field: {name}.' for name in unknown]
+        unknown = [name for name in sorted(expand) if name not in serializer_class.expandable_fields]
+        if unknown:
+            errors['expand'] = [f'Cannot expand: {name}.' for name in unknown]
+        if errors:
+            raise ValidationError(errors)
+        return fields, expand
+
+    def get_serializer(self, *args, **kwargs):
+        fields, expand = self.sparse_fieldset()
+        return super().get_serializer(*args, fields=fields, expand=expand, **kwargs)
+
+    @staticmethod
+    def only_columns(queryset, fields, extra=()):
+        # Relations and computed fields have no column of their own
+        if fields is None:
+            return queryset
+        meta = queryset.model._meta
+        columns = [
+            name for name in fields
+            if any(field.name == name and field.concrete for field in meta.concrete_fields)
+        ]
+        return queryset.only(meta.pk.name, *extra, *columns)
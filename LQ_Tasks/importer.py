@@ -0,0 +1,120 @@
+import json
+
+from django.contrib.contenttypes.models import ContentType
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import BaseParser
+from rest_framework.serializers import as_serializer_error
+
+from .models import Task, SubTask, Note
+from .serializers import TaskImportSerializer
+from .signals import bulk_saved
+from .transactions import write_atomic
+
+
+CHUNK_SIZE = 500
+# Errors past this many are only counted
+MAX_ERRORS = 100
+
+
+class TaskImport:
+    """
+    Imports NDJSON task documents for a user. Lines are read one at a time
+    and validated on their own; valid ones are written in chunks of
+    `chunk_size` tasks, each chunk in its own transaction with one INSERT
+    per model. Invalid lines are skipped and reported with their number,
+    so the rest of the file still goes in.
+    """
+
+    def __init__(self, user, chunk_size=CHUNK_SIZE, progress=None):
+        self.user = user
+        self.chunk_size = chunk_size
+        self.progress = progress
+        self.lines = 0
+        self.imported = {'tasks': 0, 'subtasks': 0, 'notes': 0}
+        self.errors = []
+        self.error_count = 0
+        # Fields of a ModelSerializer are built on first use; one instance
+        # validates every line instead of rebuilding them per line
+        self.serializer = TaskImportSerializer()
+
+    def run(self, lines):
+        chunk = []
+        for number, line in enumerate(lines, 1):
+            self.lines = number
+            if not line.strip():
+                continue
+            data = self.validate(number, line)
+            if data is not None:
+                chunk.append(data)
+            if len(chunk) >= self.chunk_size:
+                self.save(chunk)
+                chunk = []
+        if chunk:
+            self.save(chunk)
+        return self.report()
+
+    def validate(self, number, line):
+        try:
+            data = json.loads(line)
+        except ValueError:
+            return self.add_error(number, {'non_field_errors': ['Invalid JSON.']})
+        if not isinstance(data, dict):
+            return self.add_error(number, {'non_field_errors': ['Expected an object.']})
+        try:
+            return self.serializer.run_validation(data)
+        except ValidationError as error:
+            return self.add_error(number, as_serializer_error(error))
+
+    def add_error(self, number, errors):
+        self.error_count += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append({'line': number, 'errors': errors})
+
+    @write_atomic
+    def save(self, chunk):
+        tasks, subtasks, notes = [], [], []
+        for data in chunk:
+            task_notes = data.pop('notes', [])
+            task_subtasks = data.pop('subtasks', [])
+            task = Task(user=self.user, **data)
+            tasks.append(task)
+            notes.extend((task, note) for note in task_notes)
+            for item in task_subtasks:
+                subtask_notes = item.pop('notes', [])
+                subtask = SubTask(task=task, priority=SubTask.derive_priority(task.priority), **item)
+                subtasks.append(subtask)
+                notes.extend((subtask, note) for note in subtask_notes)
+
+        # Notes point at their targets by id, so they go in last
+        for model, instances in ((Task, tasks), (SubTask, subtasks)):
+            if instances:
+                model.objects.bulk_create(instances)
+                bulk_saved.send(sender=model, instances=instances, created=True)
+        if notes:
+            rows = []
+            for target, item in notes:
+                note = Note(content_type=ContentType.objects.get_for_model(target), object_id=target.pk, **item)
+                note.set_owner(target)
+                rows.append(note)
+            Note.objects.bulk_create(rows)
+            bulk_saved.send(sender=Note, instances=rows, created=True)
+
+        self.imported['tasks'] += len(tasks)
+        self.imported['subtasks'] += len(subtasks)
+        self.imported['notes'] += len(notes)
+        if self.progress:
+            self.progress(self.report())
+
+    def report(self):
+        return {
+            'lines': self.lines, 'imported': dict(self.imported),
+            'error_count': self.error_count, 'errors': list(self.errors),
+        }
+
+
+class NDJSONParser(BaseParser):
+    # Hands the view the request body as lines instead of reading it whole
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        return iter(stream.readline, b'') if stream is not None else iter(())
@@ -0,0 +1,258 @@
+import json
+import logging
+import math
+import platform
+import statistics
+import time
+
+import django
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLResolver, reverse
+
+from accounts import urls as accounts_urls
+from accounts.models import CustomUser
+from accounts.serializers import TokenSerializer
+from LQ_Tasks import caching, urls as task_urls
+from LQ_Tasks.models import Task, SubTask, Note
+
+
+WRITE_METHODS = ('post', 'put', 'patch', 'delete')
+# Routes that cannot be timed as a request/response pair
+SKIPPED = {'events': 'event stream never ends, see bench_sse'}
+
+
+class Skip(Exception):
+    pass
+
+
+def percentile(values, fraction):
+    # Nearest-rank percentile of sorted values
+    return values[max(math.ceil(fraction * len(values)) - 1, 0)]
+
+
+def url_patterns(patterns):
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from url_patterns(pattern.url_patterns)
+        elif pattern.name and 'format' not in pattern.pattern.regex.groupindex:
+            yield pattern
+
+
+def route_methods(pattern):
+    callback = pattern.callback
+    if getattr(callback, 'actions', None):
+        return sorted(callback.actions)
+    view_class = callback.view_class
+    return [
+        method for method in view_class.http_method_names
+        if method not in ('head', 'options') and hasattr(view_class, method)
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        'Time every route of LQ_Tasks/urls.py and accounts/urls.py as one user and report p50/p95/p99 '
+        'latency, SQL queries and response bytes. Writes run in a transaction that is rolled back, '
+        'so the data is left as it was'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('username', help='User the requests run as, e.g. one made by seed_data')
+        parser.add_argument('--password', help='Password of the user; without it the token route is skipped')
+        parser.add_argument('--requests', type=int, default=50, help='Timed requests per route')
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--cold', action='store_true', help='Drop cached responses before every request')
+        parser.add_argument('--read-only', action='store_true', help='Leave out write methods')
+        parser.add_argument('--json', dest='json_path', help='Write the results as JSON to this file (- for stdout)')
+
+    def handle(self, *args, **options):
+        try:
+            self.user = CustomUser.objects.get(username=options['username'])
+        except CustomUser.DoesNotExist:
+            raise CommandError(f'Unknown user: {options["username"]}')
+        self.password = options['password']
+        self.objects = self.pick_objects()
+
+        # 4xx answers are part of the results, not worth a log line per request
+        request_logger = logging.getLogger('django.request')
+        level = request_logger.level
+        request_logger.setLevel(logging.ERROR)
+        results = []
+        try:
+            for module in (task_urls, accounts_urls):
+                for pattern in url_patterns(module.urlpatterns):
+                    for method in route_methods(pattern):
+                        if method in WRITE_METHODS and options['read_only']:
+                            continue
+                        results.append(self.measure(pattern, method, options))
+        finally:
+            request_logger.setLevel(level)
+
+        report = {
+            'meta': {
+                'python': platform.python_version(), 'django': django.get_version(),
+                'database': f'{connection.vendor} {connection.Database.sqlite_version}'
+                if connection.vendor == 'sqlite' else connection.vendor,
+                'requests': options['requests'], 'cold': options['cold'],
+                'user': {
+                    'tasks': Task.objects.filter(user=self.user).count(),
+                    'subtasks': SubTask.objects.filter(task__user=self.user).count(),
+                    'notes': Note.objects.filter(user=self.user).count(),
+                },
+            },
+            'routes': sorted(results, key=lambda result: (result['name'], result['method'])),
+        }
+        self.write_table(report)
+        if options['json_path'] == '-':
+            self.stdout.write(json.dumps(report, indent=2))
+        elif options['json_path']:
+            with open(options['json_path'], 'w') as output:
+                json.dump(report, output, indent=2)
+
+    def pick_objects(self):
+        # A task with notes and a subtask that has notes of its own, if there is one
+        subtask_type = ContentType.objects.get_for_model(SubTask)
+        note = Note.objects.filter(user=self.user, content_type=subtask_type).order_by('id').first()
+        subtask = SubTask.objects.filter(pk=note.object_id).first() if note else None
+        if subtask is None:
+            subtask = SubTask.objects.filter(task__user=self.user).order_by('id').first()
+        task = subtask.task if subtask else Task.objects.filter(user=self.user).order_by('id').first()
+        if task is None:
+            raise CommandError(f'{self.user.username} has no tasks, run seed_data first')
+        return {
+            'task': task, 'subtask': subtask,
+            'task-note': Note.objects.filter(user=self.user, object_id=task.id,
+                                             content_type=ContentType.objects.get_for_model(Task)).first(),
+            'subtask-note': note,
+        }
+
+    def url_kwargs(self, pattern):
+        kwargs = {}
+        for name in pattern.pattern.regex.groupindex:
+            if name == 'task_pk':
+                kind = 'task'
+            elif name == 'subtask_pk':
+                kind = 'subtask'
+            elif 'subtask-note' in pattern.name:
+                kind = 'subtask-note'
+            elif 'note' in pattern.name:
+                kind = 'task-note'
+            elif 'subtask-detail' in pattern.name:
+                kind = 'subtask'
+            else:
+                kind = 'task'
+            if self.objects[kind] is None:
+                raise Skip(f'no {kind} to use')
+            kwargs[name] = self.objects[kind].pk
+        return kwargs
+
+    def params(self, name):
+        # Query string for GET routes that need one
+        if name == 'search':
+            return {'q': self.objects['task'].title.split()[0]}
+        return None
+
+    def body(self, name, method):
+        # (data, content type) for a write request, or Skip
+        task, subtask = self.objects['task'], self.objects['subtask']
+        if method == 'delete':
+            return None, None
+        if name == 'task-batch':
+            return [{'op': 'update', 'model': 'task', 'id': task.id, 'data': {'priority': task.priority}}], None
+        if name == 'import':
+            line = {'title': 'Benchmark', 'priority': 5, 'subtasks': [{'title': 'Step'}]}
+            return json.dumps(line) + '\n', 'application/x-ndjson'
+        if name == 'register':
+            return {'username': 'bench-register', 'email': 'bench@example.com',
+                    'password': 'bench-password', 'password_confirmation': 'bench-password'}, None
+        if name == 'token':
+            if not self.password:
+                raise Skip('needs --password')
+            return {'username': self.user.username, 'password': self.password}, None
+        if name == 'token-refresh':
+            return {'refresh': str(TokenSerializer.get_token(self.user))}, None
+        if name == 'token-verify':
+            return {'token': str(TokenSerializer.get_token(self.user).access_token)}, None
+        if 'note' in name:
+            target = subtask if 'subtask-note' in name else task
+            if target is None:
+                raise Skip('no subtask to use')
+            return {'title': 'Benchmark', 'content': 'Note', 'object_id': target.id,
+                    'content_type': ContentType.objects.get_for_model(target).id}, None
+        if name == 'task-subtasks':
+            return [{'title': 'Benchmark', 'task': task.id, 'priority': task.priority}], None
+        if 'subtask' in name:
+            return {'title': 'Benchmark', 'task': task.id, 'priority': task.priority}, None
+        if name.startswith('task-'):
+            return {'title': 'Benchmark', 'priority': task.priority}, None
+        raise Skip('no request body defined')
+
+    def measure(self, pattern, method, options):
+        result = {'name': pattern.name, 'method': method.upper(), 'route': None}
+        try:
+            if pattern.name in SKIPPED:
+                raise Skip(SKIPPED[pattern.name])
+            url = reverse(pattern.name, kwargs=self.url_kwargs(pattern))
+            if method in WRITE_METHODS:
+                data, content_type = self.body(pattern.name, method)
+            else:
+                data, content_type = self.params(pattern.name), None
+        except Skip as reason:
+            return {**result, 'skipped': str(reason)}
+        result['route'] = url
+
+        # A fresh token per route, so long runs never outlive the access token
+        client = Client(
+            SERVER_NAME='localhost',
+            HTTP_AUTHORIZATION=f'Bearer {TokenSerializer.get_token(self.user).access_token}',
+        )
+        request_kwargs = {}
+        if method in WRITE_METHODS and data is not None:
+            request_kwargs['content_type'] = content_type or 'application/json'
+            if content_type is None:
+                data = json.dumps(data)
+        timings, queries, sizes, statuses = [], [], [], set()
+        for index in range(options['warmup'] + options['requests']):
+            if options['cold']:
+                caching.bump_versions([self.user.id])
+            with transaction.atomic(), CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = getattr(client, method)(url, data, **request_kwargs)
+                size = len(b''.join(response.streaming_content)) if response.streaming else len(response.content)
+                elapsed = time.perf_counter() - started
+                # Writes are undone so every request sees the same data
+                transaction.set_rollback(True)
+            if index >= options['warmup']:
+                timings.append(elapsed)
+                queries.append(len(captured.captured_queries))
+                sizes.append(size)
+                statuses.add(response.status_code)
+
+        timings.sort()
+        return {
+            **result,
+            'status': sorted(statuses),
+            'p50_ms': round(percentile(timings, 0.50) * 1000, 2),
+            'p95_ms': round(percentile(timings, 0.95) * 1000, 2),
+            'p99_ms': round(percentile(timings, 0.99) * 1000, 2),
+            'queries': statistics.median_low(queries),
+            'bytes': statistics.median_low(sizes),
+        }
+
+    def write_table(self, report):
+        self.stdout.write(f'{"method":<7}{"name":<28}{"route":<42}{"status":>8}{"p50 ms":>9}{"p95 ms":>9}'
+                          f'{"p99 ms":>9}{"queries":>9}{"bytes":>10}')
+        for result in report['routes']:
+            line = f'{result["method"]:<7}{result["name"]:<28}{result["route"] or "":<42}'
+            if 'skipped' in result:
+                self.stdout.write(f'{line}  skipped: {result["skipped"]}')
+                continue
+            self.stdout.write(
+                f'{line}{",".join(map(str, result["status"])):>8}'
+                f'{result["p50_ms"]:>9.2f}{result["p95_ms"]:>9.2f}{result["p99_ms"]:>9.2f}'
+                f'{result["queries"]:>9}{result["bytes"]:>10}'
+            )
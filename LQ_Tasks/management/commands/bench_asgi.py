@@ -0,0 +1,119 @@
+import asyncio
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+
+from accounts.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare concurrent GET throughput of the sync API under WSGI and ASGI with the async API under ASGI. '
+        'Requests go straight to the Django handlers that gunicorn/uvicorn/daphne would serve, '
+        'so the numbers leave out the network and server overhead'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('username', help='User whose session the requests run as')
+        parser.add_argument('--path', default='tasks/', help='Endpoint below /api/ and /api/async/')
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, default=20)
+
+    def handle(self, *args, **options):
+        try:
+            user = CustomUser.objects.get(username=options['username'])
+        except CustomUser.DoesNotExist:
+            raise CommandError(f'Unknown user: {options["username"]}')
+        client = Client()
+        client.force_login(user)
+        self.cookie = f'{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}'
+
+        path, total, concurrency = options['path'].lstrip('/'), options['requests'], options['concurrency']
+        runs = [
+            ('WSGI sync', self.run_wsgi, f'/api/{path}'),
+            ('ASGI sync', self.run_asgi, f'/api/{path}'),
+            ('ASGI async', self.run_asgi, f'/api/async/{path}'),
+        ]
+        self.stdout.write(f'{total} requests, concurrency {concurrency}')
+        self.stdout.write(f'{"mode":<12}{"path":<32}{"req/s":>10}{"p50 ms":>10}{"p95 ms":>10}{"errors":>8}')
+        for name, run, url in runs:
+            elapsed, latencies, errors = run(url, total, concurrency)
+            latencies.sort()
+            self.stdout.write(
+                f'{name:<12}{url:<32}{total / elapsed:>10.1f}{statistics.median(latencies) * 1000:>10.2f}'
+                f'{latencies[int(len(latencies) * 0.95) - 1] * 1000:>10.2f}{errors:>8}'
+            )
+
+    def split(self, url):
+        path, _, query = url.partition('?')
+        return path, query
+
+    def run_wsgi(self, url, total, concurrency):
+        handler = WSGIHandler()
+        path, query = self.split(url)
+
+        def request():
+            environ = {
+                'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': query, 'SCRIPT_NAME': '',
+                'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'HTTP_HOST': 'localhost',
+                'HTTP_COOKIE': self.cookie, 'HTTP_ACCEPT': 'application/json',
+                'wsgi.input': BytesIO(), 'wsgi.errors': sys.stderr, 'wsgi.url_scheme': 'http',
+            }
+            statuses = []
+            started = time.perf_counter()
+            b''.join(handler(environ, lambda status, headers: statuses.append(status)))
+            return time.perf_counter() - started, statuses[0].startswith('200')
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(lambda _: request(), range(total)))
+        return self.collect(time.perf_counter() - started, results)
+
+    def run_asgi(self, url, total, concurrency):
+        handler = ASGIHandler()
+        path, query = self.split(url)
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+            'path': path, 'raw_path': path.encode(), 'query_string': query.encode(), 'root_path': '',
+            'headers': [(b'host', b'localhost'), (b'cookie', self.cookie.encode()), (b'accept', b'application/json')],
+            'client': ('127.0.0.1', 0), 'server': ('localhost', 80),
+        }
+
+        async def request(semaphore):
+            messages = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+            statuses = []
+
+            async def receive():
+                if messages:
+                    return messages.pop()
+                # The client never disconnects; the handler cancels this wait
+                await asyncio.Event().wait()
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    statuses.append(message['status'])
+
+            async with semaphore:
+                started = time.perf_counter()
+                await handler(dict(scope), receive, send)
+                return time.perf_counter() - started, statuses[0] == 200
+
+        async def run():
+            semaphore = asyncio.Semaphore(concurrency)
+            return await asyncio.gather(*(request(semaphore) for _ in range(total)))
+
+        started = time.perf_counter()
+        results = asyncio.run(run())
+        return self.collect(time.perf_counter() - started, results)
+
+    @staticmethod
+    def collect(elapsed, results):
+        return elapsed, [latency for latency, _ in results], sum(1 for _, ok in results if not ok)
@@ -0,0 +1,49 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import CustomUser
+from LQ_Tasks.fastpath import values_plan
+from LQ_Tasks.models import Task, SubTask, Note
+from LQ_Tasks.serializers import TaskSerializer, SubTaskSerializer, NoteSerializer
+from LQ_Tasks.views import plan_task_queryset
+
+
+class Command(BaseCommand):
+    help = "Compare rows per second of the DRF serializers and the values() fast path on a user's data"
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('--repeat', type=int, default=5, help='Best of this many runs is reported')
+
+    def handle(self, *args, **options):
+        try:
+            user = CustomUser.objects.get(username=options['username'])
+        except CustomUser.DoesNotExist:
+            raise CommandError(f'Unknown user: {options["username"]}')
+        cases = [
+            ('tasks + subtasks', TaskSerializer, plan_task_queryset(Task.objects.filter(user=user))),
+            ('subtasks', SubTaskSerializer, SubTask.objects.filter(task__user=user)),
+            ('notes', NoteSerializer, Note.objects.filter(user=user)),
+        ]
+        for name, serializer_class, queryset in cases:
+            plan = values_plan(serializer_class)
+            rows = queryset.count()
+            if not rows:
+                self.stdout.write(f'{name}: no rows')
+                continue
+            before = self.best(options['repeat'], lambda: serializer_class(queryset.all(), many=True).data)
+            after = self.best(options['repeat'], lambda: plan.render(list(plan.values(queryset.all()))))
+            self.stdout.write(
+                f'{name}: {rows} rows, serializer {rows / before:,.0f} rows/s, '
+                f'values() {rows / after:,.0f} rows/s ({before / after:.1f}x)'
+            )
+
+    @staticmethod
+    def best(repeat, run):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            run()
+            timings.append(time.perf_counter() - started)
+        return min(timings)
@@ -0,0 +1,89 @@
+import asyncio
+import time
+import tracemalloc
+
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import CustomUser
+from accounts.serializers import TokenSerializer
+from LQ_Tasks import events
+
+
+class Command(BaseCommand):
+    help = (
+        'Open many idle /api/events/ streams through the ASGI handler, then measure memory per stream '
+        'and how long one change takes to reach all of them'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('username', help='User the streams subscribe as')
+        parser.add_argument('--connections', type=int, default=2000)
+        parser.add_argument('--timeout', type=float, default=60)
+
+    def handle(self, *args, **options):
+        try:
+            user = CustomUser.objects.get(username=options['username'])
+        except CustomUser.DoesNotExist:
+            raise CommandError(f'Unknown user: {options["username"]}')
+        token = str(TokenSerializer.get_token(user).access_token)
+        asyncio.run(self.run(user.pk, token, options['connections'], options['timeout']))
+
+    async def run(self, user_id, token, count, timeout):
+        handler = ASGIHandler()
+        broker = events.get_broker()
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+            'path': '/api/events/', 'raw_path': b'/api/events/', 'query_string': b'', 'root_path': '',
+            'headers': [(b'host', b'localhost'), (b'authorization', f'Bearer {token}'.encode())],
+            'client': ('127.0.0.1', 0), 'server': ('localhost', 80),
+        }
+        disconnect = asyncio.Event()
+        received = {'count': 0}
+        all_received = asyncio.Event()
+
+        async def connection():
+            requested = False
+
+            async def receive():
+                nonlocal requested
+                if not requested:
+                    requested = True
+                    return {'type': 'http.request', 'body': b'', 'more_body': False}
+                await disconnect.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                if message['type'] == 'http.response.body' and b'event: change' in message.get('body', b''):
+                    received['count'] += 1
+                    if received['count'] == count:
+                        all_received.set()
+
+            await handler(dict(scope), receive, send)
+
+        baseline = broker.size()
+        tracemalloc.start()
+        memory_before = tracemalloc.get_traced_memory()[0]
+        started = time.perf_counter()
+        tasks = [asyncio.create_task(connection()) for _ in range(count)]
+        while broker.size() - baseline < count:
+            if time.perf_counter() - started > timeout:
+                raise CommandError(f'Only {broker.size() - baseline} of {count} streams opened')
+            await asyncio.sleep(0.05)
+        opened = time.perf_counter() - started
+        memory = tracemalloc.get_traced_memory()[0] - memory_before
+        tracemalloc.stop()
+
+        started = time.perf_counter()
+        events.publish({user_id: [{'model': 'task', 'id': 0, 'deleted': False, 'token': ''}]})
+        await asyncio.wait_for(all_received.wait(), timeout)
+        fan_out = time.perf_counter() - started
+
+        disconnect.set()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        self.stdout.write(f'streams:           {count}')
+        self.stdout.write(f'open time:         {opened:.2f} s')
+        self.stdout.write(f'memory per stream: {memory / count / 1024:.1f} KiB')
+        self.stdout.write(f'fan-out to all:    {fan_out * 1000:.1f} ms')
+        self.stdout.write(f'still subscribed:  {broker.size() - baseline}')
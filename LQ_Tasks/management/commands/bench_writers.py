@@ -0,0 +1,188 @@
+import json
+import logging
+import math
+import multiprocessing
+import os
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+
+from accounts.models import CustomUser
+from accounts.serializers import TokenSerializer
+from LQ_Tasks.transactions import is_locked
+
+
+def percentile(values, fraction):
+    # Nearest-rank percentile of sorted values
+    return values[max(math.ceil(fraction * len(values)) - 1, 0)]
+
+
+def use_database(path, profile):
+    # Runs in a forked child: the parent's connection is dropped, not closed
+    options, retries, request_transactions = profile
+    connections.settings['default'] = {**connections.settings['default'], 'NAME': path, 'OPTIONS': options}
+    try:
+        del connections['default']
+    except AttributeError:
+        pass
+    settings.DATABASE_LOCK_RETRIES = retries
+    settings.WRITE_REQUEST_TRANSACTIONS = request_transactions
+    settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, 'localhost']
+    # Lock errors and slow requests are what is being counted
+    for name in ('django.request', 'LQ_Tasks.timing'):
+        logging.getLogger(name).setLevel(logging.CRITICAL)
+
+
+def prepare(path, profile, usernames):
+    use_database(path, profile)
+    call_command('migrate', verbosity=0)
+    CustomUser.objects.bulk_create([
+        CustomUser(username=username, email=f'{username}@example.com', password='!') for username in usernames
+    ])
+
+
+def write(path, profile, username, count, barrier, results):
+    use_database(path, profile)
+    user = CustomUser.objects.get(username=username)
+    client = Client(
+        SERVER_NAME='localhost', HTTP_AUTHORIZATION=f'Bearer {TokenSerializer.get_token(user).access_token}',
+    )
+    timings, lock_errors, other_errors = [], 0, 0
+    task_id = None
+    barrier.wait()
+    started = time.monotonic()
+    for index in range(count):
+        # Create a task, move it along, give it a subtask: the API's common writes
+        if task_id is None or index % 3 == 0:
+            request = ('post', '/api/tasks/', {'title': f'Task {index}', 'priority': 5})
+        elif index % 3 == 1:
+            request = ('patch', f'/api/tasks/{task_id}/', {'status': 'IN_PROGRESS'})
+        else:
+            request = ('post', f'/api/tasks/{task_id}/subtasks/', [{'title': 'Step', 'task': task_id, 'priority': 5}])
+        method, url, data = request
+        request_started = time.perf_counter()
+        try:
+            response = getattr(client, method)(url, data, content_type='application/json')
+        except Exception as error:
+            if is_locked(error):
+                lock_errors += 1
+            else:
+                other_errors += 1
+            continue
+        if response.status_code >= 400:
+            other_errors += 1
+            continue
+        timings.append(time.perf_counter() - request_started)
+        if url == '/api/tasks/':
+            task_id = response.json()['id']
+    results.put({
+        'started': started, 'finished': time.monotonic(), 'timings': timings,
+        'lock_errors': lock_errors, 'other_errors': other_errors,
+    })
+
+
+class Command(BaseCommand):
+    help = (
+        'Run the same write traffic through the API from several processes against a scratch SQLite '
+        'database, once as the API ran before the production profile (Django\'s default connection '
+        'settings, no request-wide write transactions, no retries) and once with the profile in '
+        'settings.py, and report writes per second, latency and "database is locked" errors. The '
+        'configured database is not touched'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=8)
+        parser.add_argument('--requests', type=int, default=150, help='Write requests per process')
+        parser.add_argument(
+            '--profile', action='append', choices=['baseline', 'production'],
+            help='Profiles to run, both by default',
+        )
+        parser.add_argument('--json', dest='json_path', help='Write the results as JSON to this file (- for stdout)')
+
+    def handle(self, *args, **options):
+        if connections['default'].vendor != 'sqlite':
+            raise CommandError('This benchmark is about SQLite locking, the default database is not SQLite')
+        profiles = {
+            # The tree before the profile: rollback journal, deferred BEGIN, 5 s busy timeout, no retries,
+            # and views in autocommit
+            'baseline': ({}, 0, False),
+            'production': (
+                settings.DATABASES['default'].get('OPTIONS', {}), settings.DATABASE_LOCK_RETRIES,
+                settings.WRITE_REQUEST_TRANSACTIONS,
+            ),
+        }
+        context = multiprocessing.get_context('fork')
+        results = []
+        with tempfile.TemporaryDirectory() as directory:
+            for name in options['profile'] or list(profiles):
+                database_options, retries, request_transactions = profiles[name]
+                path = os.path.join(directory, f'{name}.sqlite3')
+                result = self.measure(context, path, profiles[name], options)
+                results.append({
+                    'profile': name, 'options': database_options, 'retries': retries,
+                    'request_transactions': request_transactions, **result,
+                })
+
+        report = {
+            'meta': {
+                'processes': options['processes'], 'requests': options['requests'],
+                'sqlite': connections['default'].Database.sqlite_version,
+            },
+            'profiles': results,
+        }
+        self.stdout.write(f'{"profile":<12}{"writes/s":>10}{"ok":>8}{"locked":>8}{"other":>8}'
+                          f'{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}')
+        for result in results:
+            self.stdout.write(
+                f'{result["profile"]:<12}{result["writes_per_second"]:>10.1f}{result["ok"]:>8}'
+                f'{result["lock_errors"]:>8}{result["other_errors"]:>8}'
+                f'{result["p50_ms"]:>9.2f}{result["p95_ms"]:>9.2f}{result["p99_ms"]:>9.2f}'
+            )
+        if options['json_path'] == '-':
+            self.stdout.write(json.dumps(report, indent=2))
+        elif options['json_path']:
+            with open(options['json_path'], 'w') as output:
+                json.dump(report, output, indent=2)
+
+    def measure(self, context, path, profile, options):
+        usernames = [f'writer-{index}' for index in range(options['processes'])]
+        setup = context.Process(target=prepare, args=(path, profile, usernames))
+        setup.start()
+        setup.join()
+        if setup.exitcode:
+            raise CommandError(f'Creating the scratch database failed with exit code {setup.exitcode}')
+
+        barrier = context.Barrier(len(usernames))
+        queue = context.Queue()
+        workers = [
+            context.Process(
+                target=write, args=(path, profile, username, options['requests'], barrier, queue),
+            )
+            for username in usernames
+        ]
+        for worker in workers:
+            worker.start()
+        # Read before joining, a worker cannot exit while its result is unread
+        finished = [queue.get() for _ in workers]
+        for worker in workers:
+            worker.join()
+
+        elapsed = max(item['finished'] for item in finished) - min(item['started'] for item in finished)
+        timings = sorted(timing for item in finished for timing in item['timings'])
+        if not timings:
+            raise CommandError('No write succeeded')
+        return {
+            'seconds': round(elapsed, 3),
+            'writes_per_second': round(len(timings) / elapsed, 1),
+            'ok': len(timings),
+            'lock_errors': sum(item['lock_errors'] for item in finished),
+            'other_errors': sum(item['other_errors'] for item in finished),
+            'p50_ms': round(percentile(timings, 0.50) * 1000, 2),
+            'p95_ms': round(percentile(timings, 0.95) * 1000, 2),
+            'p99_ms': round(percentile(timings, 0.99) * 1000, 2),
+        }
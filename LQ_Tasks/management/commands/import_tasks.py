@@ -0,0 +1,42 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import CustomUser
+from LQ_Tasks.importer import CHUNK_SIZE, TaskImport
+
+
+class Command(BaseCommand):
+    help = 'Import tasks with their subtasks and notes from an NDJSON file (the /api/export/ format)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username', help='User the tasks are imported for')
+        parser.add_argument('path', help='NDJSON file, or - for stdin')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            user = CustomUser.objects.get(username=options['username'])
+        except CustomUser.DoesNotExist:
+            raise CommandError(f'Unknown user: {options["username"]}')
+        importer = TaskImport(user, options['chunk_size'], progress=self.write_progress)
+        if options['path'] == '-':
+            report = importer.run(sys.stdin.buffer)
+        else:
+            try:
+                with open(options['path'], 'rb') as lines:
+                    report = importer.run(lines)
+            except OSError as error:
+                raise CommandError(error)
+        for error in report['errors']:
+            self.stderr.write(f'line {error["line"]}: {error["errors"]}')
+        if report['error_count'] > len(report['errors']):
+            self.stderr.write(f'... {report["error_count"] - len(report["errors"])} more errors')
+        self.write_progress(report)
+
+    def write_progress(self, report):
+        imported = report['imported']
+        self.stdout.write(
+            f'line {report["lines"]}: {imported["tasks"]} tasks, {imported["subtasks"]} subtasks, '
+            f'{imported["notes"]} notes, {report["error_count"]} errors'
+        )
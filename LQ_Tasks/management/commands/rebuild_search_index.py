@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from LQ_Tasks import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index over tasks, subtasks and notes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if not search.is_available():
+            self.stdout.write(self.style.WARNING('Full-text search is not available on this database'))
+            return
+        total = search.rebuild(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Indexed {total} documents'))
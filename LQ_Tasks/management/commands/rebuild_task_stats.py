@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import CustomUser
+from LQ_Tasks import stats
+
+
+class Command(BaseCommand):
+    help = 'Recompute the per-user task and subtask counters from the task tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('usernames', nargs='*', help='Only rebuild counters for these users')
+
+    def handle(self, *args, **options):
+        users = None
+        if options['usernames']:
+            users = list(CustomUser.objects.filter(username__in=options['usernames']))
+            missing = set(options['usernames']) - {user.username for user in users}
+            if missing:
+                raise CommandError(f'Unknown users: {", ".join(sorted(missing))}')
+        rows = stats.rebuild(users)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {rows} counters'))
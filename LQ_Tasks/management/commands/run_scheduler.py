@@ -0,0 +1,31 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from LQ_Tasks import scheduler
+
+
+class Command(BaseCommand):
+    help = 'Mark tasks and subtasks past their deadline as overdue and queue deadline reminders'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--status', default=getattr(settings, 'TASK_OVERDUE_STATUS', 'FAILED'),
+                            help=f'Status for overdue items: {", ".join(scheduler.OVERDUE_STATUSES)}')
+        parser.add_argument('--remind-before', type=int, default=0,
+                            help='Queue a reminder this many minutes before a deadline (0 disables)')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Keep running and check every INTERVAL seconds')
+
+    def handle(self, *args, **options):
+        if options['status'] not in scheduler.OVERDUE_STATUSES:
+            raise CommandError(f'--status must be one of {", ".join(scheduler.OVERDUE_STATUSES)}')
+        lead = timedelta(minutes=options['remind_before']) if options['remind_before'] else None
+        while True:
+            handled = scheduler.run_once(options['status'], lead, options['batch_size'])
+            self.stdout.write(', '.join(f'{name} {kind}: {count}' for (name, kind), count in handled.items()))
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
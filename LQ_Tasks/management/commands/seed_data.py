@@ -0,0 +1,101 @@
+import random
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from accounts.models import CustomUser
+from LQ_Tasks.importer import TaskImport
+from LQ_Tasks.models import Task
+
+
+# Rough shape of a real account: most work is open or done, a few items stall
+STATUS_WEIGHTS = {
+    'CREATED': 25, 'SCHEDULED': 10, 'IN_PROGRESS': 20, 'PROCESSING': 5, 'ON_HOLD': 5,
+    'DEFERRED': 5, 'UNDER_REVIEW': 5, 'COMPLETED': 20, 'FAILED': 5,
+}
+WORDS = (
+    'plan review write call email fix read prepare buy clean book check update send finish draft '
+    'report meeting budget trip project invoice garden car doctor workout lesson chapter release'
+).split()
+
+
+class Command(BaseCommand):
+    help = (
+        'Create users with tasks, subtasks and notes for benchmarks. Counts per user and per task vary '
+        'around the given means; rows are written with bulk inserts'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10)
+        parser.add_argument('--tasks', type=int, default=100, help='Mean tasks per user')
+        parser.add_argument('--subtasks', type=int, default=3, help='Mean subtasks per task')
+        parser.add_argument('--notes', type=int, default=1, help='Mean notes per task and per subtask')
+        parser.add_argument('--prefix', default='seed', help='Users are named <prefix>-<n>')
+        parser.add_argument('--password', default='seed-password')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed, for repeatable data')
+        parser.add_argument('--batch-size', type=int, default=500, help='Tasks per INSERT batch')
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.now = timezone.now()
+        names = [f'{options["prefix"]}-{index}' for index in range(options['users'])]
+        if CustomUser.objects.filter(username__in=names).exists():
+            raise CommandError(f'Users named {options["prefix"]}-<n> already exist, pick another --prefix')
+
+        # Hashing is deliberately slow, so every seeded user shares one hash
+        password = make_password(options['password'])
+        users = CustomUser.objects.bulk_create([self.user(name, password) for name in names])
+
+        totals = {'tasks': 0, 'subtasks': 0, 'notes': 0}
+        for user in users:
+            importer = TaskImport(user, options['batch_size'])
+            count = self.around(options['tasks'])
+            for start in range(0, count, options['batch_size']):
+                importer.save([
+                    self.task(options['subtasks'], options['notes'])
+                    for _ in range(min(options['batch_size'], count - start))
+                ])
+            for key, value in importer.imported.items():
+                totals[key] += value
+            self.stdout.write(f'{user.username}: {importer.imported["tasks"]} tasks')
+        self.stdout.write(
+            f'{len(users)} users, {totals["tasks"]} tasks, {totals["subtasks"]} subtasks, {totals["notes"]} notes'
+        )
+
+    def around(self, mean):
+        # Non-negative count with the given mean and a long tail
+        if mean <= 0:
+            return 0
+        return min(round(self.random.expovariate(1 / mean)), mean * 10)
+
+    def text(self, low, high):
+        return ' '.join(self.random.choices(WORDS, k=self.random.randint(low, high))).capitalize()
+
+    def user(self, username, password):
+        return CustomUser(
+            username=username, password=password, email=f'{username}@example.com',
+            level=1 + self.around(5), points=self.random.randrange(CustomUser.POINTS_PER_LEVEL),
+            date_joined=self.now - timedelta(days=self.random.randrange(365)),
+        )
+
+    def item(self, notes):
+        deadline = None
+        if self.random.random() < 0.7:
+            deadline = self.now + timedelta(hours=self.random.randint(-30 * 24, 60 * 24))
+        return {
+            'title': self.text(2, 5),
+            'description': self.text(5, 40) if self.random.random() < 0.5 else None,
+            'status': self.random.choices(list(STATUS_WEIGHTS), list(STATUS_WEIGHTS.values()))[0],
+            'deadline': deadline,
+            'notes': [{'title': self.text(1, 4), 'content': self.text(10, 80)} for _ in range(self.around(notes))],
+        }
+
+    def task(self, subtasks, notes):
+        # Priorities cluster around the middle ranks, EX is rare
+        priority = min(max(round(self.random.triangular(1, len(Task.PRIORITY_CHOICES), 4)), 1), 10)
+        return {
+            **self.item(notes), 'priority': priority,
+            'subtasks': [self.item(notes) for _ in range(self.around(subtasks))],
+        }
@@ -0,0 +1,44 @@
+# Generated by Django 5.1 on 2026-10-18 20:22
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_existing_tasks(apps, schema_editor):
+    Task = apps.get_model('LQ_Tasks', 'Task')
+    SubTask = apps.get_model('LQ_Tasks', 'SubTask')
+    TaskStatistic = apps.get_model('LQ_Tasks', 'TaskStatistic')
+    rows = []
+    for model, queryset, user_field in (('task', Task.objects, 'user'), ('subtask', SubTask.objects, 'task__user')):
+        for field in ('status', 'priority'):
+            for user_id, value, count in queryset.values_list(user_field, field).annotate(count=Count('id')).order_by():
+                rows.append(TaskStatistic(user_id=user_id, model=model, field=field, value=str(value), count=count))
+    TaskStatistic.objects.bulk_create(rows, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('LQ_Tasks', '0005_hot_filter_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskStatistic',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(choices=[('task', 'Task'), ('subtask', 'SubTask')], max_length=10)),
+                ('field', models.CharField(choices=[('status', 'Status'), ('priority', 'Priority')], max_length=10)),
+                ('value', models.CharField(max_length=20)),
+                ('count', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='task_statistics', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'model', 'field', 'value'), name='unique_task_statistic')],
+            },
+        ),
+        migrations.RunPython(count_existing_tasks, migrations.RunPython.noop),
+    ]
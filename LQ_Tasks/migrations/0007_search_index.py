@@ -0,0 +1,58 @@
+from django.db import migrations, OperationalError
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    connection.lq_search_available = None
+    if connection.vendor != 'sqlite':
+        return
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+    task_type = ContentType.objects.get_or_create(app_label='LQ_Tasks', model='task')[0].id
+    subtask_type = ContentType.objects.get_or_create(app_label='LQ_Tasks', model='subtask')[0].id
+    with connection.cursor() as cursor:
+        try:
+            cursor.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS lq_search "
+                "USING fts5(title, body, owner, tokenize='unicode61 remove_diacritics 2')"
+            )
+        except OperationalError:
+            # SQLite built without FTS5: search falls back to icontains
+            return
+        cursor.execute(
+            'INSERT INTO lq_search (rowid, title, body, owner) '
+            'SELECT id * 4 + 1, title, COALESCE(description, \'\'), \'u\' || user_id FROM "LQ_Tasks_task"'
+        )
+        cursor.execute(
+            'INSERT INTO lq_search (rowid, title, body, owner) '
+            'SELECT s.id * 4 + 2, s.title, COALESCE(s.description, \'\'), \'u\' || t.user_id '
+            'FROM "LQ_Tasks_subtask" s JOIN "LQ_Tasks_task" t ON t.id = s.task_id'
+        )
+        cursor.execute(
+            'INSERT INTO lq_search (rowid, title, body, owner) '
+            'SELECT n.id * 4 + 3, n.title, n.content, \'u\' || COALESCE(t.user_id, st.user_id) '
+            'FROM "LQ_Tasks_note" n '
+            'LEFT JOIN "LQ_Tasks_task" t ON n.content_type_id = %s AND t.id = n.object_id '
+            'LEFT JOIN "LQ_Tasks_subtask" s ON n.content_type_id = %s AND s.id = n.object_id '
+            'LEFT JOIN "LQ_Tasks_task" st ON st.id = s.task_id '
+            'WHERE COALESCE(t.user_id, st.user_id) IS NOT NULL',
+            [task_type, subtask_type],
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    schema_editor.connection.lq_search_available = None
+    if schema_editor.connection.vendor == 'sqlite':
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute('DROP TABLE IF EXISTS lq_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('LQ_Tasks', '0006_taskstatistic'),
+        ('contenttypes', '0002_remove_content_type_name'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
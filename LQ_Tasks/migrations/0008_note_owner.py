@@ -0,0 +1,49 @@
+# Generated by Django 5.1 on 2026-10-18 20:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copy_note_owners(apps, schema_editor):
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+    Task = apps.get_model('LQ_Tasks', 'Task')
+    SubTask = apps.get_model('LQ_Tasks', 'SubTask')
+    Note = apps.get_model('LQ_Tasks', 'Note')
+    task_type = ContentType.objects.filter(app_label='LQ_Tasks', model='task').first()
+    subtask_type = ContentType.objects.filter(app_label='LQ_Tasks', model='subtask').first()
+    if task_type:
+        Note.objects.filter(content_type=task_type).update(
+            task_id=models.F('object_id'),
+            user_id=Subquery(Task.objects.filter(id=OuterRef('object_id')).values('user_id')[:1]),
+        )
+    if subtask_type:
+        subtasks = SubTask.objects.filter(id=OuterRef('object_id'))
+        Note.objects.filter(content_type=subtask_type).update(
+            task_id=Subquery(subtasks.values('task_id')[:1]),
+            user_id=Subquery(subtasks.values('task__user_id')[:1]),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('LQ_Tasks', '0007_search_index'),
+        ('contenttypes', '0002_remove_content_type_name'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='note',
+            name='task',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='LQ_Tasks.task'),
+        ),
+        migrations.AddField(
+            model_name='note',
+            name='user',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='notes', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(copy_note_owners, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.1 on 2026-10-18 20:58
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('LQ_Tasks', '0009_change_tracking'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Reminder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(choices=[('task', 'Task'), ('subtask', 'SubTask')], max_length=10)),
+                ('object_id', models.PositiveBigIntegerField()),
+                ('deadline', models.DateTimeField()),
+                ('kind', models.CharField(choices=[('upcoming', 'Upcoming'), ('overdue', 'Overdue')], max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SchedulerCursor',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('deadline', models.DateTimeField()),
+                ('object_id', models.PositiveBigIntegerField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='subtask',
+            index=models.Index(condition=models.Q(('deadline__isnull', False), models.Q(('status__in', ['COMPLETED', 'FAILED', 'ON_HOLD', 'DEFERRED']), _negated=True)), fields=['deadline', 'id'], name='subtask_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(('deadline__isnull', False), models.Q(('status__in', ['COMPLETED', 'FAILED', 'ON_HOLD', 'DEFERRED']), _negated=True)), fields=['deadline', 'id'], name='task_due_idx'),
+        ),
+        migrations.AddField(
+            model_name='reminder',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reminders', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='reminder',
+            index=models.Index(condition=models.Q(('sent_at__isnull', True)), fields=['id'], name='reminder_pending_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='reminder',
+            constraint=models.UniqueConstraint(fields=('model', 'object_id', 'deadline', 'kind'), name='unique_reminder'),
+        ),
+    ]
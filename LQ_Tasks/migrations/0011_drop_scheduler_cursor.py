@@ -0,0 +1,16 @@
+# Generated by Django 5.1 on 2026-10-18 21:57
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('LQ_Tasks', '0010_deadline_scheduler'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='SchedulerCursor',
+        ),
+    ]
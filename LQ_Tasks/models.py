@@ -4,6 +4,10 @@ from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey, GenericRelation
 
 
+# Задачи в этих статусах не отслеживаются планировщиком дедлайнов
+DEADLINE_EXEMPT_STATUSES = ['COMPLETED', 'FAILED', 'ON_HOLD', 'DEFERRED']
+
+
 class Task(models.Model):
     # Priority levels with game analogs
     PRIORITY_CHOICES = [
@@ -37,9 +41,22 @@ class Task(models.Model):
     priority = models.IntegerField(choices=PRIORITY_CHOICES)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='CREATED')
     deadline = models.DateTimeField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='tasks')
     notes = GenericRelation('Note')
 
+    class Meta:
+        indexes = [
+            # list/high_priority filter by user and order by priority or deadline
+            models.Index(fields=['user', 'priority', 'id'], name='task_user_priority_idx'),
+            models.Index(fields=['user', 'deadline', 'id'], name='task_user_deadline_idx'),
+            # Only rows the deadline scheduler still has to act on
+            models.Index(
+                fields=['deadline', 'id'], name='task_due_idx',
+                condition=models.Q(deadline__isnull=False) & ~models.Q(status__in=DEADLINE_EXEMPT_STATUSES),
+            ),
+        ]
+
     def __str__(self):
         return self.title
     
@@ -50,19 +67,32 @@ class SubTask(models.Model):
     priority = models.IntegerField(choices=Task.PRIORITY_CHOICES)
     status = models.CharField(max_length=20, choices=Task.STATUS_CHOICES, default='CREATED')
     deadline = models.DateTimeField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
     task = models.ForeignKey(Task, related_name='subtasks', on_delete=models.CASCADE)
     notes = GenericRelation('Note')
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['deadline', 'id'], name='subtask_due_idx',
+                condition=models.Q(deadline__isnull=False) & ~models.Q(status__in=DEADLINE_EXEMPT_STATUSES),
+            ),
+        ]
+
     def __str__(self):
         return f'{self.task} ->  {self.title}'
     
 
+    @staticmethod
+    def derive_priority(task_priority):
+        # Подзадача на один ранг ниже родительской задачи, но не ниже F
+        if task_priority > 1:
+            return task_priority - 1
+        return task_priority
+
     def save(self, *args, **kwargs):
         # Устанавливаем приоритет подзадачи равным приоритету родительской задачи
-        if self.task.priority > 1:
-            self.priority = self.task.priority - 1
-        else:
-            self.priority = self.task.priority
+        self.priority = self.derive_priority(self.task.priority)
         super(SubTask, self).save(*args, **kwargs)
 
 
@@ -74,6 +104,112 @@ class Note(models.Model):
     content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Владелец и родительская задача копируются из content_object при сохранении
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='notes', null=True, editable=False)
+    task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name='+', null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['content_type', 'object_id'], name='note_target_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_target = (instance.__dict__.get('content_type_id'), instance.__dict__.get('object_id'))
+        return instance
+
+    def save(self, *args, **kwargs):
+        target = (self.content_type_id, self.object_id)
+        if self.user_id is None or target != getattr(self, '_loaded_target', None):
+            self.set_owner(self.content_object)
+        super().save(*args, **kwargs)
+        self._loaded_target = target
+
+    def set_owner(self, target):
+        if isinstance(target, SubTask):
+            self.task_id, self.user_id = target.task_id, target.task.user_id
+        else:
+            self.task_id, self.user_id = target.pk, target.user_id
+
+    def __str__(self):
+        return f'{self.content_object} -> {self.title}'
+
+
+class TaskStatistic(models.Model):
+    # Счетчик задач/подзадач пользователя для одного значения статуса или приоритета
+    MODEL_CHOICES = [
+        ('task', 'Task'),
+        ('subtask', 'SubTask'),
+    ]
+    FIELD_CHOICES = [
+        ('status', 'Status'),
+        ('priority', 'Priority'),
+    ]
+
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='task_statistics')
+    model = models.CharField(max_length=10, choices=MODEL_CHOICES)
+    field = models.CharField(max_length=10, choices=FIELD_CHOICES)
+    value = models.CharField(max_length=20)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'model', 'field', 'value'], name='unique_task_statistic'),
+        ]
+
+    def __str__(self):
+        return f'{self.user} {self.model}.{self.field}={self.value}: {self.count}'
+
+
+class ChangeLog(models.Model):
+    # Последнее изменение объекта пользователя; seq растет монотонно, удаление оставляет запись
+    MODEL_CHOICES = [
+        ('task', 'Task'),
+        ('subtask', 'SubTask'),
+        ('note', 'Note'),
+    ]
+
+    seq = models.BigAutoField(primary_key=True)
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='changes')
+    model = models.CharField(max_length=10, choices=MODEL_CHOICES)
+    object_id = models.PositiveBigIntegerField()
+    deleted = models.BooleanField(default=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['model', 'object_id'], name='unique_change_object'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'seq'], name='change_user_seq_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.seq}: {self.model} {self.object_id}{" deleted" if self.deleted else ""}'
+
+
+class Reminder(models.Model):
+    # Очередь напоминаний о дедлайнах; sent_at заполняет отправитель
+    KIND_CHOICES = [
+        ('upcoming', 'Upcoming'),
+        ('overdue', 'Overdue'),
+    ]
+
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='reminders')
+    model = models.CharField(max_length=10, choices=ChangeLog.MODEL_CHOICES[:2])
+    object_id = models.PositiveBigIntegerField()
+    deadline = models.DateTimeField()
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['model', 'object_id', 'deadline', 'kind'], name='unique_reminder'),
+        ]
+        indexes = [
+            models.Index(fields=['id'], name='reminder_pending_idx', condition=models.Q(sent_at__isnull=True)),
+        ]
 
     def __str__(self):
-        return f'{self.content_object} -> {self.title}'
\ No newline at end of file
+        return f'{self.kind} {self.model} {self.object_id} @ {self.deadline}'
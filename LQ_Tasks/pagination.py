@@ -0,0 +1,166 @@
+import binascii
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from django.core.exceptions import ValidationError
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+from rest_framework.utils.urls import replace_query_param
+
+
+def encode_value(value):
+    # Full precision, unlike DjangoJSONEncoder which drops microseconds
+    return value.isoformat()
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor pagination that seeks on the full ordering tuple instead of
+    counting rows or skipping an OFFSET.
+
+    The ordering comes from the view's OrderingFilter (or its `ordering`
+    attribute) and always ends with `id`, so every row has a unique position.
+    The tiebreaker runs in the same direction as the column before it.
+    NULLs sort as the smallest value in both directions, which keeps nullable
+    columns such as `deadline` seekable. A cursor holds the position of the
+    row it was built from, so it stays valid while rows are inserted.
+    """
+    ordering = ('id',)
+    tiebreaker = 'id'
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def get_ordering(self, request, queryset, view):
+        if not any(hasattr(backend, 'get_ordering') for backend in getattr(view, 'filter_backends', [])):
+            ordering = getattr(view, 'ordering', None) or self.ordering
+            ordering = (ordering,) if isinstance(ordering, str) else tuple(ordering)
+        else:
+            ordering = super().get_ordering(request, queryset, view)
+        ordering = tuple('-id' if field == '-pk' else 'id' if field == 'pk' else field for field in ordering)
+        if self.tiebreaker not in (field.lstrip('-') for field in ordering):
+            # Same direction as the last column, so one index scan serves the whole ORDER BY
+            ordering += ('-' + self.tiebreaker if ordering[-1].startswith('-') else self.tiebreaker,)
+        return ordering
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = self.page_queryset(queryset, request, view)
+        if queryset is None:
+            return None
+        return self.set_page(list(queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        # Same page for async views; chunk_size lets aiterator() prefetch
+        queryset = self.page_queryset(queryset, request, view)
+        if queryset is None:
+            return None
+        return self.set_page([row async for row in queryset.aiterator(chunk_size=self.page_size + 1)])
+
+    def page_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.model = queryset.model
+        cursor = self.decode_cursor(request)
+        self.position, self.reverse = (cursor['p'], cursor['r']) if cursor else (None, False)
+
+        if self.position is not None:
+            try:
+                queryset = queryset.filter(self.seek(self.position, self.reverse))
+            except (TypeError, ValueError, ValidationError):
+                raise NotFound(self.invalid_cursor_message)
+        queryset = queryset.order_by(*self.order_by(self.reverse))
+        return queryset[:self.page_size + 1]
+
+    def set_page(self, rows):
+        position, reverse = self.position, self.reverse
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+
+        if rows:
+            first, last = self.get_position(rows[0]), self.get_position(rows[-1])
+        else:
+            # An empty page keeps pointing at where the client came from
+            first = last = position
+        self.next_position = last if (has_more if not reverse else position is not None) else None
+        self.previous_position = first if (has_more if reverse else position is not None) else None
+        self.page = rows
+        return rows
+
+    def columns(self):
+        for field in self.ordering:
+            name = field.lstrip('-')
+            yield name, field.startswith('-'), self.model._meta.get_field(name).null
+
+    def order_by(self, reverse):
+        expressions = []
+        for name, descending, nullable in self.columns():
+            if descending != reverse:
+                expressions.append(F(name).desc(nulls_last=True) if nullable else F(name).desc())
+            else:
+                expressions.append(F(name).asc(nulls_first=True) if nullable else F(name).asc())
+        return expressions
+
+    def seek(self, position, reverse):
+        # (a, b, id) > (x, y, z) expanded into OR-ed prefixes, honouring
+        # each column's direction and treating NULL as the smallest value
+        condition = Q(pk__in=[])
+        equal = Q()
+        for (name, descending, nullable), value in zip(self.columns(), position):
+            if descending != reverse:
+                if value is None:
+                    after = None
+                else:
+                    after = Q(**{f'{name}__lt': value})
+                    if nullable:
+                        after |= Q(**{f'{name}__isnull': True})
+            else:
+                after = Q(**{f'{name}__isnull': False}) if value is None else Q(**{f'{name}__gt': value})
+            if after is not None:
+                condition |= equal & after
+            equal &= Q(**{f'{name}__isnull': True}) if value is None else Q(**{name: value})
+        return condition
+
+    def get_position(self, row):
+        if isinstance(row, dict):
+            return [row[field.lstrip('-')] for field in self.ordering]
+        return [getattr(row, field.lstrip('-')) for field in self.ordering]
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            cursor = json.loads(urlsafe_b64decode(encoded.encode('ascii')))
+            valid = (
+                isinstance(cursor, dict) and cursor.get('o') == list(self.ordering)
+                and isinstance(cursor.get('p'), list) and len(cursor['p']) == len(self.ordering)
+            )
+        except (TypeError, ValueError, binascii.Error):
+            valid = False
+        if not valid:
+            raise NotFound(self.invalid_cursor_message)
+        return {'p': cursor['p'], 'r': bool(cursor.get('r'))}
+
+    def encode_cursor(self, position, reverse):
+        cursor = {'o': list(self.ordering), 'p': position}
+        if reverse:
+            cursor['r'] = 1
+        encoded = urlsafe_b64encode(json.dumps(cursor, default=encode_value).encode('ascii')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        return self.encode_cursor(self.next_position, reverse=False)
+
+    def get_previous_link(self):
+        if self.previous_position is None:
+            return None
+        return self.encode_cursor(self.previous_position, reverse=True)
@@ -0,0 +1,37 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import SubTask
+from . import changes, stats
+
+
+@transaction.atomic
+def propagate_priorities(tasks):
+    """
+    Re-derives the priority of every subtask of the given tasks from its
+    parent: one UPDATE per distinct derived priority, touching only rows
+    that are out of date.
+
+    Counters and the change log move with the rows, so statistics and
+    sync stay exact without loading the subtasks.
+    """
+    task_ids = defaultdict(list)
+    for task in tasks:
+        task_ids[SubTask.derive_priority(task.priority)].append(task.pk)
+
+    deltas = stats.new_deltas()
+    changed = []
+    for priority, ids in task_ids.items():
+        stale = SubTask.objects.filter(task_id__in=ids).exclude(priority=priority)
+        rows = list(stale.values_list('id', 'task__user', 'priority'))
+        if not rows:
+            continue
+        SubTask.objects.filter(id__in=[row[0] for row in rows]).update(priority=priority, updated_at=timezone.now())
+        for subtask_id, user_id, old_priority in rows:
+            deltas[user_id][('subtask', 'priority', str(old_priority))] -= 1
+            deltas[user_id][('subtask', 'priority', str(priority))] += 1
+            changed.append((user_id, SubTask(id=subtask_id)))
+    stats.apply_deltas(deltas)
+    changes.record(changed)
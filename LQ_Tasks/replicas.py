@@ -0,0 +1,123 @@
+import random
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+from .caching import is_pinned, pin_user
+from .timing import user_id
+
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+_current = ContextVar('replica_reads', default=None)
+
+
+def replica_aliases():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+class Reads:
+    """
+    Where the reads of one request go. A safe request reads one replica,
+    picked when it starts, until it writes or turns out to belong to a user
+    who wrote within the last REPLICA_PIN_SECONDS; from then on it reads the
+    primary. Other requests read the primary throughout.
+    """
+
+    def __init__(self, request, replica):
+        self.request = request
+        self.replica = replica
+        self.pinned = replica is None
+        self.wrote = False
+        self.user_checked = False
+
+    def alias(self):
+        if not self.pinned and not self.user_checked:
+            # The user is known once the view has authenticated the request
+            current = user_id(self.request)
+            if current is not None:
+                self.user_checked = True
+                self.pinned = is_pinned(current)
+        return DEFAULT_DB_ALIAS if self.pinned else self.replica
+
+    def written(self):
+        self.pinned = self.wrote = True
+
+
+class ReplicaRouter:
+    """
+    Sends reads of REPLICA_APPS models made by safe requests to a replica
+    in DATABASE_REPLICAS, and everything else to the primary. Users,
+    sessions and content types are always read from the primary, since they
+    are written by nearly every request that logs in or earns points.
+    Replicas must be at most REPLICA_PIN_SECONDS behind.
+    """
+
+    def db_for_read(self, model, **hints):
+        reads = _current.get()
+        if reads is None or model._meta.app_label not in getattr(settings, 'REPLICA_APPS', ('LQ_Tasks',)):
+            return None
+        return reads.alias()
+
+    def db_for_write(self, model, **hints):
+        reads = _current.get()
+        if reads is not None:
+            reads.written()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, *replica_aliases()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+
+class ReplicaMiddleware:
+    """
+    Tracks the reads and writes of each request for ReplicaRouter and pins
+    the user to the primary after a request that wrote. Does nothing
+    without DATABASE_REPLICAS. Queries of streamed bodies run after the
+    middleware returns and read the primary.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def start(self, request):
+        aliases = replica_aliases()
+        if not aliases:
+            return None
+        replica = random.choice(aliases) if request.method in SAFE_METHODS else None
+        return Reads(request, replica)
+
+    def finish(self, request, reads):
+        if reads is not None and reads.wrote:
+            current = user_id(request)
+            if current is not None:
+                pin_user(current)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        reads = self.start(request)
+        token = _current.set(reads)
+        try:
+            return self.get_response(request)
+        finally:
+            _current.reset(token)
+            self.finish(request, reads)
+
+    async def __acall__(self, request):
+        reads = self.start(request)
+        token = _current.set(reads)
+        try:
+            return await self.get_response(request)
+        finally:
+            _current.reset(token)
+            self.finish(request, reads)
@@ -0,0 +1,113 @@
+from django.db import connection
+from django.db.models import BooleanField, Exists, OuterRef
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+
+from .models import DEADLINE_EXEMPT_STATUSES, Task, SubTask, Reminder
+from .signals import bulk_saved
+from .transactions import write_atomic
+
+
+MODELS = {'task': Task, 'subtask': SubTask}
+# Statuses an overdue item can be moved to; they must leave the due index
+OVERDUE_STATUSES = [status for status in DEADLINE_EXEMPT_STATUSES if status != 'COMPLETED']
+
+
+def due(model):
+    """
+    Items the scheduler still has to act on, in deadline order. The filter
+    repeats the condition of the partial task_due_idx/subtask_due_idx, so
+    the query walks that index and never touches finished rows.
+    """
+    queryset = model.objects.filter(active_condition(model), deadline__isnull=False)
+    if model is SubTask:
+        queryset = queryset.select_related('task')
+    return queryset.order_by('deadline', 'id')
+
+
+def active_condition(model):
+    # Spelled out with literals: SQLite only picks a partial index when the
+    # query repeats its condition, and a bound parameter never matches one
+    quote = connection.ops.quote_name
+    statuses = ', '.join(f"'{status}'" for status in DEADLINE_EXEMPT_STATUSES)
+    return RawSQL(
+        f'NOT ({quote(model._meta.db_table)}.{quote("status")} IN ({statuses}))', [], output_field=BooleanField(),
+    )
+
+
+def owner_id(item):
+    return item.user_id if isinstance(item, Task) else item.task.user_id
+
+
+def reminders(name, items, kind):
+    return [
+        Reminder(user_id=owner_id(item), model=name, object_id=item.id, deadline=item.deadline, kind=kind)
+        for item in items
+    ]
+
+
+def mark_overdue(name, now, status, batch_size):
+    """
+    Moves up to `batch_size` items whose deadline passed to `status` and
+    queues an overdue reminder for each. Returns how many were handled.
+    Nothing is kept outside the rows themselves, so a restart picks up
+    where the last committed batch ended.
+    """
+    model = MODELS[name]
+    # Read under the write lock, so an item finished meanwhile is not
+    # overwritten and the stats snapshot taken at load is current
+    with write_atomic():
+        items = list(due(model).filter(deadline__lte=now)[:batch_size])
+        for item in items:
+            item.status = status
+            item.updated_at = now
+        if items:
+            model.objects.bulk_update(items, ['status', 'updated_at'])
+            # Counters, change log, caches and event streams follow bulk_saved
+            bulk_saved.send(sender=model, instances=items, created=False)
+            Reminder.objects.bulk_create(reminders(name, items, 'overdue'), ignore_conflicts=True)
+    return len(items)
+
+
+def enqueue_upcoming(name, now, lead, batch_size):
+    """
+    Queues an upcoming reminder for up to `batch_size` items due within
+    `lead` that do not have one yet. The whole window is scanned on every
+    pass, so items created or moved into it later are not missed; the
+    reminders themselves record what was handled, and unique_reminder keeps
+    concurrent passes from queueing one twice.
+    """
+    model = MODELS[name]
+    queued = Reminder.objects.filter(
+        model=name, object_id=OuterRef('pk'), deadline=OuterRef('deadline'), kind='upcoming',
+    )
+    items = list(due(model).filter(deadline__gt=now, deadline__lte=now + lead).filter(~Exists(queued))[:batch_size])
+    if not items:
+        return 0
+    with write_atomic():
+        Reminder.objects.bulk_create(reminders(name, items, 'upcoming'), ignore_conflicts=True)
+    return len(items)
+
+
+def run_once(status='FAILED', lead=None, batch_size=500, now=None):
+    """
+    Drains everything due at `now`, batch by batch. Returns
+    {(name, kind): count}.
+    """
+    if status not in OVERDUE_STATUSES:
+        raise ValueError(f'Overdue status must be one of {", ".join(OVERDUE_STATUSES)}')
+    now = now or timezone.now()
+    handled = {}
+    for name in MODELS:
+        steps = [('overdue', lambda: mark_overdue(name, now, status, batch_size))]
+        if lead:
+            steps.append(('upcoming', lambda: enqueue_upcoming(name, now, lead, batch_size)))
+        for kind, step in steps:
+            total = 0
+            while True:
+                count = step()
+                total += count
+                if count < batch_size:
+                    break
+            handled[(name, kind)] = total
+    return handled
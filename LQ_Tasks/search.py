@@ -0,0 +1,141 @@
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+from .models import Task, SubTask, Note
+
+
+SEARCH_TABLE = 'lq_search'
+
+# rowid = object id * STRIDE + kind code, so a row is found by rowid alone
+KINDS = {'task': 1, 'subtask': 2, 'note': 3}
+KIND_NAMES = {code: kind for kind, code in KINDS.items()}
+MODELS = {Task: 'task', SubTask: 'subtask', Note: 'note'}
+STRIDE = 4
+
+
+def is_available(using=connection):
+    # Probed once per connection wrapper; migrations reset the flag
+    available = getattr(using, 'lq_search_available', None)
+    if available is None:
+        available = using.vendor == 'sqlite' and SEARCH_TABLE in using.introspection.table_names()
+        using.lq_search_available = available
+    return available
+
+
+def row_id(kind, object_id):
+    return object_id * STRIDE + KINDS[kind]
+
+
+def document(instance):
+    """
+    Returns (rowid, title, body, owner token) for a task, subtask or note.
+    """
+    kind = MODELS[type(instance)]
+    if kind == 'task':
+        user_id, body = instance.user_id, instance.description
+    elif kind == 'subtask':
+        user_id, body = instance.task.user_id, instance.description
+    else:
+        user_id, body = instance.user_id, instance.content
+    return row_id(kind, instance.pk), instance.title, body or '', f'u{user_id}'
+
+
+def index(instances):
+    if not instances or not is_available():
+        return
+    rows = [document(instance) for instance in instances]
+    with connection.cursor() as cursor:
+        cursor.executemany(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [(row[0],) for row in rows])
+        cursor.executemany(f'INSERT INTO {SEARCH_TABLE} (rowid, title, body, owner) VALUES (%s, %s, %s, %s)', rows)
+
+
+def unindex(instances):
+    if not instances or not is_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s',
+            [(row_id(MODELS[type(instance)], instance.pk),) for instance in instances],
+        )
+
+
+def rebuild(batch_size=1000):
+    if not is_available():
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+    total = 0
+    querysets = (
+        Task.objects.all(),
+        SubTask.objects.select_related('task'),
+        Note.objects.all(),
+    )
+    for queryset in querysets:
+        batch = []
+        for instance in queryset.iterator(chunk_size=batch_size):
+            batch.append(instance)
+            if len(batch) == batch_size:
+                index(batch)
+                total, batch = total + len(batch), []
+        index(batch)
+        total += len(batch)
+    return total
+
+
+def match_expression(query):
+    # Every word becomes a quoted prefix term, so user input can never be
+    # parsed as FTS5 syntax
+    terms = re.findall(r'\w+', query)
+    return ' AND '.join(f'"{term}"*' for term in terms)
+
+
+def search(user, query, limit=20):
+    """
+    Returns ranked hits [{type, id, title, snippet, rank}] from the user's
+    tasks, subtasks and notes.
+    """
+    expression = match_expression(query)
+    if not expression:
+        return []
+    if not is_available():
+        return fallback_search(user, query, limit)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid, title, snippet({SEARCH_TABLE}, 1, '[', ']', '…', 12), "
+            f"bm25({SEARCH_TABLE}, 10.0, 1.0, 0.0) AS score "
+            f"FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s ORDER BY score LIMIT %s",
+            [f'owner:u{user.id} AND ({expression})', limit],
+        )
+        rows = cursor.fetchall()
+    return [
+        {
+            'type': KIND_NAMES[rowid % STRIDE],
+            'id': rowid // STRIDE,
+            'title': title,
+            'snippet': snippet,
+            'rank': round(-score, 6),
+        }
+        for rowid, title, snippet, score in rows
+    ]
+
+
+def fallback_search(user, query, limit):
+    # Backends without FTS5: unranked icontains over the same fields
+    words = re.findall(r'\w+', query)
+    hits = []
+    sources = (
+        ('task', Task.objects.filter(user=user), 'description'),
+        ('subtask', SubTask.objects.filter(task__user=user), 'description'),
+        ('note', Note.objects.filter(user=user), 'content'),
+    )
+    for kind, queryset, body_field in sources:
+        for word in words:
+            queryset = queryset.filter(Q(title__icontains=word) | Q(**{f'{body_field}__icontains': word}))
+        for pk, title in queryset.values_list('pk', 'title')[:limit - len(hits)]:
+            hits.append({'type': kind, 'id': pk, 'title': title, 'snippet': None, 'rank': None})
+        if len(hits) >= limit:
+            break
+    return hits
+
@@ -2,13 +2,44 @@ from rest_framework import serializers
 from .models import Task, SubTask, Note
 from generic_relations.relations import GenericRelatedField
 from django.contrib.contenttypes.models import ContentType
-from django.core.exceptions import ObjectDoesNotExist
+from .fieldsets import ExpandableFieldsMixin
+from .signals import bulk_saved
+from .targets import get_content_type, resolve_target, resolve_targets
 
 
-class SubTaskSerializer(serializers.ModelSerializer):
+class PreloadedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    # Looks the object up in context['preloaded'] first, so callers that
+    # validate many payloads at once can fetch the related rows in bulk
+    def to_internal_value(self, data):
+        preloaded = self.context.get('preloaded', {})
+        try:
+            return preloaded[int(data)]
+        except (KeyError, TypeError, ValueError):
+            return super().to_internal_value(data)
+
+
+class SubTaskListSerializer(serializers.ListSerializer):
+    def create(self, validated_data):
+        # Priorities come from the parent instances already in memory, and
+        # all rows go in with one INSERT instead of a save() per subtask
+        subtasks = [SubTask(**item) for item in validated_data]
+        for subtask in subtasks:
+            subtask.priority = SubTask.derive_priority(subtask.task.priority)
+        SubTask.objects.bulk_create(subtasks)
+        bulk_saved.send(sender=SubTask, instances=subtasks, created=True)
+        return subtasks
+
+
+class SubTaskSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
+    task = PreloadedPrimaryKeyRelatedField(queryset=Task.objects.all())
+    expandable_fields = {
+        'notes': lambda expand: NoteSerializer(many=True, read_only=True),
+    }
+
     class Meta:
         model = SubTask
         fields = '__all__'
+        list_serializer_class = SubTaskListSerializer
 
     def create(self, validated_data):
         request = self.context.get('request', None)
@@ -17,12 +48,16 @@ class SubTaskSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
-class TaskSerializer(serializers.ModelSerializer):
+class TaskSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
     subtasks = SubTaskSerializer(many=True, read_only=True)
+    expandable_fields = {
+        'subtasks': lambda expand: SubTaskSerializer(many=True, read_only=True, expand=expand),
+        'notes': lambda expand: NoteSerializer(many=True, read_only=True),
+    }
 
     class Meta:
         model = Task
-        fields = ['id', 'title', 'description', 'priority', 'status', 'subtasks']
+        fields = ['id', 'title', 'description', 'priority', 'status', 'updated_at', 'subtasks']
     
     def create(self, validated_data):
         request = self.context.get('request', None)
@@ -31,11 +66,50 @@ class TaskSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
-class NoteSerializer(serializers.ModelSerializer):
+class SyncTaskSerializer(TaskSerializer):
+    # Subtasks are synced as rows of their own
+    subtasks = None
+
+    class Meta(TaskSerializer.Meta):
+        fields = [field for field in TaskSerializer.Meta.fields if field != 'subtasks']
+
+
+class ContentTypeField(serializers.PrimaryKeyRelatedField):
+    # ContentTypeManager caches content types in process, so no query per request
+    def to_internal_value(self, data):
+        try:
+            return ContentType.objects.get_for_id(data)
+        except (ContentType.DoesNotExist, TypeError, ValueError):
+            self.fail('does_not_exist', pk_value=data)
+
+
+class NoteListSerializer(serializers.ListSerializer):
+    def to_internal_value(self, data):
+        # Resolve every target up front with one query per content type
+        if isinstance(data, list):
+            self._context['resolved_targets'] = resolve_targets(
+                (item.get('content_type'), item.get('object_id')) for item in data if isinstance(item, dict)
+            )
+        return super().to_internal_value(data)
+
+    def create(self, validated_data):
+        notes = []
+        for item in validated_data:
+            note = Note(**item)
+            note.set_owner(item['content_object'])
+            notes.append(note)
+        Note.objects.bulk_create(notes)
+        bulk_saved.send(sender=Note, instances=notes, created=True)
+        return notes
+
+
+class NoteSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
+    content_type = ContentTypeField(queryset=ContentType.objects.all())
 
     class Meta:
         model = Note
         fields = ['id', 'title', 'content', 'created_at', 'updated_at', 'content_type', 'object_id']
+        list_serializer_class = NoteListSerializer
     
     def update(self, instance, validated_data):
         # Обработка обновления
@@ -48,10 +122,8 @@ class NoteSerializer(serializers.ModelSerializer):
         content_type = data.get('content_type')
         object_id = data.get('object_id')
         if self.partial:
-            note = self.instance
-            content_type = note.content_type
-            object_id = note.object_id
-            data['content_object'] = self.add_content_object(content_type, object_id)
+            # Only title and content can change, the note keeps its target
+            return data
         elif content_type and object_id:
             data['content_object'] = self.add_content_object(content_type, object_id)
         else:
@@ -59,11 +131,42 @@ class NoteSerializer(serializers.ModelSerializer):
         return data  
     
     def add_content_object(self, content_type, object_id):
-        try:
-            content_type_instance = ContentType.objects.get(model=content_type.model)
-            content_object = content_type_instance.get_object_for_this_type(id=object_id)
-            return content_object
-        except ContentType.DoesNotExist:
+        if get_content_type(content_type) is None:
             raise serializers.ValidationError({"content_type": "Invalid content type"})
-        except ObjectDoesNotExist:
+        resolved = self.context.get('resolved_targets')
+        if resolved is not None:
+            content_object = resolved.get((content_type.pk, object_id))
+        else:
+            content_object = resolve_target(content_type, object_id)
+        if content_object is None:
             raise serializers.ValidationError({"object_id": "Invalid object id"})
+        return content_object
+
+
+class NoteImportSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Note
+        fields = ['title', 'content']
+
+
+class SubTaskImportSerializer(serializers.ModelSerializer):
+    # Priority is derived from the parent task, as on save()
+    notes = NoteImportSerializer(many=True, required=False)
+
+    class Meta:
+        model = SubTask
+        fields = ['title', 'description', 'status', 'deadline', 'notes']
+
+
+class TaskImportSerializer(serializers.ModelSerializer):
+    """
+    Validates one line of an NDJSON import, in the shape /api/export/
+    writes: a task with its notes and subtasks, each subtask with notes.
+    Ids and timestamps in the document are ignored.
+    """
+    subtasks = SubTaskImportSerializer(many=True, required=False)
+    notes = NoteImportSerializer(many=True, required=False)
+
+    class Meta:
+        model = Task
+        fields = ['title', 'description', 'priority', 'status', 'deadline', 'subtasks', 'notes']
@@ -0,0 +1,198 @@
+import threading
+
+from django.contrib.contenttypes.models import ContentType
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete, pre_save
+from django.dispatch import Signal, receiver
+
+from accounts.models import CustomUser
+from .models import Task, SubTask, Note
+from . import caching, changes, search, stats
+from .priorities import propagate_priorities
+
+
+# Sent by code that writes with bulk_create/bulk_update, which skip post_save.
+# Receivers get `instances` (a list of the sender model) and `created`.
+bulk_saved = Signal()
+
+# Owners of tasks that are being deleted, so cascaded subtasks can be counted
+# without loading their parent again
+_deleting = threading.local()
+
+
+def deleting_task_owners():
+    if not hasattr(_deleting, 'owners'):
+        _deleting.owners = {}
+    return _deleting.owners
+
+
+def deleting_users():
+    if not hasattr(_deleting, 'users'):
+        _deleting.users = set()
+    return _deleting.users
+
+
+@receiver(post_init, sender=Task)
+@receiver(post_init, sender=SubTask)
+def remember_tracked_values(sender, instance, **kwargs):
+    instance._tracked = stats.snapshot(instance)
+    if sender is SubTask:
+        instance._loaded_task_id = instance.__dict__.get('task_id')
+
+
+def count_saved(instances, created):
+    deltas = stats.new_deltas()
+    for instance in instances:
+        model = stats.MODEL_NAMES[type(instance)]
+        user_id = stats.owner_id(instance)
+        if not created:
+            stats.collect(deltas, user_id, model, instance._tracked, -1)
+        instance._tracked = stats.snapshot(instance)
+        stats.collect(deltas, user_id, model, instance._tracked, 1)
+    stats.apply_deltas(deltas)
+
+
+@receiver(post_save, sender=Task)
+@receiver(post_save, sender=SubTask)
+def update_statistics_on_save(sender, instance, created, **kwargs):
+    count_saved([instance], created)
+
+
+@receiver(bulk_saved, sender=Task)
+@receiver(bulk_saved, sender=SubTask)
+def update_statistics_on_bulk_save(sender, instances, created, **kwargs):
+    count_saved(instances, created)
+
+
+@receiver(pre_delete, sender=Task)
+def remember_deleted_task_owner(sender, instance, **kwargs):
+    deleting_task_owners()[instance.pk] = instance.user_id
+
+
+@receiver(post_delete, sender=Task)
+@receiver(post_delete, sender=SubTask)
+def update_statistics_on_delete(sender, instance, **kwargs):
+    if sender is SubTask and not SubTask.task.is_cached(instance):
+        user_id = deleting_task_owners().get(instance.task_id) or stats.owner_id(instance)
+    else:
+        user_id = stats.owner_id(instance)
+    if sender is Task:
+        deleting_task_owners().pop(instance.pk, None)
+    deltas = stats.new_deltas()
+    stats.collect(deltas, user_id, stats.MODEL_NAMES[sender], instance._tracked, -1)
+    stats.apply_deltas(deltas)
+
+
+@receiver(post_save, sender=Task)
+@receiver(post_save, sender=SubTask)
+@receiver(post_save, sender=Note)
+def update_search_index_on_save(sender, instance, **kwargs):
+    search.index([instance])
+
+
+@receiver(bulk_saved, sender=Task)
+@receiver(bulk_saved, sender=SubTask)
+@receiver(bulk_saved, sender=Note)
+def update_search_index_on_bulk_save(sender, instances, **kwargs):
+    search.index(instances)
+
+
+@receiver(post_delete, sender=Task)
+@receiver(post_delete, sender=SubTask)
+@receiver(post_delete, sender=Note)
+def update_search_index_on_delete(sender, instance, **kwargs):
+    search.unindex([instance])
+
+
+def move_subtask_notes(subtasks):
+    # Notes keep a copy of their parent task, which changes when a subtask moves
+    subtask_type = ContentType.objects.get_for_model(SubTask)
+    for subtask in subtasks:
+        if subtask._loaded_task_id not in (None, subtask.task_id):
+            Note.objects.filter(content_type=subtask_type, object_id=subtask.pk).update(task_id=subtask.task_id)
+        subtask._loaded_task_id = subtask.task_id
+
+
+@receiver(post_save, sender=SubTask)
+def update_note_parents_on_save(sender, instance, created, **kwargs):
+    if not created:
+        move_subtask_notes([instance])
+
+
+@receiver(bulk_saved, sender=SubTask)
+def update_note_parents_on_bulk_save(sender, instances, created, **kwargs):
+    if not created:
+        move_subtask_notes(instances)
+
+
+def data_owner(instance):
+    if isinstance(instance, SubTask) and not SubTask.task.is_cached(instance):
+        return deleting_task_owners().get(instance.task_id) or stats.owner_id(instance)
+    return stats.owner_id(instance) if isinstance(instance, SubTask) else instance.user_id
+
+
+@receiver(post_save, sender=Task)
+@receiver(post_save, sender=SubTask)
+@receiver(post_save, sender=Note)
+@receiver(post_delete, sender=Task)
+@receiver(post_delete, sender=SubTask)
+@receiver(post_delete, sender=Note)
+def invalidate_cached_responses(sender, instance, **kwargs):
+    caching.invalidate([data_owner(instance)])
+
+
+@receiver(bulk_saved, sender=Task)
+@receiver(bulk_saved, sender=SubTask)
+@receiver(bulk_saved, sender=Note)
+def invalidate_cached_responses_on_bulk_save(sender, instances, **kwargs):
+    caching.invalidate(data_owner(instance) for instance in instances)
+
+
+@receiver(pre_save, sender=Task)
+def detect_priority_change(sender, instance, **kwargs):
+    # Compared before post_save handlers refresh the snapshot
+    instance._priority_changed = (
+        not instance._state.adding and instance._tracked['priority'] != instance.priority
+    )
+
+
+@receiver(post_save, sender=Task)
+def propagate_priority_on_save(sender, instance, created, **kwargs):
+    if getattr(instance, '_priority_changed', False):
+        propagate_priorities([instance])
+
+
+@receiver(pre_delete, sender=CustomUser)
+def remember_deleted_user(sender, instance, **kwargs):
+    deleting_users().add(instance.pk)
+
+
+@receiver(post_delete, sender=CustomUser)
+def forget_deleted_user(sender, instance, **kwargs):
+    deleting_users().discard(instance.pk)
+
+
+def record_changes(instances, deleted=False):
+    # A deleted user's change log goes with them, so their cascade leaves no tombstones
+    owners = [(data_owner(instance), instance) for instance in instances]
+    changes.record([(user_id, instance) for user_id, instance in owners if user_id not in deleting_users()], deleted)
+
+
+@receiver(post_save, sender=Task)
+@receiver(post_save, sender=SubTask)
+@receiver(post_save, sender=Note)
+def record_change_on_save(sender, instance, **kwargs):
+    record_changes([instance])
+
+
+@receiver(bulk_saved, sender=Task)
+@receiver(bulk_saved, sender=SubTask)
+@receiver(bulk_saved, sender=Note)
+def record_changes_on_bulk_save(sender, instances, **kwargs):
+    record_changes(instances)
+
+
+@receiver(post_delete, sender=Task)
+@receiver(post_delete, sender=SubTask)
+@receiver(post_delete, sender=Note)
+def record_change_on_delete(sender, instance, **kwargs):
+    record_changes([instance], deleted=True)
@@ -0,0 +1,109 @@
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Case, Count, F, Q, When
+
+from .models import Task, SubTask, TaskStatistic
+
+
+TRACKED_FIELDS = ('status', 'priority')
+MODEL_NAMES = {Task: 'task', SubTask: 'subtask'}
+
+
+def snapshot(instance):
+    # Read straight from __dict__ so deferred fields are never loaded
+    return {field: instance.__dict__.get(field) for field in TRACKED_FIELDS}
+
+
+def owner_id(instance):
+    if isinstance(instance, Task):
+        return instance.user_id
+    if SubTask.task.is_cached(instance):
+        return instance.task.user_id
+    return Task.objects.filter(pk=instance.task_id).values_list('user_id', flat=True).first()
+
+
+def collect(deltas, user_id, model, values, sign):
+    for field, value in values.items():
+        if value is not None:
+            deltas[user_id][(model, field, str(value))] += sign
+
+
+def apply_deltas(deltas):
+    """
+    Applies {user_id: Counter({(model, field, value): delta})} to the
+    counters with one INSERT of missing rows and one UPDATE per user.
+    """
+    for user_id, changes in deltas.items():
+        changes = {key: delta for key, delta in changes.items() if delta}
+        if not changes:
+            continue
+        with transaction.atomic():
+            created = [key for key, delta in changes.items() if delta > 0]
+            if created:
+                TaskStatistic.objects.bulk_create(
+                    [TaskStatistic(user_id=user_id, model=model, field=field, value=value)
+                     for model, field, value in created],
+                    ignore_conflicts=True,
+                )
+            condition = Q()
+            for model, field, value in changes:
+                condition |= Q(model=model, field=field, value=value)
+            increment = Case(
+                *(When(model=model, field=field, value=value, then=delta)
+                  for (model, field, value), delta in changes.items()),
+                default=0,
+            )
+            TaskStatistic.objects.filter(condition, user_id=user_id).update(count=F('count') + increment)
+
+
+def statistic_rows(user):
+    return TaskStatistic.objects.filter(user=user, count__gt=0).values_list('model', 'field', 'value', 'count')
+
+
+def user_statistics(user):
+    return format_statistics(statistic_rows(user))
+
+
+async def auser_statistics(user):
+    return format_statistics([row async for row in statistic_rows(user)])
+
+
+def format_statistics(rows):
+    statistics = {
+        model: {'total': 0, **{field: {} for field in TRACKED_FIELDS}}
+        for model in MODEL_NAMES.values()
+    }
+    for model, field, value, count in rows:
+        statistics[model][field][value] = count
+        if field == 'status':
+            statistics[model]['total'] += count
+    return {f'{model}s': values for model, values in statistics.items()}
+
+
+@transaction.atomic
+def rebuild(users=None):
+    """
+    Recomputes the counters from the task tables. Pass a queryset or list
+    of users to limit the rebuild to them.
+    """
+    tasks, subtasks, counters = Task.objects.all(), SubTask.objects.all(), TaskStatistic.objects.all()
+    if users is not None:
+        tasks, subtasks, counters = (
+            tasks.filter(user__in=users), subtasks.filter(task__user__in=users), counters.filter(user__in=users),
+        )
+    counters.delete()
+
+    rows = []
+    for model, queryset, user_field in (('task', tasks, 'user'), ('subtask', subtasks, 'task__user')):
+        for field in TRACKED_FIELDS:
+            for user_id, value, count in (
+                queryset.order_by().values_list(user_field, field).annotate(count=Count('id'))
+            ):
+                rows.append(TaskStatistic(user_id=user_id, model=model, field=field, value=str(value), count=count))
+    TaskStatistic.objects.bulk_create(rows, batch_size=500)
+    return len(rows)
+
+
+def new_deltas():
+    return defaultdict(Counter)
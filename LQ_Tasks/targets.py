@@ -0,0 +1,65 @@
+from collections import defaultdict
+
+from django.contrib.contenttypes.models import ContentType
+
+from .models import Task, SubTask
+
+
+# Models a note can be attached to, with the query that also loads the owner
+TARGET_QUERYSETS = {
+    Task: lambda: Task.objects.all(),
+    SubTask: lambda: SubTask.objects.select_related('task'),
+}
+
+
+def get_content_type(content_type):
+    """
+    Returns a note target ContentType from an instance or id, or None.
+    Lookups go through ContentTypeManager's in-process cache.
+    """
+    if isinstance(content_type, ContentType):
+        content_type = content_type.pk
+    try:
+        content_type = ContentType.objects.get_for_id(content_type)
+    except (ContentType.DoesNotExist, TypeError, ValueError):
+        return None
+    return content_type if content_type.model_class() in TARGET_QUERYSETS else None
+
+
+def target_owner_id(target):
+    if isinstance(target, SubTask):
+        return target.task.user_id
+    return target.user_id
+
+
+def resolve_target(content_type, object_id):
+    """
+    Loads a note target together with its owner in one query. Returns
+    None when the content type or the object does not exist.
+    """
+    content_type = get_content_type(content_type)
+    if content_type is None:
+        return None
+    return TARGET_QUERYSETS[content_type.model_class()]().filter(pk=object_id).first()
+
+
+def resolve_targets(pairs):
+    """
+    Resolves many (content_type, object_id) pairs with one query per
+    content type. Returns {(content_type_id, object_id): target}; pairs that
+    do not resolve are left out.
+    """
+    wanted = defaultdict(set)
+    for content_type, object_id in pairs:
+        content_type = get_content_type(content_type)
+        if content_type is not None:
+            try:
+                wanted[content_type].add(int(object_id))
+            except (TypeError, ValueError):
+                pass
+    targets = {}
+    for content_type, object_ids in wanted.items():
+        queryset = TARGET_QUERYSETS[content_type.model_class()]()
+        for pk, target in queryset.in_bulk(object_ids).items():
+            targets[(content_type.pk, pk)] = target
+    return targets
@@ -1,9 +1,34 @@
+import base64
+import csv
+import os
+import json
+import re
+import sqlite3
+import tempfile
+import threading
+from io import StringIO
+from unittest import skipUnless
+from django.core.management import call_command
 from django.urls import reverse
 from django.contrib.contenttypes.models import ContentType
+from datetime import timedelta
+from django.db import OperationalError, connection, connections
+from django.db.models import F
+from django.db.models.signals import post_save
+from django.utils import timezone
+from asgiref.sync import async_to_sync, sync_to_async
+from django.test import AsyncRequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
 from rest_framework.test import APITestCase
-from rest_framework import status
+from rest_framework import serializers, status
+from rest_framework.exceptions import PermissionDenied
+from rest_framework.utils.encoders import JSONEncoder
 from accounts.models import CustomUser
-from .models import SubTask, Task, Note
+from .models import SubTask, Task, Note, TaskStatistic, ChangeLog, Reminder
+from .serializers import NoteSerializer, SubTaskSerializer, TaskSerializer
+from . import caching, changes, events, fastpath, replicas, scheduler, search, timing
+from .async_views import EventStreamView
+from .transactions import write_atomic
 
 class TaskTests(APITestCase):
     def setUp(self):
@@ -216,4 +241,1485 @@ class NoteTests(APITestCase):
             'object_id': another_task.id,
         }
         response = self.client.post(url, data, format='json')
-        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
\ No newline at end of file
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class QueryCountTests(APITestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='testuser', password='testpassword')
+        self.client.login(username='testuser', password='testpassword')
+
+    def add_tasks(self, count, priority=8):
+        for i in range(count):
+            task = Task.objects.create(title=f'Task {i}', priority=priority, user=self.user)
+            for j in range(3):
+                SubTask.objects.create(task=task, title=f'SubTask {i}.{j}')
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(ctx.captured_queries)
+
+    def assertConstantQueries(self, url):
+        self.add_tasks(2)
+        small = self.count_queries(url)
+        self.add_tasks(6)
+        self.assertEqual(self.count_queries(url), small)
+
+    def test_task_list_query_count_is_constant(self):
+        self.assertConstantQueries('/api/tasks/')
+
+    def test_high_priority_query_count_is_constant(self):
+        self.assertConstantQueries('/api/tasks/high_priority/')
+
+    def test_subtask_list_query_count_is_constant(self):
+        task = Task.objects.create(title='Parent', priority=5, user=self.user)
+        url = reverse('subtask-list', kwargs={'task_pk': task.id})
+        self.assertConstantQueries(url)
+
+    def test_task_detail_prefetches_subtasks(self):
+        self.add_tasks(1)
+        task = Task.objects.get()
+        # session, user, task, subtasks
+        with self.assertNumQueries(4):
+            response = self.client.get(f'/api/tasks/{task.id}/')
+        self.assertEqual(len(response.data['subtasks']), 3)
+
+
+class BatchTests(APITestCase):
+    url = '/api/tasks/batch/'
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='testuser', password='testpassword')
+        self.client.login(username='testuser', password='testpassword')
+        self.task = Task.objects.create(title='Main Task', priority=5, user=self.user)
+
+    def test_mixed_operations(self):
+        subtask = SubTask.objects.create(task=self.task, title='Old SubTask')
+        done = Task.objects.create(title='Done', priority=3, status='COMPLETED', user=self.user)
+        operations = [
+            {'op': 'create', 'model': 'task', 'data': {'title': 'Created', 'priority': 4}},
+            {'op': 'update', 'model': 'task', 'id': self.task.id, 'data': {'priority': 9}},
+            {'op': 'create', 'model': 'subtask', 'data': {'title': 'New', 'priority': 1, 'task': self.task.id}},
+            {'op': 'update', 'model': 'subtask', 'id': subtask.id, 'data': {'title': 'Renamed'}},
+            {'op': 'delete', 'model': 'task', 'id': done.id},
+        ]
+        response = self.client.post(self.url, operations, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['status'] for item in response.data], [201, 200, 201, 200, 204])
+        self.assertTrue(Task.objects.filter(id=response.data[0]['id'], title='Created').exists())
+        self.assertFalse(Task.objects.filter(id=done.id).exists())
+        # Subtask priority is derived from the parent, as in SubTask.save
+        new_subtask = SubTask.objects.get(id=response.data[2]['id'])
+        self.assertEqual(new_subtask.priority, 8)
+        subtask.refresh_from_db()
+        self.assertEqual((subtask.title, subtask.priority), ('Renamed', 8))
+
+    def test_subtask_priority_follows_later_task_update(self):
+        subtask = SubTask.objects.create(task=self.task, title='Old SubTask')
+        operations = [
+            {'op': 'update', 'model': 'subtask', 'id': subtask.id, 'data': {'title': 'Renamed'}},
+            {'op': 'create', 'model': 'subtask', 'data': {'title': 'New', 'priority': 1, 'task': self.task.id}},
+            {'op': 'update', 'model': 'task', 'id': self.task.id, 'data': {'priority': 9}},
+        ]
+        response = self.client.post(self.url, operations, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(SubTask.objects.order_by('id').values_list('priority', flat=True)), [8, 8])
+        counts = TaskStatistic.objects.filter(user=self.user, model='subtask', field='priority', count__gt=0)
+        self.assertEqual(list(counts.values_list('value', 'count')), [('8', 2)])
+
+    def test_invalid_item_rolls_back_whole_batch(self):
+        operations = [
+            {'op': 'create', 'model': 'task', 'data': {'title': 'Created', 'priority': 4}},
+            {'op': 'delete', 'model': 'task', 'id': self.task.id},
+            {'op': 'create', 'model': 'task', 'data': {'title': 'No priority'}},
+        ]
+        response = self.client.post(self.url, operations, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual([item['status'] for item in response.data], [201, 403, 400])
+        self.assertIn('priority', response.data[2]['errors'])
+        self.assertEqual(Task.objects.count(), 1)
+
+    def test_cannot_touch_another_users_task(self):
+        another_user = CustomUser.objects.create_user(username='anotheruser', password='anotherpass')
+        another_task = Task.objects.create(title='Another Task', priority=5, user=another_user)
+        operations = [
+            {'op': 'update', 'model': 'task', 'id': another_task.id, 'data': {'title': 'Mine'}},
+            {'op': 'create', 'model': 'subtask', 'data': {'title': 'Sneaky', 'priority': 1, 'task': another_task.id}},
+        ]
+        response = self.client.post(self.url, operations, format='json')
+        self.assertEqual([item['status'] for item in response.data], [404, 403])
+        self.assertEqual(SubTask.objects.count(), 0)
+
+    def test_cannot_delete_task_given_subtasks_earlier_in_batch(self):
+        done = Task.objects.create(title='Done', priority=3, status='COMPLETED', user=self.user)
+        subtask = SubTask.objects.create(task=self.task, title='Moved')
+        for operation, expected in (
+            ({'op': 'create', 'model': 'subtask', 'data': {'title': 'X', 'task': done.id, 'priority': 5}}, 201),
+            ({'op': 'update', 'model': 'subtask', 'id': subtask.id, 'data': {'task': done.id}}, 200),
+        ):
+            operations = [operation, {'op': 'delete', 'model': 'task', 'id': done.id}]
+            response = self.client.post(self.url, operations, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertEqual([item['status'] for item in response.data], [expected, 400])
+            self.assertTrue(Task.objects.filter(id=done.id).exists())
+
+    def test_query_count_does_not_grow_with_batch_size(self):
+        def run(count):
+            operations = [
+                {'op': 'create', 'model': 'subtask', 'data': {'title': f'S{i}', 'priority': 1, 'task': self.task.id}}
+                for i in range(count)
+            ]
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.post(self.url, operations, format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            return len(ctx.captured_queries)
+
+        self.assertEqual(run(2), run(20))
+
+
+class KeysetPaginationTests(APITestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='testuser', password='testpassword')
+        self.client.login(username='testuser', password='testpassword')
+
+    def walk(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            ids += [item['id'] for item in response.data['results']]
+            url = response.data['next']
+        return ids
+
+    def test_walks_ties_in_priority_without_gaps(self):
+        tasks = [Task.objects.create(title=f'Task {i}', priority=i % 3 + 1, user=self.user) for i in range(25)]
+        expected = [task.id for task in sorted(tasks, key=lambda task: (task.priority, task.id))]
+        self.assertEqual(self.walk('/api/tasks/?page_size=4'), expected)
+
+    def test_nullable_deadline_ordering(self):
+        now = timezone.now()
+        for i in range(7):
+            deadline = None if i % 2 else now + timedelta(days=i % 3, microseconds=i)
+            Task.objects.create(title=f'Task {i}', priority=5, deadline=deadline, user=self.user)
+        expected = list(Task.objects.order_by(F('deadline').desc(nulls_last=True), '-id').values_list('id', flat=True))
+        self.assertEqual(self.walk('/api/tasks/?ordering=-deadline&page_size=2'), expected)
+
+    def test_cursor_survives_inserts_and_skips_count(self):
+        for i in range(4):
+            Task.objects.create(title=f'Task {i}', priority=5, user=self.user)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/tasks/?page_size=2')
+        self.assertFalse(any('COUNT(' in query['sql'] for query in ctx.captured_queries))
+        seen = [item['id'] for item in response.data['results']]
+        # Rows inserted before the cursor position do not shift the next page
+        Task.objects.create(title='Inserted', priority=1, user=self.user)
+        response = self.client.get(response.data['next'])
+        self.assertEqual([item['id'] for item in response.data['results']], [seen[-1] + 1, seen[-1] + 2])
+
+        response = self.client.get(response.data['previous'])
+        self.assertEqual([item['id'] for item in response.data['results']], seen)
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/tasks/?cursor=bm9wZQ==')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_note_list_is_paginated(self):
+        task = Task.objects.create(title='Parent', priority=5, user=self.user)
+        notes = [Note.objects.create(title=f'Note {i}', content='...', content_object=task) for i in range(3)]
+        url = reverse('task-note-list', args=[task.id])
+        self.assertEqual(self.walk(f'{url}?page_size=2'), [note.id for note in notes])
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN is SQLite specific')
+class QueryPlanTests(APITestCase):
+    # Plan lines such as "SCAN LQ_Tasks_task" mean a full table scan;
+    # "SCAN ... USING INDEX" walks an index and is fine
+    full_scan = re.compile(r'^SCAN (?P<table>\w+)(?! USING (COVERING )?INDEX)')
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='testuser', password='testpassword')
+        self.client.force_authenticate(self.user)
+        self.task = Task.objects.create(title='Task', priority=8, user=self.user)
+        self.subtask = SubTask.objects.create(task=self.task, title='SubTask')
+        Task.objects.create(title='Other Task', priority=3, deadline=timezone.now(), user=self.user)
+        Note.objects.create(title='Note', content='...', content_object=self.task)
+        Note.objects.create(title='Note', content='...', content_object=self.subtask)
+
+    def full_scans(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        scans = []
+        for query in ctx.captured_queries:
+            with connection.cursor() as cursor:
+                cursor.execute('EXPLAIN QUERY PLAN ' + query['sql'])
+                plan = [row[-1] for row in cursor.fetchall()]
+            scans += [(line, query['sql']) for line in plan if self.full_scan.match(line)]
+        return scans, response
+
+    def assertNoFullScan(self, url):
+        scans, response = self.full_scans(url)
+        self.assertEqual(scans, [], url)
+        return response
+
+    def test_task_endpoints(self):
+        for ordering in ('priority', '-priority', 'deadline', '-deadline'):
+            response = self.assertNoFullScan(f'/api/tasks/?ordering={ordering}&page_size=1')
+            self.assertNoFullScan(response.data['next'])
+        self.assertNoFullScan('/api/tasks/high_priority/')
+        self.assertNoFullScan(f'/api/tasks/{self.task.id}/')
+        self.assertNoFullScan(reverse('task-subtasks', args=[self.task.id]))
+
+    def test_subtask_endpoints(self):
+        self.assertNoFullScan(reverse('subtask-detail', args=[self.task.id, self.subtask.id]))
+
+    def test_note_endpoints(self):
+        self.assertNoFullScan(reverse('task-note-list', args=[self.task.id]))
+        self.assertNoFullScan(reverse('subtask-note-list', args=[self.task.id, self.subtask.id]))
+
+    def test_detects_full_scan(self):
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN SELECT * FROM "LQ_Tasks_task" WHERE "title" = %s', ['Task'])
+            plan = [row[-1] for row in cursor.fetchall()]
+        self.assertTrue(any(self.full_scan.match(line) for line in plan))
+
+
+class TaskStatisticsTests(APITestCase):
+    url = '/api/tasks/stats/'
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='testuser', password='testpassword')
+        self.client.login(username='testuser', password='testpassword')
+
+    def stats(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_counters_follow_creates_updates_and_deletes(self):
+        task = Task.objects.create(title='Task', priority=5, user=self.user)
+        Task.objects.create(title='Done', priority=3, status='COMPLETED', user=self.user)
+        SubTask.objects.create(task=task, title='SubTask')
+        self.assertEqual(self.stats()['tasks'], {
+            'total': 2, 'status': {'CREATED': 1, 'COMPLETED': 1}, 'priority': {'5': 1, '3': 1},
+        })
+        self.assertEqual(self.stats()['subtasks']['priority'], {'4': 1})
+
+        task.status = 'COMPLETED'
+        task.save()
+        self.assertEqual(self.stats()['tasks']['status'], {'COMPLETED': 2})
+
+        # Deleting the task cascades to its subtask
+        self.client.delete(f'/api/tasks/{task.id}/')
+        self.assertEqual(self.stats()['tasks']['total'], 1)
+        self.assertEqual(self.stats()['subtasks']['total'], 0)
+
+    def test_batch_updates_counters(self):
+        task = Task.objects.create(title='Task', priority=5, user=self.user)
+        operations = [
+            {'op': 'create', 'model': 'task', 'data': {'title': 'New', 'priority': 2}},
+            {'op': 'update', 'model': 'task', 'id': task.id, 'data': {'status': 'IN_PROGRESS'}},
+            {'op': 'create', 'model': 'subtask', 'data': {'title': 'S', 'priority': 1, 'task': task.id}},
+        ]
+        self.client.post('/api/tasks/batch/', operations, format='json')
+        statistics = self.stats()
+        self.assertEqual(statistics['tasks']['status'], {'CREATED': 1, 'IN_PROGRESS': 1})
+        self.assertEqual(statistics['subtasks']['total'], 1)
+
+    def test_stats_does_not_touch_task_table(self):
+        for i in range(5):
+            Task.objects.create(title=f'Task {i}', priority=5, user=self.user)
+        with CaptureQueriesContext(connection) as ctx:
+            self.stats()
+        self.assertFalse(any('LQ_Tasks_task"' in query['sql'] for query in ctx.captured_queries))
+
+    def test_rebuild_command_repairs_drift(self):
+        Task.objects.create(title='Task', priority=5, user=self.user)
+        expected = self.stats()
+        TaskStatistic.objects.update(count=42)
+        call_command('rebuild_task_stats', stdout=StringIO())
+        self.assertEqual(self.stats(), expected)
+
+
+class SearchTests(APITestCase):
+    url = '/api/search/'
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='testuser', password='testpassword')
+        self.client.force_authenticate(self.user)
+        self.task = Task.objects.create(title='Plan garden', description='Buy tomato seedlings', priority=5, user=self.user)
+        self.subtask = SubTask.objects.create(task=self.task, title='Dig beds', description='Garden spade')
+        self.note = Note.objects.create(title='Shopping', content='Tomatoes and basil', content_object=self.task)
+        other = CustomUser.objects.create_user(username='other', password='password')
+        Task.objects.create(title='Garden party', priority=5, user=other)
+
+    def hits(self, query):
+        response = self.client.get(self.url, {'q': query})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [(hit['type'], hit['id']) for hit in response.data['results']]
+
+    def test_results_are_ranked_and_scoped_to_user(self):
+        # Title matches outrank body matches
+        self.assertEqual(self.hits('garden'), [('task', self.task.id), ('subtask', self.subtask.id)])
+        self.assertEqual(set(self.hits('tomato')), {('task', self.task.id), ('note', self.note.id)})
+
+    def test_index_follows_updates_and_deletes(self):
+        self.note.title = 'Groceries'
+        self.note.save()
+        self.assertEqual(self.hits('groceries'), [('note', self.note.id)])
+        self.subtask.delete()
+        self.assertEqual(self.hits('spade'), [])
+
+    def test_batch_writes_are_indexed(self):
+        self.client.post('/api/tasks/batch/', [
+            {'op': 'create', 'model': 'task', 'data': {'title': 'Write report', 'priority': 3}},
+        ], format='json')
+        self.assertEqual(len(self.hits('report')), 1)
+
+    def test_query_syntax_is_not_interpreted(self):
+        self.assertEqual(self.hits('garden" OR owner:*'), [])
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_400_BAD_REQUEST)
+
+    @skipUnless(connection.vendor == 'sqlite', 'FTS5 is SQLite specific')
+    def test_fallback_matches_fts_results(self):
+        self.assertEqual(
+            {(hit['type'], hit['id']) for hit in search.fallback_search(self.user, 'garden', 20)},
+            set(self.hits('garden')),
+        )
+
+    def test_rebuild_command(self):
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self.hits('basil'), [('note', self.note.id)])
+
+
+class NoteOwnershipTests(APITestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='testuser', password='testpassword')
+        self.client.force_authenticate(self.user)
+        self.task = Task.objects.create(title='Task', priority=5, user=self.user)
+        self.other_task = Task.objects.create(title='Other Task', priority=5, user=self.user)
+        self.subtask = SubTask.objects.create(task=self.task, title='SubTask')
+        self.task_note = Note.objects.create(title='Task note', content='...', content_object=self.task)
+        self.subtask_note = Note.objects.create(title='SubTask note', content='...', content_object=self.subtask)
+        Note.objects.create(title='Other note', content='...', content_object=self.other_task)
+
+    def ids(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [note['id'] for note in response.data['results']]
+
+    def test_owner_and_parent_are_copied_from_target(self):
+        self.assertEqual((self.task_note.user_id, self.task_note.task_id), (self.user.id, self.task.id))
+        self.assertEqual((self.subtask_note.user_id, self.subtask_note.task_id), (self.user.id, self.task.id))
+
+    def test_nested_routes_only_list_their_own_notes(self):
+        self.assertEqual(self.ids(reverse('task-note-list', args=[self.task.id])), [self.task_note.id])
+        url = reverse('subtask-note-list', args=[self.task.id, self.subtask.id])
+        self.assertEqual(self.ids(url), [self.subtask_note.id])
+        url = reverse('subtask-note-list', args=[self.other_task.id, self.subtask.id])
+        self.assertEqual(self.ids(url), [])
+
+    def test_nested_list_is_a_single_note_query(self):
+        url = reverse('task-note-list', args=[self.task.id])
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(url)
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertNotIn('IN (SELECT', ctx.captured_queries[0]['sql'])
+
+    def test_moving_a_subtask_moves_its_notes(self):
+        self.subtask.task = self.other_task
+        self.subtask.save()
+        self.subtask_note.refresh_from_db()
+        self.assertEqual(self.subtask_note.task_id, self.other_task.id)
+
+    def test_other_users_cannot_see_notes(self):
+        another_user = CustomUser.objects.create_user(username='anotheruser', password='anotherpass')
+        self.client.force_authenticate(another_user)
+        response = self.client.get(reverse('task-note-detail', args=[self.task.id, self.task_note.id]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class NoteTargetTests(APITestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='testuser', password='testpassword')
+        self.client.force_authenticate(self.user)
+        self.task = Task.objects.create(title='Task', priority=5, user=self.user)
+        self.subtasks = [SubTask.objects.create(task=self.task, title=f'SubTask {i}') for i in range(3)]
+        self.url = reverse('task-note-list', args=[self.task.id])
+        self.task_type = ContentType.objects.get_for_model(Task).id
+        self.subtask_type = ContentType.objects.get_for_model(SubTask).id
+
+    def payload(self, content_type, object_id, title='Note'):
+        return {'title': title, 'content': '...', 'content_type': content_type, 'object_id': object_id}
+
+    def test_create_resolves_target_in_one_query(self):
+        self.client.post(self.url, self.payload(self.task_type, self.task.id), format='json')
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(self.url, self.payload(self.subtask_type, self.subtasks[0].id), format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertFalse([query for query in ctx.captured_queries if 'django_content_type' in query['sql']])
+        lookups = [query for query in ctx.captured_queries if query['sql'].startswith('SELECT')]
+        self.assertEqual(len(lookups), 1)
+
+    def test_create_many_notes_at_once(self):
+        data = [self.payload(self.subtask_type, subtask.id, subtask.title) for subtask in self.subtasks]
+        data.append(self.payload(self.task_type, self.task.id))
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(self.url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.data), 4)
+        self.assertEqual(set(Note.objects.values_list('user_id', 'task_id')), {(self.user.id, self.task.id)})
+        lookups = [query for query in ctx.captured_queries if query['sql'].startswith('SELECT')]
+        self.assertEqual(len(lookups), 2)
+
+    def test_invalid_targets(self):
+        response = self.client.post(self.url, self.payload(self.task_type, 10 ** 6), format='json')
+        self.assertEqual(response.data, {'object_id': ['Invalid object id']})
+        user_type = ContentType.objects.get_for_model(CustomUser).id
+        response = self.client.post(self.url, self.payload(user_type, self.user.id), format='json')
+        self.assertEqual(response.data, {'content_type': ['Invalid content type']})
+        response = self.client.post(self.url, self.payload(10 ** 6, self.task.id), format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Note.objects.count(), 0)
+
+    def test_cannot_add_notes_to_other_users_targets(self):
+        other_user = CustomUser.objects.create_user(username='otheruser', password='otherpass')
+        other_task = Task.objects.create(title='Other', priority=5, user=other_user)
+        data = [self.payload(self.task_type, self.task.id), self.payload(self.task_type, other_task.id)]
+        response = self.client.post(self.url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(Note.objects.count(), 0)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tasks-tests'}})
+class ResponseCacheTests(APITestCase):
+    def setUp(self):
+        caching.get_cache().clear()
+        self.user = CustomUser.objects.create_user(username='testuser', password='testpassword')
+        self.client.force_authenticate(self.user)
+        self.task = Task.objects.create(title='Task', priority=8, user=self.user)
+        SubTask.objects.create(task=self.task, title='SubTask')
+
+    def task_queries(self, url, etag=None):
+        headers = {'If-None-Match': etag} if etag else {}
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, headers=headers)
+        return response, [query for query in ctx.captured_queries if 'LQ_Tasks_' in query['sql']]
+
+    def test_conditional_get_returns_304_without_queries(self):
+        for url in ('/api/tasks/', '/api/tasks/high_priority/', f'/api/tasks/{self.task.id}/subtasks/'):
+            first = self.client.get(url)
+            self.assertEqual(first.status_code, status.HTTP_200_OK)
+            response, queries = self.task_queries(url, etag=first['ETag'])
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+            self.assertEqual(response['ETag'], first['ETag'])
+            self.assertEqual(queries, [])
+
+    @override_settings(ALLOWED_HOSTS=['testserver', 'api.example.com'])
+    def test_cached_pages_are_per_host_and_scheme(self):
+        Task.objects.create(title='Second', priority=5, user=self.user)
+        url = '/api/tasks/?page_size=1'
+        self.assertTrue(self.client.get(url).json()['next'].startswith('http://testserver/'))
+        for host, secure, prefix in (
+            ('api.example.com', False, 'http://api.example.com/'),
+            ('testserver', True, 'https://testserver/'),
+        ):
+            response = self.client.get(url, HTTP_HOST=host, secure=secure)
+            self.assertTrue(response.json()['next'].startswith(prefix))
+
+    def test_any_etag_needs_an_existing_resource(self):
+        headers = {'If-None-Match': '*'}
+        response = self.client.get(f'/api/tasks/{self.task.id}/subtasks/', headers=headers)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        other = CustomUser.objects.create_user(username='otheruser', password='otherpass')
+        foreign = Task.objects.create(title='Other', priority=8, user=other)
+        for task_id in (foreign.id, foreign.id + 100):
+            response = self.client.get(f'/api/tasks/{task_id}/subtasks/', headers=headers)
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_cached_body_is_served_until_a_write(self):
+        first = self.client.get('/api/tasks/')
+        response, queries = self.task_queries('/api/tasks/')
+        self.assertEqual((response.content, queries), (first.content, []))
+
+        self.client.patch(f'/api/tasks/{self.task.id}/', {'title': 'Renamed'}, format='json')
+        response, queries = self.task_queries('/api/tasks/', etag=first['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], first['ETag'])
+        self.assertEqual(response.json()['results'][0]['title'], 'Renamed')
+
+    def test_subtask_and_note_writes_change_the_version(self):
+        version = caching.get_version(self.user.id)
+        subtask = SubTask.objects.create(task=self.task, title='Another')
+        Note.objects.create(title='Note', content='...', content_object=subtask)
+        subtask.delete()
+        self.assertGreaterEqual(caching.get_version(self.user.id), version + 3)
+
+    def test_batch_writes_change_the_version(self):
+        version = caching.get_version(self.user.id)
+        operations = [{'op': 'create', 'model': 'task', 'data': {'title': 'New', 'priority': 3}}]
+        self.client.post('/api/tasks/batch/', operations, format='json')
+        self.assertGreater(caching.get_version(self.user.id), version)
+
+    def test_versions_are_per_user(self):
+        first = self.client.get('/api/tasks/')
+        other_user = CustomUser.objects.create_user(username='otheruser', password='otherpass')
+        Task.objects.create(title='Other', priority=8, user=other_user)
+        response, queries = self.task_queries('/api/tasks/', etag=first['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.client.force_authenticate(other_user)
+        response = self.client.get('/api/tasks/', headers={'If-None-Match': first['ETag']})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([task['title'] for task in response.data['results']], ['Other'])
+
+
+class PriorityPropagationTests(APITestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='testuser', password='testpassword')
+        self.client.force_authenticate(self.user)
+        self.task = Task.objects.create(title='Task', priority=5, user=self.user)
+        for i in range(3):
+            SubTask.objects.create(task=self.task, title=f'SubTask {i}', priority=1)
+
+    def subtask_priorities(self):
+        return set(SubTask.objects.values_list('priority', flat=True))
+
+    def subtask_statistics(self):
+        return TaskStatistic.objects.filter(model='subtask', field='priority', count__gt=0).values_list('value', 'count')
+
+    def test_priority_change_is_propagated_in_one_update(self):
+        self.task.refresh_from_db()
+        self.task.priority = 9
+        with CaptureQueriesContext(connection) as ctx:
+            self.task.save()
+        self.assertEqual(self.subtask_priorities(), {8})
+        self.assertEqual(set(self.subtask_statistics()), {('8', 3)})
+        updates = [query for query in ctx.captured_queries if query['sql'].startswith('UPDATE "LQ_Tasks_subtask"')]
+        self.assertEqual(len(updates), 1)
+
+    def test_unchanged_priority_is_not_propagated(self):
+        self.task.title = 'Renamed'
+        with CaptureQueriesContext(connection) as ctx:
+            self.task.save()
+        self.assertFalse([query for query in ctx.captured_queries if 'LQ_Tasks_subtask' in query['sql']])
+
+    def test_batch_update_propagates(self):
+        subtask = SubTask.objects.first()
+        operations = [
+            {'op': 'update', 'model': 'task', 'id': self.task.id, 'data': {'priority': 2}},
+            {'op': 'update', 'model': 'subtask', 'id': subtask.id, 'data': {'title': 'Edited'}},
+        ]
+        response = self.client.post('/api/tasks/batch/', operations, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.subtask_priorities(), {1})
+        self.assertEqual(set(self.subtask_statistics()), {('1', 3)})
+
+    def test_bulk_subtask_creation(self):
+        url = reverse('task-subtasks', args=[self.task.id])
+        data = [{'title': f'New {i}', 'priority': 10, 'task': self.task.id} for i in range(5)]
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.data), 5)
+        self.assertEqual(SubTask.objects.filter(title__startswith='New', priority=4).count(), 5)
+        self.assertEqual(set(self.subtask_statistics()), {('4', 8)})
+        inserts = [query for query in ctx.captured_queries if query['sql'].startswith('INSERT INTO "LQ_Tasks_subtask"')]
+        self.assertEqual(len(inserts), 1)
+
+    def test_bulk_subtask_creation_rejects_other_tasks(self):
+        other_task = Task.objects.create(title='Other', priority=5, user=self.user)
+        url = reverse('task-subtasks', args=[self.task.id])
+        data = [{'title': 'New', 'priority': 5, 'task': self.task.id}, {'title': 'New', 'priority': 5, 'task': other_task.id}]
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(SubTask.objects.count(), 3)
+
+
+class AsyncViewTests(APITestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='testuser', password='testpassword')
+        self.client.login(username='testuser', password='testpassword')
+        for i in range(3):
+            task = Task.objects.create(title=f'Task {i}', priority=6 + i, user=self.user)
+            subtask = SubTask.objects.create(task=task, title=f'SubTask {i}')
+            Note.objects.create(title=f'Note {i}', content='...', content_object=task)
+            Note.objects.create(title=f'SubTask note {i}', content='...', content_object=subtask)
+        self.task = Task.objects.first()
+        self.subtask = self.task.subtasks.get()
+
+    def assertSameResponse(self, sync_url, async_url):
+        expected, response = self.client.get(sync_url), self.client.get(async_url)
+        self.assertEqual(response.status_code, expected.status_code)
+        # Cursor links point at the async path but carry the same cursor
+        self.assertEqual(response.content.replace(b'/api/async/', b'/api/'), expected.content)
+
+    def test_matches_sync_endpoints(self):
+        task, subtask = self.task.id, self.subtask.id
+        note = Note.objects.get(title='Note 0').id
+        subtask_note = Note.objects.get(title='SubTask note 0').id
+        pairs = [
+            ('/api/tasks/', '/api/async/tasks/'),
+            ('/api/tasks/?ordering=-priority&page_size=2', '/api/async/tasks/?ordering=-priority&page_size=2'),
+            ('/api/tasks/high_priority/', '/api/async/tasks/high_priority/'),
+            ('/api/tasks/stats/', '/api/async/tasks/stats/'),
+            (f'/api/tasks/{task}/', f'/api/async/tasks/{task}/'),
+            (f'/api/tasks/{task}/subtasks/', f'/api/async/tasks/{task}/subtasks/'),
+            (f'/api/tasks/{task}/subtasks/{subtask}/', f'/api/async/tasks/{task}/subtasks/{subtask}/'),
+            (f'/api/tasks/{task}/notes/', f'/api/async/tasks/{task}/notes/'),
+            (f'/api/tasks/{task}/notes/{note}/', f'/api/async/tasks/{task}/notes/{note}/'),
+            (f'/api/tasks/{task}/subtasks/{subtask}/notes/', f'/api/async/tasks/{task}/subtasks/{subtask}/notes/'),
+            (
+                f'/api/tasks/{task}/subtasks/{subtask}/notes/{subtask_note}/',
+                f'/api/async/tasks/{task}/subtasks/{subtask}/notes/{subtask_note}/',
+            ),
+        ]
+        for sync_url, async_url in pairs:
+            with self.subTest(async_url):
+                self.assertSameResponse(sync_url, async_url)
+
+    def test_notes_with_cold_content_type_cache(self):
+        note = Note.objects.get(title='Note 0')
+        subtask_note = Note.objects.get(title='SubTask note 0')
+        for url in (
+            f'/api/async/tasks/{self.task.id}/notes/',
+            f'/api/async/tasks/{self.task.id}/notes/{note.id}/',
+            f'/api/async/tasks/{self.task.id}/subtasks/{self.subtask.id}/notes/{subtask_note.id}/',
+        ):
+            ContentType.objects.clear_cache()
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK, url)
+
+    def test_cursor_links_work_on_async_list(self):
+        response = self.client.get('/api/async/tasks/?page_size=2').json()
+        self.assertEqual(len(response['results']), 2)
+        following = self.client.get(response['next']).json()
+        self.assertEqual([task['title'] for task in following['results']], ['Task 2'])
+
+    def test_other_users_objects_are_not_found(self):
+        other_user = CustomUser.objects.create_user(username='otheruser', password='otherpass')
+        self.client.login(username='otheruser', password='otherpass')
+        response = self.client.get(f'/api/async/tasks/{self.task.id}/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get(f'/api/async/tasks/{self.task.id}/subtasks/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.get('/api/async/tasks/').json()['results'], [])
+
+    def test_authentication(self):
+        self.client.logout()
+        response = self.client.get('/api/async/tasks/')
+        self.assertIn(response.status_code, (status.HTTP_401_UNAUTHORIZED, status.HTTP_403_FORBIDDEN))
+        self.client.credentials(HTTP_AUTHORIZATION='Basic ' + base64.b64encode(b'testuser:testpassword').decode())
+        response = self.client.get('/api/async/tasks/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_writes_are_not_allowed(self):
+        response = self.client.post('/api/async/tasks/', {'title': 'New', 'priority': 1}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+
+class SyncTests(APITestCase):
+    url = '/api/sync/'
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='testuser', password='testpassword')
+        self.client.force_authenticate(self.user)
+        self.task = Task.objects.create(title='Task', priority=5, user=self.user)
+        self.subtask = SubTask.objects.create(task=self.task, title='SubTask')
+        self.note = Note.objects.create(title='Note', content='...', content_object=self.task)
+
+    def sync(self, token=None, **params):
+        if token is not None:
+            params['since'] = token
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def ids(self, data):
+        return {key: [row['id'] for row in data[key]] for key in ('tasks', 'subtasks', 'notes')}
+
+    def test_full_sync_then_nothing_changed(self):
+        data = self.sync()
+        self.assertEqual(self.ids(data), {'tasks': [self.task.id], 'subtasks': [self.subtask.id], 'notes': [self.note.id]})
+        self.assertNotIn('subtasks', data['tasks'][0])
+        data = self.sync(data['token'])
+        self.assertEqual(self.ids(data), {'tasks': [], 'subtasks': [], 'notes': []})
+
+    def test_only_changes_and_tombstones_are_returned(self):
+        token = self.sync()['token']
+        other = Task.objects.create(title='Other', priority=3, user=self.user)
+        self.client.patch(f'/api/tasks/{self.task.id}/', {'priority': 8}, format='json')
+        note_id = self.note.id
+        self.note.delete()
+
+        data = self.sync(token)
+        self.assertEqual(self.ids(data), {'tasks': [self.task.id, other.id], 'subtasks': [self.subtask.id], 'notes': []})
+        self.assertEqual(data['subtasks'][0]['priority'], 7)
+        self.assertEqual(data['deleted'], {'tasks': [], 'subtasks': [], 'notes': [note_id]})
+
+        self.task.status = 'COMPLETED'
+        self.task.save()
+        self.client.delete(f'/api/tasks/{self.task.id}/')
+        data = self.sync(data['token'])
+        self.assertEqual(self.ids(data), {'tasks': [], 'subtasks': [], 'notes': []})
+        self.assertEqual(data['deleted'], {'tasks': [self.task.id], 'subtasks': [self.subtask.id], 'notes': []})
+
+    def test_pages_with_has_more(self):
+        token = self.sync()['token']
+        for i in range(5):
+            Task.objects.create(title=f'Task {i}', priority=1, user=self.user)
+        seen = []
+        while True:
+            data = self.sync(token, limit=2)
+            seen += self.ids(data)['tasks']
+            token = data['token']
+            if not data['has_more']:
+                break
+        self.assertEqual(len(seen), 5)
+
+    def test_batch_writes_are_tracked(self):
+        token = self.sync()['token']
+        operations = [{'op': 'update', 'model': 'subtask', 'id': self.subtask.id, 'data': {'title': 'Edited'}}]
+        self.client.post('/api/tasks/batch/', operations, format='json')
+        data = self.sync(token)
+        self.assertEqual(self.ids(data)['subtasks'], [self.subtask.id])
+        self.assertGreater(data['subtasks'][0]['updated_at'], SubTaskSerializer(self.subtask).data['updated_at'])
+
+    def test_changes_are_per_user(self):
+        token = self.sync()['token']
+        other_user = CustomUser.objects.create_user(username='otheruser', password='otherpass')
+        Task.objects.create(title='Other', priority=3, user=other_user)
+        self.assertEqual(self.ids(self.sync(token))['tasks'], [])
+
+    def test_invalid_token(self):
+        response = self.client.get(self.url, {'since': 'garbage'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_deleting_a_user_leaves_no_tombstones(self):
+        self.user.delete()
+        self.assertFalse(ChangeLog.objects.exists())
+
+
+class EventStreamTests(APITestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='testuser', password='testpassword')
+
+    def test_broker_coalesces_and_overflows(self):
+        async def scenario():
+            broker = events.InMemoryBroker()
+            subscription = broker.subscribe(self.user.id)
+            other = broker.subscribe(self.user.id + 1)
+            broker.publish(self.user.id, [{'model': 'task', 'id': 1, 'v': 1}, {'model': 'task', 'id': 2, 'v': 1}])
+            broker.publish(self.user.id, [{'model': 'task', 'id': 1, 'v': 2}])
+            batch = await subscription.get(1)
+            empty = await other.get(0.01)
+
+            subscription.max_pending = 2
+            broker.publish(self.user.id, [{'model': 'note', 'id': i} for i in range(3)])
+            overflow = await subscription.get(1)
+            broker.unsubscribe(subscription)
+            broker.unsubscribe(other)
+            return batch, empty, overflow, broker.size()
+
+        batch, empty, overflow, size = async_to_sync(scenario)()
+        self.assertEqual(batch, [{'model': 'task', 'id': 2, 'v': 1}, {'model': 'task', 'id': 1, 'v': 2}])
+        self.assertEqual((empty, overflow, size), ([], None, 0))
+
+    def test_stream_sends_committed_changes(self):
+        def write():
+            with self.captureOnCommitCallbacks(execute=True):
+                return Task.objects.create(title='Task', priority=5, user=self.user)
+
+        async def scenario():
+            request = AsyncRequestFactory().get('/api/events/')
+            request.auser = sync_to_async(lambda: self.user)
+            response = await EventStreamView.as_view()(request)
+            stream = aiter(response.streaming_content)
+            chunks = [await anext(stream)]
+            task = await sync_to_async(write)()
+            chunks.append(await anext(stream))
+            await stream.aclose()
+            return response, chunks, task
+
+        response, chunks, task = async_to_sync(scenario)()
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual(chunks[0], b'retry: 5000\n\n')
+        event = chunks[1].decode()
+        self.assertTrue(event.startswith('event: change\nid: '))
+        data = json.loads(event.split('data: ', 1)[1])
+        self.assertEqual((data['model'], data['id'], data['deleted']), ('task', task.id, False))
+        self.assertEqual(changes.decode_token(data['token']), ChangeLog.objects.get(object_id=task.id).seq)
+        self.assertEqual(events.get_broker().size(), 0)
+
+    def test_stream_requires_authentication(self):
+        self.assertEqual(self.client.get('/api/events/').status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class DeadlineSchedulerTests(APITestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='testuser', password='testpassword')
+        self.now = timezone.now()
+        self.overdue = Task.objects.create(title='Late', priority=5, deadline=self.now - timedelta(hours=1), user=self.user)
+        self.soon = Task.objects.create(title='Soon', priority=5, deadline=self.now + timedelta(minutes=10), user=self.user)
+        self.later = Task.objects.create(title='Later', priority=5, deadline=self.now + timedelta(days=2), user=self.user)
+        self.done = Task.objects.create(
+            title='Done', priority=5, status='COMPLETED', deadline=self.now - timedelta(days=1), user=self.user,
+        )
+        self.subtask = SubTask.objects.create(task=self.soon, title='Late step', deadline=self.now - timedelta(minutes=5))
+
+    def statuses(self):
+        return dict(Task.objects.values_list('title', 'status'))
+
+    def test_marks_overdue_items_and_queues_reminders(self):
+        handled = scheduler.run_once(now=self.now, lead=timedelta(hours=1), batch_size=1)
+        self.assertEqual(handled, {
+            ('task', 'overdue'): 1, ('task', 'upcoming'): 1, ('subtask', 'overdue'): 1, ('subtask', 'upcoming'): 0,
+        })
+        self.assertEqual(self.statuses(), {'Late': 'FAILED', 'Soon': 'CREATED', 'Later': 'CREATED', 'Done': 'COMPLETED'})
+        self.subtask.refresh_from_db()
+        self.assertEqual(self.subtask.status, 'FAILED')
+        self.assertEqual(
+            set(Reminder.objects.values_list('model', 'object_id', 'kind')),
+            {('task', self.overdue.id, 'overdue'), ('task', self.soon.id, 'upcoming'),
+             ('subtask', self.subtask.id, 'overdue')},
+        )
+        statistics = self.client_stats()
+        self.assertEqual(statistics['tasks']['status'], {'CREATED': 2, 'COMPLETED': 1, 'FAILED': 1})
+
+    def client_stats(self):
+        self.client.force_authenticate(self.user)
+        return self.client.get('/api/tasks/stats/').data
+
+    def test_rerun_and_restart_do_not_repeat_work(self):
+        lead = timedelta(hours=1)
+        scheduler.run_once(now=self.now, lead=lead)
+        handled = scheduler.run_once(now=self.now + timedelta(minutes=1), lead=lead)
+        self.assertEqual(set(handled.values()), {0})
+        self.assertEqual(Reminder.objects.count(), 3)
+
+        # Once the deadline passes, the upcoming item becomes overdue
+        handled = scheduler.run_once(now=self.now + timedelta(minutes=20), lead=lead)
+        self.assertEqual(handled[('task', 'overdue')], 1)
+        self.assertEqual(self.statuses()['Soon'], 'FAILED')
+
+    def test_items_added_to_window_later_are_queued(self):
+        lead = timedelta(hours=24)
+        further = Task.objects.create(title='Further', priority=5, deadline=self.now + timedelta(hours=10), user=self.user)
+        scheduler.run_once(now=self.now, lead=lead)
+        nearer = Task.objects.create(title='Nearer', priority=5, deadline=self.now + timedelta(hours=2), user=self.user)
+        handled = scheduler.run_once(now=self.now + timedelta(minutes=1), lead=lead)
+        self.assertEqual(handled[('task', 'upcoming')], 1)
+        self.assertEqual(
+            set(Reminder.objects.filter(kind='upcoming', model='task').values_list('object_id', flat=True)),
+            {self.soon.id, further.id, nearer.id},
+        )
+
+    def test_configurable_status(self):
+        call_command('run_scheduler', '--status', 'ON_HOLD', stdout=StringIO())
+        self.assertEqual(self.statuses()['Late'], 'ON_HOLD')
+        with self.assertRaises(ValueError):
+            scheduler.run_once(status='COMPLETED')
+
+    @skipUnless(connection.vendor == 'sqlite', 'Query plans are checked on SQLite')
+    def test_due_queries_use_partial_index(self):
+        for model, index in ((Task, 'task_due_idx'), (SubTask, 'subtask_due_idx')):
+            queryset = scheduler.due(model).filter(deadline__lte=self.now)[:500]
+            plan = queryset.explain()
+            self.assertIn(index, plan)
+            self.assertNotIn('TEMP B-TREE', plan)
+
+
+class ExportTests(APITestCase):
+    url = '/api/export/'
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='testuser', password='testpassword')
+        self.client.force_authenticate(self.user)
+
+    def add_tasks(self, count):
+        for i in range(count):
+            task = Task.objects.create(title=f'Task {i}', priority=5, user=self.user)
+            subtask = SubTask.objects.create(task=task, title=f'SubTask {i}')
+            Note.objects.create(title=f'Note {i}', content='task note', content_object=task)
+            Note.objects.create(title=f'Step note {i}', content='subtask note', content_object=subtask)
+
+    def export(self, params=None):
+        response = self.client.get(self.url, params or {})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_ndjson_contains_the_whole_tree(self):
+        self.add_tasks(2)
+        Task.objects.create(title='Foreign', priority=5, user=CustomUser.objects.create_user(username='other'))
+        response, body = self.export()
+        self.assertTrue(response['Content-Type'].startswith('application/x-ndjson'))
+        documents = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([document['title'] for document in documents], ['Task 0', 'Task 1'])
+        self.assertEqual([note['title'] for note in documents[0]['notes']], ['Note 0'])
+        self.assertEqual(documents[0]['subtasks'][0]['title'], 'SubTask 0')
+        self.assertEqual([note['title'] for note in documents[0]['subtasks'][0]['notes']], ['Step note 0'])
+
+    def test_csv(self):
+        self.add_tasks(1)
+        response, body = self.export({'format': 'csv'})
+        self.assertTrue(response['Content-Type'].startswith('text/csv'))
+        rows = list(csv.reader(body.splitlines()))
+        self.assertEqual(rows[0][:4], ['type', 'id', 'parent_type', 'parent_id'])
+        task, subtask = Task.objects.get(), SubTask.objects.get()
+        self.assertEqual(
+            [row[:5] for row in rows[1:]],
+            [['task', str(task.id), '', '', 'Task 0'],
+             ['note', str(task.notes.get().id), 'task', str(task.id), 'Note 0'],
+             ['subtask', str(subtask.id), 'task', str(task.id), 'SubTask 0'],
+             ['note', str(subtask.notes.get().id), 'subtask', str(subtask.id), 'Step note 0']],
+        )
+
+    def test_queries_do_not_grow_with_the_account(self):
+        self.add_tasks(3)
+        with CaptureQueriesContext(connection) as ctx:
+            self.export()
+        small = len(ctx.captured_queries)
+        self.add_tasks(30)
+        with CaptureQueriesContext(connection) as ctx:
+            self.export()
+        self.assertEqual(len(ctx.captured_queries), small)
+
+    def test_requires_authentication(self):
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class ImportTests(APITestCase):
+    url = '/api/import/'
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='testuser', password='testpassword')
+        self.client.force_authenticate(self.user)
+
+    def document(self, i):
+        return {
+            'title': f'Task {i}', 'priority': 6, 'notes': [{'title': f'Note {i}', 'content': 'task note'}],
+            'subtasks': [{'title': f'SubTask {i}', 'notes': [{'title': f'Step note {i}', 'content': 'step'}]}],
+        }
+
+    def post(self, body):
+        return self.client.generic('POST', self.url, body, content_type='application/x-ndjson')
+
+    def test_imports_the_tree(self):
+        body = '\n'.join(json.dumps(self.document(i)) for i in range(3))
+        response = self.post(body)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['imported'], {'tasks': 3, 'subtasks': 3, 'notes': 6})
+        task = Task.objects.get(title='Task 1')
+        self.assertEqual(task.user, self.user)
+        subtask = task.subtasks.get()
+        self.assertEqual(subtask.priority, 5)
+        self.assertEqual(list(task.notes.values_list('title', flat=True)), ['Note 1'])
+        note = subtask.notes.get()
+        self.assertEqual((note.user_id, note.task_id), (self.user.id, task.id))
+        self.assertEqual(TaskStatistic.objects.get(user=self.user, model='task', field='priority', value='6').count, 3)
+
+    def test_reports_bad_lines_and_keeps_the_rest(self):
+        body = '\n'.join([
+            json.dumps(self.document(0)), 'not json', json.dumps({'title': 'No priority'}), '',
+            json.dumps(self.document(1)),
+        ])
+        response = self.post(body)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['imported']['tasks'], 2)
+        self.assertEqual(response.data['error_count'], 2)
+        self.assertEqual([error['line'] for error in response.data['errors']], [2, 3])
+        self.assertIn('priority', response.data['errors'][1]['errors'])
+
+    def test_export_round_trip_by_upload(self):
+        task = Task.objects.create(title='Exported', priority=4, user=self.user)
+        SubTask.objects.create(task=task, title='Step')
+        exported = b''.join(self.client.get('/api/export/').streaming_content)
+        upload = StringIO(exported.decode())
+        upload.name = 'tasks.ndjson'
+        response = self.client.post(self.url, {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Task.objects.filter(user=self.user, title='Exported').count(), 2)
+        self.assertEqual(SubTask.objects.filter(task__user=self.user, title='Step').count(), 2)
+
+    def test_queries_per_chunk(self):
+        body = '\n'.join(json.dumps(self.document(i)) for i in range(20))
+        with CaptureQueriesContext(connection) as small:
+            self.post('\n'.join(json.dumps(self.document(i)) for i in range(2)))
+        with CaptureQueriesContext(connection) as large:
+            self.post(body)
+        self.assertEqual(len(large.captured_queries), len(small.captured_queries))
+
+    def test_command(self):
+        path = self.enterContext(tempfile.NamedTemporaryFile('w', suffix='.ndjson'))
+        path.write('\n'.join(json.dumps(self.document(i)) for i in range(5)) + '\n{}\n')
+        path.flush()
+        out, err = StringIO(), StringIO()
+        call_command('import_tasks', 'testuser', path.name, '--chunk-size', '2', stdout=out, stderr=err)
+        self.assertEqual(Task.objects.filter(user=self.user).count(), 5)
+        self.assertEqual(len(out.getvalue().splitlines()), 4)
+        self.assertIn('line 6: 5 tasks, 5 subtasks, 10 notes, 1 errors', out.getvalue())
+        self.assertIn('line 6:', err.getvalue())
+
+
+class SparseFieldsetTests(APITestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='testuser', password='testpassword')
+        self.client.force_authenticate(self.user)
+        self.task = Task.objects.create(title='Task', description='Long text', priority=5, user=self.user)
+        self.subtask = SubTask.objects.create(task=self.task, title='SubTask')
+        Note.objects.create(title='Task note', content='text', content_object=self.task)
+        Note.objects.create(title='Step note', content='text', content_object=self.subtask)
+
+    def get(self, url, params):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response, [query['sql'] for query in ctx.captured_queries]
+
+    def test_default_representation_is_unchanged(self):
+        response = self.client.get('/api/tasks/')
+        self.assertEqual(
+            set(response.data['results'][0]),
+            {'id', 'title', 'description', 'priority', 'status', 'updated_at', 'subtasks'},
+        )
+
+    def test_fields_narrow_output_and_columns(self):
+        response, queries = self.get('/api/tasks/', {'fields': 'id,title'})
+        self.assertEqual(response.data['results'], [{'id': self.task.id, 'title': 'Task'}])
+        task_query = next(sql for sql in queries if 'FROM "LQ_Tasks_task"' in sql)
+        self.assertNotIn('"description"', task_query)
+        self.assertFalse(any('FROM "LQ_Tasks_subtask"' in sql for sql in queries))
+
+    def test_expand_embeds_notes_at_every_level(self):
+        response, queries = self.get(f'/api/tasks/{self.task.id}/', {'fields': 'id', 'expand': 'subtasks,notes'})
+        self.assertEqual([note['title'] for note in response.data['notes']], ['Task note'])
+        self.assertEqual([note['title'] for note in response.data['subtasks'][0]['notes']], ['Step note'])
+        self.assertEqual(set(response.data), {'id', 'subtasks', 'notes'})
+        self.assertEqual(sum('FROM "LQ_Tasks_note"' in sql for sql in queries), 2)
+
+    def test_subtask_and_note_viewsets(self):
+        response, _ = self.get(f'/api/tasks/{self.task.id}/subtasks/{self.subtask.id}/', {'fields': 'title', 'expand': 'notes'})
+        self.assertEqual(set(response.data), {'title', 'notes'})
+        self.assertEqual(response.data['notes'][0]['title'], 'Step note')
+        response, _ = self.get(f'/api/tasks/{self.task.id}/subtasks/', {'fields': 'id,status'})
+        self.assertEqual(response.data, [{'id': self.subtask.id, 'status': 'CREATED'}])
+        response, _ = self.get(f'/api/tasks/{self.task.id}/notes/', {'fields': 'title'})
+        self.assertEqual(response.data['results'], [{'title': 'Task note'}])
+
+    def test_queries_stay_flat_with_expansion(self):
+        params = {'fields': 'id,title', 'expand': 'subtasks,notes'}
+        _, small = self.get('/api/tasks/', params)
+        for i in range(5):
+            task = Task.objects.create(title=f'Task {i}', priority=5, user=self.user)
+            Note.objects.create(title='More', content='text', content_object=SubTask.objects.create(task=task, title='S'))
+        caching.invalidate([self.user.id])
+        _, large = self.get('/api/tasks/', params)
+        self.assertEqual(len(large), len(small))
+
+    def test_unknown_names_are_rejected(self):
+        response = self.client.get('/api/tasks/', {'fields': 'id,secret', 'expand': 'owner'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(set(response.data), {'fields', 'expand'})
+
+    def test_writes_return_full_representation(self):
+        response = self.client.patch(f'/api/tasks/{self.task.id}/?fields=id', {'title': 'Renamed'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('subtasks', response.data)
+
+
+class ValuesFastPathTests(APITestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='testuser', password='testpassword')
+        self.client.force_authenticate(self.user)
+        for i in range(3):
+            task = Task.objects.create(
+                title=f'Task {i}', description=None if i else 'Text', priority=7 + i, user=self.user,
+                deadline=timezone.now() + timedelta(days=i) if i else None,
+            )
+            Note.objects.create(title=f'Note {i}', content='text', content_object=task)
+            for j in range(i):
+                subtask = SubTask.objects.create(task=task, title=f'Step {j}', status='IN_PROGRESS')
+                Note.objects.create(title=f'Step note {j}', content='text', content_object=subtask)
+
+    def assertSameJSON(self, plan_data, serializer_data):
+        self.assertEqual(json.dumps(plan_data, cls=JSONEncoder), json.dumps(serializer_data, cls=JSONEncoder))
+
+    def test_plans_match_serializers(self):
+        cases = [
+            (TaskSerializer, None, frozenset(), Task.objects.filter(user=self.user)),
+            (TaskSerializer, ('id', 'title'), frozenset({'subtasks', 'notes'}), Task.objects.filter(user=self.user)),
+            (SubTaskSerializer, None, frozenset({'notes'}), SubTask.objects.all()),
+            (NoteSerializer, None, frozenset(), Note.objects.all()),
+        ]
+        for serializer_class, fields, expand, queryset in cases:
+            with self.subTest(serializer=serializer_class.__name__, fields=fields, expand=expand):
+                plan = fastpath.values_plan(serializer_class, fields, expand)
+                self.assertIsNotNone(plan)
+                expected = serializer_class(queryset.order_by('id'), many=True, fields=fields, expand=expand).data
+                self.assertSameJSON(plan.render(list(plan.values(queryset.order_by('id')))), expected)
+
+    def test_unsupported_serializer_falls_back(self):
+        class CustomSerializer(TaskSerializer):
+            upper = serializers.SerializerMethodField()
+
+            class Meta(TaskSerializer.Meta):
+                fields = TaskSerializer.Meta.fields + ['upper']
+
+            def get_upper(self, task):
+                return task.title.upper()
+
+        self.assertIsNone(fastpath.values_plan(CustomSerializer))
+
+    def test_fieldset_order_and_repeats_share_a_plan(self):
+        fastpath.cached_plan.cache_clear()
+        for fields in ('id', 'id,id', 'id,id,id', 'title,id', 'id,title,id'):
+            self.assertEqual(self.client.get('/api/tasks/', {'fields': fields}).status_code, status.HTTP_200_OK)
+        self.assertEqual(fastpath.cached_plan.cache_info().currsize, 2)
+        self.assertIsNotNone(fastpath.cached_plan.cache_info().maxsize)
+
+    def test_endpoints_match_serializer_output(self):
+        tasks = Task.objects.filter(user=self.user)
+        response = self.client.get('/api/tasks/', {'ordering': '-deadline'})
+        expected = TaskSerializer(tasks.order_by(F('deadline').desc(nulls_last=True), '-id'), many=True).data
+        self.assertSameJSON(response.data['results'], expected)
+
+        response = self.client.get('/api/tasks/high_priority/')
+        self.assertSameJSON(
+            sorted(response.data, key=lambda task: task['id']),
+            TaskSerializer(tasks.filter(priority__gte=7).order_by('id'), many=True).data,
+        )
+
+        task = tasks.get(title='Task 2')
+        response = self.client.get(f'/api/tasks/{task.id}/subtasks/', {'expand': 'notes'})
+        self.assertSameJSON(response.data, SubTaskSerializer(task.subtasks.order_by('id'), many=True, expand={'notes'}).data)
+
+    def test_list_queries_do_not_grow(self):
+        with CaptureQueriesContext(connection) as small:
+            self.client.get('/api/tasks/', {'expand': 'notes'})
+        for i in range(5):
+            SubTask.objects.create(task=Task.objects.create(title=f'More {i}', priority=5, user=self.user), title='S')
+        with CaptureQueriesContext(connection) as large:
+            self.client.get('/api/tasks/', {'expand': 'notes'})
+        self.assertEqual(len(large.captured_queries), len(small.captured_queries))
+
+
+class BenchmarkCommandTests(APITestCase):
+    def test_seed_data(self):
+        call_command('seed_data', '--users', '2', '--tasks', '20', '--prefix', 'bench', stdout=StringIO())
+        users = CustomUser.objects.filter(username__startswith='bench-')
+        self.assertEqual(users.count(), 2)
+        self.assertTrue(users[0].check_password('seed-password'))
+        self.assertTrue(Task.objects.filter(user__in=users).exists())
+        # Derived tables follow the bulk inserts
+        self.assertEqual(
+            sum(TaskStatistic.objects.filter(user__in=users, model='task', field='status').values_list('count', flat=True)),
+            Task.objects.filter(user__in=users).count(),
+        )
+        with self.assertRaisesMessage(Exception, 'already exist'):
+            call_command('seed_data', '--users', '1', '--prefix', 'bench', stdout=StringIO())
+
+    def test_bench_api_covers_every_route(self):
+        call_command('seed_data', '--users', '1', '--tasks', '10', '--prefix', 'bench', '--seed', '3', stdout=StringIO())
+        path = self.enterContext(tempfile.NamedTemporaryFile('r', suffix='.json'))
+        before = Task.objects.count()
+        call_command(
+            'bench_api', 'bench-0', '--password', 'seed-password', '--requests', '1', '--warmup', '0',
+            '--json', path.name, stdout=StringIO(),
+        )
+        report = json.load(path)
+        self.assertEqual(Task.objects.count(), before)
+        names = {result['name'] for result in report['routes']}
+        self.assertTrue({'task-list', 'task-detail', 'async-task-list', 'sync', 'token', 'leaderboard'} <= names)
+        measured = [result for result in report['routes'] if 'skipped' not in result]
+        self.assertEqual([result['name'] for result in report['routes'] if 'skipped' in result], ['events'])
+        for result in measured:
+            self.assertTrue({'p50_ms', 'p95_ms', 'p99_ms', 'queries', 'bytes'} <= set(result))
+            self.assertTrue(all(code < 500 for code in result['status']), result)
+
+
+class RequestTimingTests(APITestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='testuser', password='testpassword')
+        self.client.login(username='testuser', password='testpassword')
+        for i in range(3):
+            task = Task.objects.create(title=f'Task {i}', priority=6 + i, user=self.user)
+            SubTask.objects.create(task=task, title=f'SubTask {i}')
+
+    def timings(self, response):
+        return dict(
+            (part.split(';')[0], part) for part in response['Server-Timing'].split(', ')
+        )
+
+    def test_server_timing_header(self):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get('/api/tasks/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        timings = self.timings(response)
+        self.assertEqual(set(timings), {'db', 'serialize', 'render', 'app', 'total'})
+        self.assertIn(f'desc="{len(captured.captured_queries)} queries"', timings['db'])
+        for part in timings.values():
+            self.assertRegex(part, r';dur=\d+\.\d')
+
+    def test_serializer_path_is_timed(self):
+        task = Task.objects.first()
+        response = self.client.get(f'/api/tasks/{task.id}/')
+        self.assertIn('serialize', self.timings(response))
+
+    def test_log_line(self):
+        with self.assertLogs('LQ_Tasks.timing', 'INFO') as logs:
+            self.client.get('/api/tasks/')
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['view'], 'task-list')
+        self.assertEqual(record['status'], 200)
+        self.assertEqual(record['user'], self.user.id)
+        self.assertNotIn('slow', record)
+
+    @override_settings(REQUEST_TIMING_SLOW_MS=0)
+    def test_slow_request_logs_statements(self):
+        with self.assertLogs('LQ_Tasks.timing', 'WARNING') as logs:
+            self.client.get('/api/tasks/?search=Task')
+        record = json.loads(logs.records[0].getMessage())
+        self.assertTrue(record['slow'])
+        self.assertEqual(len(record['sql']), min(record['queries'], 10))
+        self.assertTrue(all(statement['sql'].startswith(('SELECT', 'SAVEPOINT', 'RELEASE', 'INSERT', 'UPDATE'))
+                            for statement in record['sql']))
+        self.assertEqual(record['sql'], sorted(record['sql'], key=lambda statement: -statement['ms']))
+
+    @override_settings(REQUEST_TIMING_HEADER=False)
+    def test_header_can_be_turned_off(self):
+        response = self.client.get('/api/tasks/')
+        self.assertNotIn('Server-Timing', response)
+
+    def test_async_view(self):
+        response = self.client.get('/api/async/tasks/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('total', self.timings(response))
+
+    def test_sql_inside_a_phase_counts_as_db(self):
+        timer = timing.RequestTimer()
+        token = timing._current.set(timer)
+        try:
+            timing.measure('serialize', lambda: list(Task.objects.all()))
+        finally:
+            timing._current.reset(token)
+        timer.finish()
+        self.assertEqual(timer.queries, 1)
+        self.assertGreater(timer.db, 0)
+        self.assertLessEqual(timer.db + timer.phases['serialize'], timer.total)
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTests(APITestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # A second database that only holds what replicate() copies into it,
+        # so each test decides how far the replica is behind. It is added
+        # after the test database setup and connected directly, which keeps
+        # it out of the test isolation checks.
+        directory = tempfile.TemporaryDirectory()
+        cls.addClassCleanup(directory.cleanup)
+        connections.settings['replica'] = {
+            **connections.settings['default'], 'NAME': os.path.join(directory.name, 'replica.sqlite3'),
+        }
+        cls.addClassCleanup(cls.remove_replica)
+        connections['replica'].connect()
+        call_command('migrate', database='replica', verbosity=0)
+
+    @classmethod
+    def remove_replica(cls):
+        connections['replica'].close()
+        del connections['replica']
+        del connections.settings['replica']
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='testuser', password='testpassword')
+        self.client.force_authenticate(self.user)
+        self.task = Task.objects.create(title='Replicated', priority=8, user=self.user)
+        self.replicate()
+        # The replica has caught up, so the pin from the write above is moot
+        caching.get_cache().clear()
+
+    def replicate(self):
+        replica = connections['replica']
+        with replica.cursor() as cursor:
+            for model in (SubTask, Task, CustomUser):
+                cursor.execute(f'DELETE FROM {replica.ops.quote_name(model._meta.db_table)}')
+        for model in (CustomUser, Task):
+            model.objects.using('replica').bulk_create(list(model.objects.all()))
+
+    def write_unreplicated(self, title):
+        # A write the replica is still missing after the user's pin expired
+        Task.objects.create(title=title, priority=5, user=self.user)
+        self.unpin()
+
+    def unpin(self):
+        caching.get_cache().delete(caching.PIN_KEY.format(user_id=self.user.id))
+
+    def titles(self, url='/api/tasks/'):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return sorted(task['title'] for task in response.json()['results'])
+
+    def test_safe_reads_use_the_replica(self):
+        self.write_unreplicated('Not replicated yet')
+        with CaptureQueriesContext(connections['replica']) as replica, CaptureQueriesContext(connection) as primary:
+            self.assertEqual(self.titles(), ['Replicated'])
+        self.assertTrue(any('LQ_Tasks_task' in query['sql'] for query in replica.captured_queries))
+        self.assertFalse(any('LQ_Tasks_task' in query['sql'] for query in primary.captured_queries))
+        # Outside a request everything reads the primary
+        self.assertEqual(Task.objects.count(), 2)
+
+    def test_writes_go_to_the_primary_and_pin_the_user(self):
+        response = self.client.post('/api/tasks/', {'title': 'Written', 'priority': 5}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(Task.objects.using('replica').filter(title='Written').exists())
+        # Read-your-writes: the lagging replica is skipped while the pin lasts
+        self.assertEqual(self.titles(), ['Replicated', 'Written'])
+        self.assertEqual(self.titles('/api/async/tasks/'), ['Replicated', 'Written'])
+
+    def test_lagging_replica_is_read_once_the_pin_expires(self):
+        url = f'/api/tasks/{self.task.id}/'
+        self.client.patch(url, {'title': 'Renamed'}, format='json')
+        self.assertEqual(self.client.get(url).json()['title'], 'Renamed')
+
+        self.unpin()
+        self.assertEqual(self.client.get(url).json()['title'], 'Replicated')
+        self.replicate()
+        self.assertEqual(self.client.get(url).json()['title'], 'Renamed')
+
+    @override_settings(REPLICA_PIN_SECONDS=0)
+    def test_pin_lasts_replica_pin_seconds(self):
+        self.client.post('/api/tasks/', {'title': 'Written', 'priority': 5}, format='json')
+        self.assertEqual(self.titles(), ['Replicated'])
+
+    def test_pin_is_per_user(self):
+        other = CustomUser.objects.create_user(username='other', password='testpassword')
+        client = self.client_class()
+        client.force_authenticate(other)
+        client.post('/api/tasks/', {'title': 'Other', 'priority': 5}, format='json')
+        self.write_unreplicated('Not replicated yet')
+        self.assertEqual(self.titles(), ['Replicated'])
+
+    def test_async_views_read_the_replica(self):
+        self.write_unreplicated('Not replicated yet')
+        self.assertEqual(self.titles('/api/async/tasks/'), ['Replicated'])
+
+    def test_writes_outside_requests_pin_the_user(self):
+        # As run_scheduler or import_tasks write: no request, no middleware
+        self.assertEqual(self.titles(), ['Replicated'])
+        Task.objects.create(title='Imported', priority=5, user=self.user)
+        self.assertEqual(self.titles(), ['Imported', 'Replicated'])
+
+        Task.objects.filter(pk=self.task.pk).update(deadline=timezone.now() - timedelta(hours=1))
+        self.replicate()
+        self.unpin()
+        url = f'/api/tasks/{self.task.id}/'
+        self.assertEqual(self.client.get(url).json()['status'], 'CREATED')
+        # Bulk writes pin as well
+        scheduler.run_once()
+        self.assertEqual(self.client.get(url).json()['status'], 'FAILED')
+
+
+class WriteTransactionTests(APITestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # A file database outside the test transaction, so BEGIN really
+        # waits for the lock another connection holds
+        directory = tempfile.TemporaryDirectory()
+        cls.addClassCleanup(directory.cleanup)
+        cls.path = os.path.join(directory.name, 'locking.sqlite3')
+        connections.settings['locking'] = {
+            **connections.settings['default'], 'NAME': cls.path,
+            'OPTIONS': {'transaction_mode': 'IMMEDIATE', 'timeout': 0.05},
+        }
+        cls.addClassCleanup(cls.remove_database)
+        connections['locking'].connect()
+        with connections['locking'].cursor() as cursor:
+            cursor.execute('CREATE TABLE item (id INTEGER PRIMARY KEY)')
+
+    @classmethod
+    def remove_database(cls):
+        connections['locking'].close()
+        del connections['locking']
+        del connections.settings['locking']
+
+    def setUp(self):
+        self.holder = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        self.addCleanup(self.holder.close)
+        self.holder.execute('BEGIN IMMEDIATE')
+
+    def insert(self):
+        with write_atomic('locking'), connections['locking'].cursor() as cursor:
+            cursor.execute('INSERT INTO item DEFAULT VALUES')
+
+    @override_settings(DATABASE_LOCK_RETRIES=6, DATABASE_LOCK_RETRY_PAUSE=0.05)
+    def test_begin_is_retried_until_the_lock_is_free(self):
+        release = threading.Timer(0.3, self.holder.execute, ['ROLLBACK'])
+        release.start()
+        self.addCleanup(release.cancel)
+        self.insert()
+        self.assertEqual(self.holder.execute('SELECT COUNT(*) FROM item').fetchone(), (1,))
+
+    @override_settings(DATABASE_LOCK_RETRIES=2, DATABASE_LOCK_RETRY_PAUSE=0.01)
+    def test_retries_are_bounded(self):
+        with self.assertRaisesMessage(OperationalError, 'locked'):
+            self.insert()
+        self.assertFalse(connections['locking'].in_atomic_block)
+        self.holder.execute('ROLLBACK')
+        self.insert()
+
+    def test_profile_is_applied(self):
+        self.assertEqual(connection.transaction_mode, 'IMMEDIATE')
+        with connection.cursor() as cursor:
+            pragmas = [cursor.execute(f'PRAGMA {name}').fetchone()[0] for name in ('synchronous', 'cache_size')]
+        self.assertEqual(pragmas, [1, -20000])
+
+    def test_write_request_is_one_transaction(self):
+        user = CustomUser.objects.create_user(username='testuser', password='testpassword')
+        self.client.force_authenticate(user)
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.post('/api/tasks/', {'title': 'Task', 'priority': 5}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        statements = [query['sql'] for query in captured.captured_queries]
+        # Under the test transaction the outer block is a savepoint around every write
+        self.assertTrue(statements[0].startswith('SAVEPOINT'))
+        self.assertTrue(statements[-1].startswith('RELEASE SAVEPOINT'))
+        self.assertTrue(any(sql.startswith('INSERT INTO "LQ_Tasks_changelog"') for sql in statements))
+
+    @override_settings(WRITE_REQUEST_TRANSACTIONS=False)
+    def test_request_transactions_can_be_turned_off(self):
+        user = CustomUser.objects.create_user(username='testuser', password='testpassword')
+        self.client.force_authenticate(user)
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.post('/api/tasks/', {'title': 'Task', 'priority': 5}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(captured.captured_queries[0]['sql'].startswith('SAVEPOINT'))
+
+    def test_failed_write_request_is_rolled_back(self):
+        user = CustomUser.objects.create_user(username='testuser', password='testpassword')
+        self.client.force_authenticate(user)
+
+        def refuse(sender, **kwargs):
+            raise PermissionDenied('Refused after the insert.')
+        post_save.connect(refuse, sender=Task)
+        self.addCleanup(post_save.disconnect, refuse, sender=Task)
+        response = self.client.post('/api/tasks/', {'title': 'Task', 'priority': 5}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertFalse(Task.objects.exists())
+        self.assertFalse(ChangeLog.objects.exists())
+
+    def test_bench_writers(self):
+        path = self.enterContext(tempfile.NamedTemporaryFile('r', suffix='.json'))
+        call_command('bench_writers', '--processes', '2', '--requests', '6', '--json', path.name, stdout=StringIO())
+        report = json.load(path)
+        self.assertEqual([result['profile'] for result in report['profiles']], ['baseline', 'production'])
+        baseline, production = report['profiles']
+        self.assertEqual((baseline['retries'], baseline['request_transactions']), (0, False))
+        self.assertEqual((production['ok'], production['lock_errors'], production['other_errors']), (12, 0, 0))
@@ -0,0 +1,193 @@
+import json
+import logging
+from contextvars import ContextVar
+from functools import wraps
+from time import perf_counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.utils.functional import SimpleLazyObject, empty
+
+
+logger = logging.getLogger(__name__)
+_current = ContextVar('request_timer', default=None)
+
+
+class RequestTimer:
+    """
+    Time spent by one request: SQL (count, total and the statements, kept
+    up to REQUEST_TIMING_MAX_QUERIES), named phases such as serialize and
+    render, and the total. Phases do not overlap: SQL run inside a phase is
+    counted as db only.
+    """
+
+    def __init__(self):
+        self.started = perf_counter()
+        self.total = None
+        self.queries = 0
+        self.db = 0.0
+        self.statements = []
+        self.max_statements = getattr(settings, 'REQUEST_TIMING_MAX_QUERIES', 100)
+        self.phases = {}
+        self.active = set()
+
+    def add(self, name, elapsed):
+        self.phases[name] = self.phases.get(name, 0.0) + elapsed
+
+    def add_query(self, sql, elapsed):
+        self.queries += 1
+        self.db += elapsed
+        for name in self.active:
+            self.add(name, -elapsed)
+        if len(self.statements) < self.max_statements:
+            self.statements.append((elapsed, sql))
+
+    def finish(self):
+        self.total = perf_counter() - self.started
+
+    def server_timing(self):
+        other = self.total - self.db - sum(self.phases.values())
+        parts = [f'db;dur={self.db * 1000:.1f};desc="{self.queries} queries"']
+        parts.extend(f'{name};dur={elapsed * 1000:.1f}' for name, elapsed in self.phases.items())
+        parts.append(f'app;dur={max(other, 0) * 1000:.1f}')
+        parts.append(f'total;dur={self.total * 1000:.1f}')
+        return ', '.join(parts)
+
+    def record(self, request, response, slow):
+        data = {
+            'method': request.method, 'path': request.path, 'status': response.status_code,
+            'view': getattr(request.resolver_match, 'view_name', None),
+            'user': user_id(request),
+            'total_ms': round(self.total * 1000, 2), 'db_ms': round(self.db * 1000, 2), 'queries': self.queries,
+            **{f'{name}_ms': round(elapsed * 1000, 2) for name, elapsed in self.phases.items()},
+        }
+        if slow:
+            # Statements only, parameters may hold user data
+            data['slow'] = True
+            data['sql'] = [
+                {'ms': round(elapsed * 1000, 2), 'sql': sql}
+                for elapsed, sql in sorted(self.statements, key=lambda statement: -statement[0])[:10]
+            ]
+        return data
+
+
+def user_id(request):
+    # A session user nobody asked for is not loaded just for the log line
+    user = getattr(request, 'user', None)
+    if isinstance(user, SimpleLazyObject) and user._wrapped is empty:
+        return None
+    return getattr(user, 'pk', None)
+
+
+def measure(name, func, *args, **kwargs):
+    # Runs func as phase `name` of the current request; nested calls of the
+    # same phase are counted once
+    timer = _current.get()
+    if timer is None or name in timer.active:
+        return func(*args, **kwargs)
+    timer.active.add(name)
+    started = perf_counter()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        timer.add(name, perf_counter() - started)
+        timer.active.discard(name)
+
+
+def timed(name):
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            return measure(name, func, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def track_query(execute, sql, params, many, context):
+    timer = _current.get()
+    if timer is None:
+        return execute(sql, params, many, context)
+    started = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timer.add_query(sql, perf_counter() - started)
+
+
+def instrument(connection):
+    # Stays on the connection; costs one context lookup per query outside a
+    # timed request. Inserted first, since execute_wrapper() blocks pop the last
+    if track_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, track_query)
+
+
+@receiver(connection_created)
+def instrument_new_connection(sender, connection, **kwargs):
+    instrument(connection)
+
+
+class TimingMiddleware:
+    """
+    Times every request: SQL count and time, serialization, response
+    rendering and the total. The numbers go out as a Server-Timing header
+    (unless REQUEST_TIMING_HEADER is False) and as one JSON log line on the
+    LQ_Tasks.timing logger. Requests slower than REQUEST_TIMING_SLOW_MS are
+    logged as warnings with their slowest SQL statements. Streamed bodies
+    are produced after the response leaves, so they are not included.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.slow = getattr(settings, 'REQUEST_TIMING_SLOW_MS', 500) / 1000
+        self.header = getattr(settings, 'REQUEST_TIMING_HEADER', True)
+        for connection in connections.all(initialized_only=True):
+            instrument(connection)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        timer = RequestTimer()
+        token = _current.set(timer)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, timer)
+
+    async def __acall__(self, request):
+        timer = RequestTimer()
+        token = _current.set(timer)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, timer)
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered after the view returns
+        timer = _current.get()
+        if timer is not None:
+            started = perf_counter()
+
+            def rendered(response):
+                timer.add('render', perf_counter() - started)
+            response.add_post_render_callback(rendered)
+        return response
+
+    def finish(self, request, response, timer):
+        timer.finish()
+        if self.header:
+            response['Server-Timing'] = timer.server_timing()
+        slow = timer.total >= self.slow
+        level = logging.WARNING if slow else logging.INFO
+        if logger.isEnabledFor(level):
+            logger.log(level, json.dumps(timer.record(request, response, slow)))
+        return response
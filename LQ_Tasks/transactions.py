@@ -0,0 +1,68 @@
+import random
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, OperationalError, transaction
+
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def is_locked(error):
+    # SQLite reports both a busy and a locked database as "... is locked"
+    return isinstance(error, OperationalError) and 'locked' in str(error)
+
+
+class WriteAtomic(transaction.Atomic):
+    """
+    atomic() for a transaction that writes. With the IMMEDIATE transaction
+    mode SQLite takes the write lock at BEGIN, so that is where a busy
+    database shows up once the connection's timeout runs out. BEGIN is then
+    retried up to DATABASE_LOCK_RETRIES times with a growing, jittered
+    pause. Nothing has run in the transaction yet, so a retry never repeats
+    work. Nested blocks are savepoints and are not retried.
+    """
+
+    def __enter__(self):
+        if transaction.get_connection(self.using).in_atomic_block:
+            return super().__enter__()
+        retries = getattr(settings, 'DATABASE_LOCK_RETRIES', 3)
+        pause = getattr(settings, 'DATABASE_LOCK_RETRY_PAUSE', 0.05)
+        for attempt in range(retries + 1):
+            try:
+                return super().__enter__()
+            except OperationalError as error:
+                if not is_locked(error) or attempt == retries:
+                    raise
+            time.sleep(pause * 2 ** attempt * random.uniform(0.5, 1.5))
+
+
+def write_atomic(using=None, savepoint=True, durable=False):
+    # Same arguments as transaction.atomic(), and usable bare as a decorator
+    if callable(using):
+        return WriteAtomic(DEFAULT_DB_ALIAS, savepoint, durable)(using)
+    return WriteAtomic(using, savepoint, durable)
+
+
+class WriteTransactionMixin:
+    """
+    Runs every write request of a view in one write_atomic() block, so the
+    view and the signal receivers behind it (counters, change log, search
+    index) commit once, or not at all when the request fails. Turned off
+    by WRITE_REQUEST_TRANSACTIONS = False.
+    """
+
+    def wraps_request(self, request):
+        return request.method not in SAFE_METHODS and getattr(settings, 'WRITE_REQUEST_TRANSACTIONS', True)
+
+    def dispatch(self, request, *args, **kwargs):
+        if not self.wraps_request(request):
+            return super().dispatch(request, *args, **kwargs)
+        with write_atomic():
+            return super().dispatch(request, *args, **kwargs)
+
+    def handle_exception(self, exc):
+        # DRF turns API errors into responses, which would commit the block
+        if self.wraps_request(self.request):
+            transaction.set_rollback(True)
+        return super().handle_exception(exc)
@@ -1,7 +1,8 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from rest_framework_nested import routers as nested_routers
-from .views import TaskViewSet, SubTaskViewSet, NoteViewSet
+from .views import TaskViewSet, SubTaskViewSet, NoteViewSet, SearchView, SyncView, ExportView, ImportView
+from . import async_views
 
 
 router = DefaultRouter()
@@ -17,8 +18,34 @@ notes_router.register(r'notes', NoteViewSet, basename='task-note')
 subtask_notes_router = nested_routers.NestedSimpleRouter(tasks_router, r'subtasks', lookup='subtask')
 subtask_notes_router.register(r'notes', NoteViewSet, basename='subtask-note')
 
+# Read-only async endpoints mirroring the viewsets, for ASGI deployments
+async_urlpatterns = [
+    path('tasks/', async_views.AsyncTaskListView.as_view(), name='async-task-list'),
+    path('tasks/high_priority/', async_views.AsyncHighPriorityView.as_view(), name='async-task-high-priority'),
+    path('tasks/stats/', async_views.AsyncTaskStatsView.as_view(), name='async-task-stats'),
+    path('tasks/<int:pk>/', async_views.AsyncTaskDetailView.as_view(), name='async-task-detail'),
+    path('tasks/<int:pk>/subtasks/', async_views.AsyncTaskSubtasksView.as_view(), name='async-task-subtasks'),
+    path('tasks/<int:task_pk>/subtasks/<int:pk>/', async_views.AsyncSubTaskDetailView.as_view(), name='async-subtask-detail'),
+    path('tasks/<int:task_pk>/notes/', async_views.AsyncNoteListView.as_view(), name='async-task-note-list'),
+    path('tasks/<int:task_pk>/notes/<int:pk>/', async_views.AsyncNoteDetailView.as_view(), name='async-task-note-detail'),
+    path(
+        'tasks/<int:task_pk>/subtasks/<int:subtask_pk>/notes/',
+        async_views.AsyncNoteListView.as_view(), name='async-subtask-note-list',
+    ),
+    path(
+        'tasks/<int:task_pk>/subtasks/<int:subtask_pk>/notes/<int:pk>/',
+        async_views.AsyncNoteDetailView.as_view(), name='async-subtask-note-detail',
+    ),
+]
+
 
 urlpatterns = [
+    path('async/', include(async_urlpatterns)),
+    path('search/', SearchView.as_view(), name='search'),
+    path('sync/', SyncView.as_view(), name='sync'),
+    path('export/', ExportView.as_view(), name='export'),
+    path('import/', ImportView.as_view(), name='import'),
+    path('events/', async_views.EventStreamView.as_view(), name='events'),
     path('', include(router.urls)),
     path('', include(tasks_router.urls)),
     path('', include(notes_router.urls)),
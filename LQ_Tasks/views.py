@@ -3,24 +3,90 @@ from rest_framework.response import Response
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.exceptions import PermissionDenied
+from rest_framework.views import APIView
 from .models import Task, SubTask, Note
-from .serializers import TaskSerializer, SubTaskSerializer, NoteSerializer
+from .serializers import TaskSerializer, SubTaskSerializer, NoteSerializer, SyncTaskSerializer
+from .batch import TaskBatch
+from .caching import cached_response
+from .fastpath import values_plan
+from .fieldsets import SparseFieldsetMixin
+from .stats import user_statistics
+from .targets import target_owner_id
+from .transactions import WriteTransactionMixin
+from . import changes, search
+from .export import CSVRenderer, NDJSONRenderer, task_tree
+from .importer import NDJSONParser, TaskImport
+from rest_framework.parsers import MultiPartParser
+from django.http import StreamingHttpResponse
 from django.contrib.contenttypes.models import ContentType
 
 from itertools import chain
-from django.db.models import Q
 
 
-class TaskViewSet(viewsets.ModelViewSet):
+def plan_task_queryset(queryset, subtasks=True, notes=False):
+    # Load everything TaskSerializer touches up front, so a page of tasks
+    # costs the same number of queries no matter how many rows it holds
+    lookups = []
+    if subtasks:
+        lookups.append('subtasks')
+    if notes:
+        lookups.append('notes')
+        if subtasks:
+            lookups.append('subtasks__notes')
+    return queryset.prefetch_related(*lookups)
+
+
+def note_queryset(user, task_pk=None, subtask_pk=None):
+    # Notes carry their owner and parent task, so each nested route is
+    # one lookup on the (content_type, object_id) index
+    queryset = Note.objects.filter(user=user)
+    if subtask_pk is not None:
+        queryset = queryset.filter(content_type=ContentType.objects.get_for_model(SubTask), object_id=subtask_pk)
+        if task_pk is not None:
+            queryset = queryset.filter(task_id=task_pk)
+    elif task_pk is not None:
+        queryset = queryset.filter(content_type=ContentType.objects.get_for_model(Task), object_id=task_pk)
+    return queryset
+
+
+class TaskViewSet(WriteTransactionMixin, SparseFieldsetMixin, viewsets.ModelViewSet):
     serializer_class = TaskSerializer
     filter_backends = [filters.OrderingFilter]
     ordering_fields = ['priority', 'deadline']
     ordering = ['priority']
     permission_classes = [IsAuthenticated]
 
+    # Actions that never serialize a task do not need its relations loaded
+    unplanned_actions = ('destroy', 'subtasks')
+
     def get_queryset(self):
-        return Task.objects.filter(user=self.request.user)
+        queryset = Task.objects.filter(user=self.request.user)
+        if self.action in self.unplanned_actions:
+            return queryset
+        fields, expand = self.sparse_fieldset()
+        queryset = plan_task_queryset(
+            queryset, subtasks=fields is None or 'subtasks' in fields or 'subtasks' in expand, notes='notes' in expand,
+        )
+        # Paging reads the ordering columns of every row
+        return self.only_columns(queryset, fields, extra=self.ordering_fields)
     
+    def get_values_plan(self, serializer_class=None):
+        fields, expand = self.sparse_fieldset(serializer_class)
+        serializer_class = serializer_class or self.get_serializer_class()
+        return values_plan(serializer_class, fields, expand)
+
+    @cached_response
+    def list(self, request, *args, **kwargs):
+        # Read-only rows skip the serializer: values() plus precompiled converters
+        plan = self.get_values_plan()
+        if plan is None:
+            return super().list(request, *args, **kwargs)
+        queryset = plan.values(self.filter_queryset(self.get_queryset()), extra=self.ordering_fields)
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            return Response(plan.render(list(queryset)))
+        return self.get_paginated_response(plan.render(page))
+
     def perform_create(self, serializer):
         # Connect task to current user
         serializer.save(user=self.request.user)
@@ -32,75 +98,110 @@ class TaskViewSet(viewsets.ModelViewSet):
         return super().destroy(request, *args, **kwargs)
 
     @action(detail=False, methods=['get'])
+    @cached_response
     def high_priority(self, request):
         high_priority_tasks = self.get_queryset().filter(priority__gte=7)
+        plan = self.get_values_plan()
+        if plan is not None:
+            return Response(plan.render(list(plan.values(high_priority_tasks))))
         serializer = self.get_serializer(high_priority_tasks, many=True)
         return Response(serializer.data)
 
+    @action(detail=False, methods=['get'])
+    def stats(self, request):
+        # Served from maintained counters, never from the task table
+        return Response(user_statistics(request.user))
+
+    @action(detail=False, methods=['post'])
+    def batch(self, request):
+        operations = request.data
+        if not isinstance(operations, list):
+            return Response({'detail': 'Expected a list of operations.'}, status=status.HTTP_400_BAD_REQUEST)
+        batch = TaskBatch(request.user, operations)
+        results = batch.run()
+        response_status = status.HTTP_200_OK if batch.is_valid else status.HTTP_400_BAD_REQUEST
+        return Response(results, status=response_status)
+
     @action(detail=True, methods=['get', 'post'])
+    @cached_response
     def subtasks(self, request, pk=None):
         task = self.get_object()
         if request.method == 'GET':
+            # ?fields=/?expand= of this action describe the subtasks
             subtasks = task.subtasks.all()
-            serializer = SubTaskSerializer(subtasks, many=True)
+            plan = self.get_values_plan(SubTaskSerializer)
+            if plan is not None:
+                return Response(plan.render(list(plan.values(subtasks))))
+            fields, expand = self.sparse_fieldset(SubTaskSerializer)
+            if 'notes' in expand:
+                subtasks = subtasks.prefetch_related('notes')
+            serializer = SubTaskSerializer(subtasks, many=True, fields=fields, expand=expand)
             return Response(serializer.data)
         elif request.method == 'POST':
-            serializer = SubTaskSerializer(data=request.data)
+            # A list of subtasks is validated against the loaded task and bulk-created
+            many = isinstance(request.data, list)
+            serializer = SubTaskSerializer(data=request.data, many=many, context={'preloaded': {task.id: task}})
             if serializer.is_valid():
                 # Ensure that the task is associated with the correct user
-                if serializer.validated_data['task'] != task:
+                validated_data = serializer.validated_data if many else [serializer.validated_data]
+                if any(item['task'] != task for item in validated_data):
                     raise PermissionDenied("You cannot add subtasks to this task.")
                 serializer.save(task=task)
                 return Response(serializer.data, status=status.HTTP_201_CREATED)
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class SubTaskViewSet(viewsets.ModelViewSet):
+class SubTaskViewSet(WriteTransactionMixin, SparseFieldsetMixin, viewsets.ModelViewSet):
     queryset = SubTask.objects.all()
     serializer_class = SubTaskSerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        return SubTask.objects.filter(task__user=self.request.user)
+        queryset = SubTask.objects.filter(task__user=self.request.user)
+        if self.request.method != 'GET':
+            # Permission checks read the parent task
+            return queryset.select_related('task')
+        fields, expand = self.sparse_fieldset()
+        if 'notes' in expand:
+            queryset = queryset.prefetch_related('notes')
+        return self.only_columns(queryset, fields)
     
     def perform_create(self, serializer):
         task = serializer.validated_data['task']
-        if task.user != self.request.user:
+        if task.user_id != self.request.user.id:
             raise PermissionDenied("You do not have permission to add subtasks to this task.")
         serializer.save()
     
     def perform_update(self, serializer):
-        task = self.get_object().task
-        if task.user != self.request.user:
+        task = serializer.instance.task
+        if task.user_id != self.request.user.id:
             raise PermissionDenied("You do not have permission to update subtasks for this task.")
         serializer.save()
     
     def perform_destroy(self, instance):
-        if instance.task.user != self.request.user:
+        if instance.task.user_id != self.request.user.id:
             raise PermissionDenied("You do not have permission to delete this subtask.")
         instance.delete()
 
 
-class NoteViewSet(viewsets.ModelViewSet):
+class NoteViewSet(WriteTransactionMixin, SparseFieldsetMixin, viewsets.ModelViewSet):
     queryset = Note.objects.all()
     serializer_class = NoteSerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        user = self.request.user
-        task_content_type = ContentType.objects.get_for_model(Task)
-        subtask_content_type = ContentType.objects.get_for_model(SubTask)
-
-        queryset = Note.objects.filter(
-            Q(content_type=task_content_type, object_id__in=Task.objects.filter(user=user).values('id')) |
-            Q(content_type=subtask_content_type, object_id__in=SubTask.objects.filter(task__user=user).values('id'))
-        ).prefetch_related('content_object')
-
-        return queryset
+        try:
+            task_pk = int(self.kwargs['task_pk']) if 'task_pk' in self.kwargs else None
+            subtask_pk = int(self.kwargs['subtask_pk']) if 'subtask_pk' in self.kwargs else None
+        except ValueError:
+            return Note.objects.none()
+        fields, _ = self.sparse_fieldset()
+        return self.only_columns(note_queryset(self.request.user, task_pk, subtask_pk), fields)
 
     
     def create(self, request, *args, **kwargs):
-        serializer = self.get_serializer(data=request.data)
+        # A list creates many notes at once, resolving their targets in bulk
+        serializer = self.get_serializer(data=request.data, many=isinstance(request.data, list))
         if not serializer.is_valid():
             print(serializer.errors)  # Логируем ошибки сериализатора
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -120,25 +221,124 @@ class NoteViewSet(viewsets.ModelViewSet):
         return super().update(request, *args, **kwargs)
     
     def have_permission(self, obj):
-        if hasattr(obj, 'user'):
-            return obj.user == self.request.user
-        else:
-            return obj.task.user == self.request.user
+        return target_owner_id(obj) == self.request.user.id
 
     def perform_create(self, serializer):
-        obj = serializer.validated_data['content_object']
+        validated_data = serializer.validated_data
+        if not isinstance(validated_data, list):
+            validated_data = [validated_data]
 
-        if not self.have_permission(obj):
+        if not all(self.have_permission(item['content_object']) for item in validated_data):
             raise PermissionDenied("You do not have permission to add notes to this object.")
         serializer.save()
     
     def perform_update(self, serializer):
-        obj = serializer.validated_data['content_object']
-        if not self.have_permission(obj):
+        if serializer.instance.user_id != self.request.user.id:
             raise PermissionDenied("You do not have permission to update notes for this object.")
         serializer.save()
     
     def perform_destroy(self, instance):
-        if instance.content_object.user != self.request.user:
+        if instance.user_id != self.request.user.id:
             raise PermissionDenied("You do not have permission to delete this note.")
-        instance.delete()
\ No newline at end of file
+        instance.delete()
+
+
+class SearchView(APIView):
+    permission_classes = [IsAuthenticated]
+    max_limit = 100
+
+    def get(self, request):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({'q': ['This parameter is required.']}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = min(max(int(request.query_params.get('limit', 20)), 1), self.max_limit)
+        except ValueError:
+            limit = 20
+        return Response({'q': query, 'results': search.search(request.user, query, limit)})
+
+
+class SyncView(APIView):
+    """
+    Without `since`, returns every task, subtask and note of the user with a
+    sync token. With `since=<token>`, returns only the rows changed after
+    that token plus the ids deleted since, at most `limit` changes per call;
+    `has_more` tells the client to call again with the new token.
+    """
+    permission_classes = [IsAuthenticated]
+    max_limit = 1000
+
+    def get(self, request):
+        since = request.query_params.get('since')
+        try:
+            limit = min(max(int(request.query_params.get('limit', 500)), 1), self.max_limit)
+        except ValueError:
+            limit = 500
+
+        user = request.user
+        if since is None:
+            # Read the watermark first: anything written meanwhile is sent again next time
+            seq, has_more = changes.latest_seq(user), False
+            tasks, subtasks, notes = (
+                Task.objects.filter(user=user), SubTask.objects.filter(task__user=user), Note.objects.filter(user=user),
+            )
+            deleted = {}
+        else:
+            try:
+                seq = changes.decode_token(since)
+            except ValueError:
+                return Response({'since': ['Invalid sync token.']}, status=status.HTTP_400_BAD_REQUEST)
+            upserted, deleted, seq, has_more = changes.changes_since(user, seq, limit)
+            tasks = Task.objects.filter(user=user, id__in=upserted['task'])
+            subtasks = SubTask.objects.filter(task__user=user, id__in=upserted['subtask'])
+            notes = Note.objects.filter(user=user, id__in=upserted['note'])
+
+        return Response({
+            'token': changes.encode_token(seq),
+            'has_more': has_more,
+            'tasks': SyncTaskSerializer(tasks.order_by('id'), many=True).data,
+            'subtasks': SubTaskSerializer(subtasks.order_by('id'), many=True).data,
+            'notes': NoteSerializer(notes.order_by('id'), many=True).data,
+            'deleted': {f'{model}s': deleted.get(model, []) for model in ('task', 'subtask', 'note')},
+        })
+
+
+class ExportView(APIView):
+    """
+    Streams every task of the user with its subtasks and notes, as NDJSON
+    (default) or CSV with `?format=csv`.
+    """
+    permission_classes = [IsAuthenticated]
+    renderer_classes = [NDJSONRenderer, CSVRenderer]
+
+    def get(self, request, *args, **kwargs):
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(
+            renderer.stream(task_tree(request.user)), content_type=f'{renderer.media_type}; charset=utf-8',
+        )
+        response['Content-Disposition'] = f'attachment; filename="tasks.{renderer.format}"'
+        return response
+
+
+class ImportView(APIView):
+    """
+    Imports tasks with their subtasks and notes from NDJSON in the format
+    /api/export/ writes, sent as the body (application/x-ndjson) or as a
+    multipart `file` upload. Returns how many rows went in and the errors
+    of the lines that were skipped.
+    """
+    permission_classes = [IsAuthenticated]
+    parser_classes = [NDJSONParser, MultiPartParser]
+
+    def post(self, request, *args, **kwargs):
+        if request.content_type.startswith('multipart/'):
+            # Django spools large uploads to a temporary file, read line by line here
+            lines = request.FILES.get('file')
+            if lines is None:
+                return Response({'file': ['No file was submitted.']}, status=status.HTTP_400_BAD_REQUEST)
+        else:
+            lines = request.data
+        report = TaskImport(request.user).run(lines)
+        if report['imported']['tasks']:
+            return Response(report, status=status.HTTP_201_CREATED)
+        return Response(report)
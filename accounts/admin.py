@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import CustomUser
+from .models import CustomUser, PointsEvent
 
 
 class CustomUserAdmin(UserAdmin):
@@ -24,3 +24,18 @@ class CustomUserAdmin(UserAdmin):
 
 
 admin.site.register(CustomUser, CustomUserAdmin)
+
+
+@admin.register(PointsEvent)
+class PointsEventAdmin(admin.ModelAdmin):
+    # Журнал только для чтения: записи не меняются и не удаляются
+    list_display = ('user', 'amount', 'reason', 'applied', 'created_at')
+    list_filter = ('applied', 'created_at')
+    search_fields = ('user__username', 'reason')
+    ordering = ('-id',)
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
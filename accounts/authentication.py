@@ -0,0 +1,38 @@
+from datetime import datetime
+
+from django.db import router
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import CustomUser
+
+
+def token_claims(user):
+    # Copied into every token and read back without touching the user table
+    return {'username': user.username, 'date_joined': user.date_joined.isoformat()}
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """
+    Verifies the token signature and builds the user from its claims, so an
+    authenticated request costs no query and no password hashing. The user
+    is a CustomUser with only id, username and date_joined loaded; any other
+    field is fetched on first access. Deactivating a user takes effect when
+    their access token expires.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            values = {
+                'id': validated_token[api_settings.USER_ID_CLAIM],
+                'username': validated_token['username'],
+                'date_joined': datetime.fromisoformat(validated_token['date_joined']),
+            }
+        except (KeyError, TypeError, ValueError):
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+        field_names = [field.attname for field in CustomUser._meta.concrete_fields if field.attname in values]
+        return CustomUser.from_db(
+            router.db_for_read(CustomUser), field_names, [values[name] for name in field_names],
+        )
@@ -0,0 +1,156 @@
+import threading
+from bisect import bisect_left, insort
+from functools import lru_cache
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .models import CustomUser
+
+
+GLOBAL_BOARD = 'global'
+
+
+class InMemoryLeaderboard:
+    """
+    Ranked index kept in process memory: a sorted list of (-score, user_id)
+    per board plus a score lookup. Reads are binary searches; a score change
+    moves one entry. Every process keeps its own copy, so deployments with
+    several workers should point LEADERBOARD_BACKEND at a shared store with
+    the same methods.
+    """
+
+    def __init__(self):
+        self._boards = {}
+        self._lock = threading.RLock()
+
+    def is_loaded(self, board):
+        return board in self._boards
+
+    def load(self, board, scores):
+        entries = sorted((-score, user_id) for user_id, score in scores.items())
+        with self._lock:
+            self._boards[board] = (entries, dict(scores))
+
+    def clear(self):
+        with self._lock:
+            self._boards.clear()
+
+    def set_score(self, board, user_id, score):
+        with self._lock:
+            entries, scores = self._boards.setdefault(board, ([], {}))
+            self._discard(entries, scores, user_id)
+            insort(entries, (-score, user_id))
+            scores[user_id] = score
+
+    def increment(self, board, user_id, delta):
+        with self._lock:
+            scores = self._boards.setdefault(board, ([], {}))[1]
+            self.set_score(board, user_id, scores.get(user_id, 0) + delta)
+
+    def remove(self, board, user_id):
+        with self._lock:
+            if board in self._boards:
+                self._discard(*self._boards[board], user_id)
+
+    @staticmethod
+    def _discard(entries, scores, user_id):
+        score = scores.pop(user_id, None)
+        if score is not None:
+            del entries[bisect_left(entries, (-score, user_id))]
+
+    def size(self, board):
+        return len(self._boards.get(board, ((), {}))[1])
+
+    def score(self, board, user_id):
+        return self._boards.get(board, ((), {}))[1].get(user_id)
+
+    def top(self, board, limit, offset=0):
+        with self._lock:
+            entries = self._boards.get(board, ((), {}))[0]
+            return [self._entry(entries, index) for index in range(offset, min(offset + limit, len(entries)))]
+
+    def rank(self, board, user_id):
+        # Competition ranking: users with equal scores share a rank
+        with self._lock:
+            entries, scores = self._boards.get(board, ((), {}))
+            if user_id not in scores:
+                return None
+            return bisect_left(entries, (-scores[user_id],)) + 1
+
+    def around(self, board, user_id, radius):
+        with self._lock:
+            entries, scores = self._boards.get(board, ((), {}))
+            if user_id not in scores:
+                return []
+            position = bisect_left(entries, (-scores[user_id], user_id))
+            start, end = max(position - radius, 0), min(position + radius + 1, len(entries))
+            return [self._entry(entries, index) for index in range(start, end)]
+
+    @staticmethod
+    def _entry(entries, index):
+        negative_score, user_id = entries[index]
+        rank = bisect_left(entries, (negative_score,)) + 1
+        return {'rank': rank, 'user_id': user_id, 'score': -negative_score}
+
+
+@lru_cache(maxsize=None)
+def get_backend():
+    path = getattr(settings, 'LEADERBOARD_BACKEND', 'accounts.leaderboard.InMemoryLeaderboard')
+    return import_string(path)()
+
+
+def cohort_board(date_joined):
+    # Users who joined in the same month compete in one cohort
+    return f'cohort:{date_joined:%Y-%m}'
+
+
+def boards_for(date_joined):
+    return [GLOBAL_BOARD, cohort_board(date_joined)]
+
+
+def ensure_loaded(board):
+    """
+    Builds a board from the database the first time it is used. After
+    that it is kept up to date incrementally.
+    """
+    backend = get_backend()
+    if backend.is_loaded(board):
+        return backend
+    users = CustomUser.objects.filter(is_active=True)
+    if board != GLOBAL_BOARD:
+        year, month = map(int, board.split(':', 1)[1].split('-'))
+        users = users.filter(date_joined__year=year, date_joined__month=month)
+    backend.load(board, {
+        user_id: (level - 1) * CustomUser.POINTS_PER_LEVEL + points
+        for user_id, level, points in users.values_list('id', 'level', 'points')
+    })
+    return backend
+
+
+def record_score(user):
+    backend = get_backend()
+    for board in boards_for(user.date_joined):
+        if not backend.is_loaded(board):
+            continue
+        if user.is_active:
+            backend.set_score(board, user.pk, user.total_points)
+        else:
+            backend.remove(board, user.pk)
+
+
+def record_awards(awards):
+    """
+    Applies point awards given as {(user_id, date_joined): amount}.
+    """
+    backend = get_backend()
+    for (user_id, date_joined), amount in awards.items():
+        for board in boards_for(date_joined):
+            if backend.is_loaded(board) and backend.score(board, user_id) is not None:
+                backend.increment(board, user_id, amount)
+
+
+def forget(user_id, date_joined):
+    backend = get_backend()
+    for board in boards_for(date_joined):
+        backend.remove(board, user_id)
@@ -0,0 +1,65 @@
+import base64
+import time
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.utils.functional import SimpleLazyObject
+from rest_framework.authentication import BasicAuthentication, SessionAuthentication
+from rest_framework.request import Request
+
+from accounts.authentication import StatelessJWTAuthentication
+from accounts.models import CustomUser
+from accounts.serializers import TokenSerializer
+
+
+class Command(BaseCommand):
+    help = 'Measure the per-request cost of Basic, session and JWT authentication'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('password')
+        parser.add_argument('--requests', type=int, default=20)
+
+    def handle(self, *args, **options):
+        user = CustomUser.objects.filter(username=options['username']).first()
+        if user is None or not user.check_password(options['password']):
+            raise CommandError('Invalid username or password')
+
+        factory = RequestFactory()
+        credentials = base64.b64encode(f'{options["username"]}:{options["password"]}'.encode()).decode()
+        token = TokenSerializer.get_token(user).access_token
+        client = Client()
+        client.force_login(user)
+        session_key = client.cookies[settings.SESSION_COOKIE_NAME].value
+        session_store = import_module(settings.SESSION_ENGINE).SessionStore
+
+        def session_request():
+            # What SessionMiddleware and AuthenticationMiddleware attach
+            request = factory.get('/')
+            request.session = session_store(session_key)
+            request.user = SimpleLazyObject(lambda: get_user(request))
+            return request
+
+        schemes = [
+            ('Basic', BasicAuthentication, lambda: factory.get('/', HTTP_AUTHORIZATION=f'Basic {credentials}')),
+            ('Session', SessionAuthentication, session_request),
+            ('JWT', StatelessJWTAuthentication, lambda: factory.get('/', HTTP_AUTHORIZATION=f'Bearer {token}')),
+        ]
+        self.stdout.write(f'{"scheme":<10}{"ms/request":>12}{"queries/request":>18}')
+        for name, authentication_class, make_request in schemes:
+            with CaptureQueriesContext(connection) as ctx:
+                started = time.perf_counter()
+                for _ in range(options['requests']):
+                    request = Request(make_request(), authenticators=[authentication_class()])
+                    if not request.user.is_authenticated:
+                        raise CommandError(f'{name} authentication failed')
+                elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f'{name:<10}{elapsed * 1000 / options["requests"]:>12.3f}'
+                f'{len(ctx.captured_queries) / options["requests"]:>18.1f}'
+            )
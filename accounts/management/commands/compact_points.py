@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts.points import compact_points
+
+
+class Command(BaseCommand):
+    help = 'Apply pending points ledger rows to user balances in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Keep running and compact every INTERVAL seconds')
+
+    def handle(self, *args, **options):
+        while True:
+            total = 0
+            while True:
+                applied = compact_points(options['batch_size'])
+                total += applied
+                if applied < options['batch_size']:
+                    break
+            self.stdout.write(f'Applied {total} points events')
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
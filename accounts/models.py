@@ -23,9 +23,21 @@ class CustomUser(AbstractUser):
     bio = models.TextField(blank=True, null=True)
     notification_preferences = models.JSONField(default=dict)
 
+    POINTS_PER_LEVEL = 100
+
     def increase_level(self):
         self.level += 1
-        self.points -= 100
+        self.points -= self.POINTS_PER_LEVEL
+
+    def normalize_level(self):
+        # Переносим все накопленные очки в уровни за один раз
+        if self.points >= self.POINTS_PER_LEVEL:
+            self.level += self.points // self.POINTS_PER_LEVEL
+            self.points %= self.POINTS_PER_LEVEL
+
+    @property
+    def total_points(self):
+        return (self.level - 1) * self.POINTS_PER_LEVEL + self.points
     
 
     def can_manage_task(self, task):
@@ -33,4 +45,21 @@ class CustomUser(AbstractUser):
     
 
     def __str__(self):
-        return f'[{self.role}] - {self.username}'
\ No newline at end of file
+        return f'[{self.role}] - {self.username}'
+
+
+class PointsEvent(models.Model):
+    # Журнал начислений: записи только добавляются, баланс пользователя считается из них
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='points_events')
+    amount = models.PositiveIntegerField()
+    reason = models.CharField(max_length=255, blank=True)
+    applied = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['applied', 'id'], name='points_event_pending_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.user} +{self.amount} ({self.reason})'
@@ -0,0 +1,68 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Sum
+from django.db.models.functions import Mod
+
+from . import leaderboard
+from .models import CustomUser, PointsEvent
+
+
+POINTS_PER_LEVEL = CustomUser.POINTS_PER_LEVEL
+
+
+def level_for(total_points):
+    return 1 + total_points // POINTS_PER_LEVEL
+
+
+def apply_to_balance(user_id, amount):
+    # One UPDATE computes both columns from the stored row, so concurrent
+    # awards cannot overwrite each other and any number of levels is carried
+    total = (F('level') - 1) * POINTS_PER_LEVEL + F('points') + amount
+    return CustomUser.objects.filter(pk=user_id).update(
+        level=1 + total / POINTS_PER_LEVEL,
+        points=Mod(total, POINTS_PER_LEVEL),
+    )
+
+
+def award_points(user, amount, reason='', deferred=None):
+    """
+    Records `amount` points for `user` in the ledger.
+
+    By default the balance is updated right away. With `deferred=True` (or
+    settings.POINTS_DEFERRED) only the ledger row is written and
+    compact_points() applies it later, so heavy award traffic never waits
+    on the user row. Instances already in memory are not refreshed.
+    """
+    if amount <= 0:
+        raise ValueError('Points amount must be positive')
+    if deferred is None:
+        deferred = getattr(settings, 'POINTS_DEFERRED', False)
+    with transaction.atomic():
+        event = PointsEvent.objects.create(user_id=user.pk, amount=amount, reason=reason, applied=not deferred)
+        if not deferred:
+            apply_to_balance(user.pk, amount)
+            awards = {(user.pk, user.date_joined): amount}
+            transaction.on_commit(lambda: leaderboard.record_awards(awards))
+    return event
+
+
+def compact_points(batch_size=1000):
+    """
+    Applies up to `batch_size` pending ledger rows, with one UPDATE per
+    user. Returns the number of rows applied.
+    """
+    with transaction.atomic():
+        ids = list(PointsEvent.objects.filter(applied=False).order_by('id').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return 0
+        totals = PointsEvent.objects.filter(id__in=ids).values_list(
+            'user', 'user__date_joined',
+        ).annotate(total=Sum('amount')).order_by()
+        awards = {}
+        for user_id, date_joined, total in totals:
+            apply_to_balance(user_id, total)
+            awards[(user_id, date_joined)] = total
+        PointsEvent.objects.filter(id__in=ids).update(applied=True)
+        transaction.on_commit(lambda: leaderboard.record_awards(awards))
+    return len(ids)
+
@@ -1,9 +1,21 @@
-from django.db.models.signals import pre_save
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
 from .models import CustomUser
+from . import leaderboard
 
 
 @receiver(pre_save, sender=CustomUser)
 def check_points(sender, instance, **kwargs):
-    if instance.points >= 100:
-        instance.increase_level()
\ No newline at end of file
+    instance.normalize_level()
+
+
+@receiver(post_save, sender=CustomUser)
+def update_leaderboard(sender, instance, **kwargs):
+    transaction.on_commit(lambda: leaderboard.record_score(instance))
+
+
+@receiver(post_delete, sender=CustomUser)
+def remove_from_leaderboard(sender, instance, **kwargs):
+    user_id, date_joined = instance.pk, instance.date_joined
+    transaction.on_commit(lambda: leaderboard.forget(user_id, date_joined))
@@ -1,7 +1,15 @@
 # accounts/tests.py
+from io import StringIO
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from rest_framework.test import APIClient
 from rest_framework import status
+from .models import CustomUser, PointsEvent
+from .points import award_points, level_for
+from . import leaderboard
+from .leaderboard import InMemoryLeaderboard
 
 class UserRegistrationTests(TestCase):
     def setUp(self):
@@ -30,3 +38,154 @@ class UserRegistrationTests(TestCase):
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertIn('non_field_errors', response.data)
         self.assertEqual(response.data['non_field_errors'][0], 'Passwords do not match')
+
+
+class PointsLedgerTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='player', password='password123')
+
+    def test_large_award_carries_every_level(self):
+        award_points(self.user, 350, reason='boss')
+        self.user.refresh_from_db()
+        self.assertEqual((self.user.level, self.user.points), (4, 50))
+        self.assertEqual(self.user.total_points, 350)
+        self.assertEqual(level_for(self.user.total_points), self.user.level)
+
+    def test_awards_do_not_lose_updates_from_stale_instances(self):
+        stale = CustomUser.objects.get(pk=self.user.pk)
+        award_points(self.user, 60)
+        award_points(stale, 60)
+        self.user.refresh_from_db()
+        self.assertEqual((self.user.level, self.user.points), (2, 20))
+        self.assertEqual(PointsEvent.objects.filter(user=self.user).count(), 2)
+
+    def test_deferred_awards_are_applied_by_compaction(self):
+        other = CustomUser.objects.create_user(username='other', password='password123')
+        for _ in range(3):
+            award_points(self.user, 70, deferred=True)
+        award_points(other, 30, deferred=True)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.total_points, 0)
+
+        call_command('compact_points', batch_size=2, stdout=StringIO())
+        self.user.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual((self.user.level, self.user.points), (3, 10))
+        self.assertEqual(other.total_points, 30)
+        self.assertFalse(PointsEvent.objects.filter(applied=False).exists())
+
+    def test_direct_assignment_is_normalized_in_closed_form(self):
+        self.user.points = 250
+        self.user.save()
+        self.assertEqual((self.user.level, self.user.points), (3, 50))
+
+    def test_rejects_non_positive_awards(self):
+        with self.assertRaises(ValueError):
+            award_points(self.user, 0)
+
+
+class LeaderboardTests(TestCase):
+    def setUp(self):
+        leaderboard.get_backend().clear()
+        self.client = APIClient()
+        self.users = [
+            CustomUser.objects.create_user(username=f'player{i}', password='password123', points=points, level=level)
+            for i, (level, points) in enumerate([(1, 10), (3, 0), (2, 50), (3, 0), (1, 0)])
+        ]
+        self.client.force_authenticate(self.users[0])
+
+    def test_backend_ranks_ties_together(self):
+        board = InMemoryLeaderboard()
+        board.load('b', {1: 10, 2: 30, 3: 30, 4: 5})
+        self.assertEqual([entry['rank'] for entry in board.top('b', 10)], [1, 1, 3, 4])
+        self.assertEqual(board.rank('b', 1), 3)
+        board.increment('b', 4, 100)
+        self.assertEqual(board.rank('b', 4), 1)
+        self.assertEqual([entry['user_id'] for entry in board.around('b', 2, 1)], [4, 2, 3])
+        board.remove('b', 2)
+        self.assertEqual(board.size('b'), 3)
+
+    def test_top_and_rank(self):
+        response = self.client.get('/api/accounts/leaderboard/?limit=3')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['size'], 5)
+        self.assertEqual(
+            [(entry['rank'], entry['username']) for entry in response.data['results']],
+            [(1, 'player1'), (1, 'player3'), (3, 'player2')],
+        )
+        response = self.client.get('/api/accounts/leaderboard/me/?radius=1')
+        self.assertEqual(response.data['rank'], 4)
+        self.assertEqual([entry['username'] for entry in response.data['neighbours']], ['player2', 'player0', 'player4'])
+
+    def test_awards_update_the_index_without_reranking_the_table(self):
+        self.client.get('/api/accounts/leaderboard/')
+        with self.captureOnCommitCallbacks(execute=True):
+            award_points(self.users[4], 500)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/accounts/leaderboard/me/?radius=0')
+        self.assertEqual(response.data['rank'], 5)
+        self.assertFalse(any('ORDER BY' in query['sql'] for query in ctx.captured_queries))
+
+        self.client.force_authenticate(self.users[4])
+        response = self.client.get('/api/accounts/leaderboard/me/')
+        self.assertEqual((response.data['rank'], response.data['score']), (1, 500))
+
+    def test_new_users_join_the_loaded_board(self):
+        self.client.get('/api/accounts/leaderboard/')
+        with self.captureOnCommitCallbacks(execute=True):
+            CustomUser.objects.create_user(username='newbie', password='password123', points=99)
+        response = self.client.get('/api/accounts/leaderboard/?cohort=1')
+        self.assertEqual(response.data['size'], 6)
+
+
+class TokenAuthenticationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = CustomUser.objects.create_user(username='player', password='password123')
+
+    def obtain(self):
+        response = self.client.post(
+            '/api/accounts/token/', {'username': 'player', 'password': 'password123'}, format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_token_requests_do_not_load_the_user(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.obtain()["access"]}')
+        self.client.post('/api/tasks/', {'title': 'Task', 'priority': 5}, format='json')
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/tasks/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([task['title'] for task in response.data['results']], ['Task'])
+        self.assertFalse([query for query in ctx.captured_queries if 'accounts_customuser' in query['sql']])
+
+    def test_token_user_carries_claims(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.obtain()["access"]}')
+        response = self.client.get('/api/accounts/leaderboard/me/?cohort=1')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['board'], leaderboard.cohort_board(self.user.date_joined))
+
+    def test_refresh_and_verify(self):
+        tokens = self.obtain()
+        response = self.client.post('/api/accounts/token/refresh/', {'refresh': tokens['refresh']}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.post('/api/accounts/token/verify/', {'token': response.data['access']}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.post('/api/accounts/token/verify/', {'token': 'not-a-token'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_invalid_token_is_rejected(self):
+        access = self.obtain()['access']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access[:-2]}xx')
+        self.assertEqual(self.client.get('/api/tasks/').status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_wrong_password_gets_no_token(self):
+        response = self.client.post(
+            '/api/accounts/token/', {'username': 'player', 'password': 'wrong'}, format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command('bench_auth', 'player', 'password123', '--requests', '1', stdout=out)
+        self.assertIn('JWT', out.getvalue())
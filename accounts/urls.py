@@ -1,6 +1,12 @@
 from django.urls import path
-from .views import RegisterView
+from rest_framework_simplejwt.views import TokenRefreshView, TokenVerifyView
+from .views import RegisterView, TokenView, LeaderboardView, LeaderboardRankView
 
 urlpatterns = [
     path('register/', RegisterView.as_view(), name='register'),
+    path('token/', TokenView.as_view(), name='token'),
+    path('token/refresh/', TokenRefreshView.as_view(), name='token-refresh'),
+    path('token/verify/', TokenVerifyView.as_view(), name='token-verify'),
+    path('leaderboard/', LeaderboardView.as_view(), name='leaderboard'),
+    path('leaderboard/me/', LeaderboardRankView.as_view(), name='leaderboard-me'),
 ]
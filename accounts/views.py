@@ -1,11 +1,68 @@
 from django.shortcuts import render
 from .models import CustomUser
-from .serializers import UserSerializer, UserRegistrationSerializer
+from .serializers import UserSerializer, UserRegistrationSerializer, TokenSerializer
 from rest_framework import generics
 from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework_simplejwt.views import TokenObtainPairView
+from . import leaderboard
 
 
 class RegisterView(generics.CreateAPIView):
     queryset = CustomUser.objects.all()
     serializer_class = UserRegistrationSerializer
     permission_classes = [AllowAny]
+
+
+class TokenView(TokenObtainPairView):
+    # The password is checked once here; later requests only verify the token
+    serializer_class = TokenSerializer
+
+
+class LeaderboardMixin:
+    max_limit = 100
+
+    def get_board(self, request):
+        if request.query_params.get('cohort'):
+            return leaderboard.cohort_board(request.user.date_joined)
+        return leaderboard.GLOBAL_BOARD
+
+    def get_int_param(self, request, name, default, maximum=None):
+        try:
+            value = max(int(request.query_params.get(name, default)), 0)
+        except ValueError:
+            return default
+        return value if maximum is None else min(value, maximum)
+
+    def with_usernames(self, entries):
+        # The ranking comes from the index; only the visible rows hit the DB
+        usernames = dict(CustomUser.objects.filter(
+            id__in=[entry['user_id'] for entry in entries]
+        ).values_list('id', 'username'))
+        return [{**entry, 'username': usernames.get(entry['user_id'])} for entry in entries]
+
+
+class LeaderboardView(LeaderboardMixin, APIView):
+    def get(self, request):
+        board = self.get_board(request)
+        backend = leaderboard.ensure_loaded(board)
+        entries = backend.top(
+            board, self.get_int_param(request, 'limit', 10, self.max_limit),
+            self.get_int_param(request, 'offset', 0),
+        )
+        return Response({'board': board, 'size': backend.size(board), 'results': self.with_usernames(entries)})
+
+
+class LeaderboardRankView(LeaderboardMixin, APIView):
+    def get(self, request):
+        board = self.get_board(request)
+        backend = leaderboard.ensure_loaded(board)
+        radius = self.get_int_param(request, 'radius', 5, self.max_limit)
+        return Response({
+            'board': board,
+            'size': backend.size(board),
+            'rank': backend.rank(board, request.user.id),
+            'score': backend.score(board, request.user.id),
+            'neighbours': self.with_usernames(backend.around(board, request.user.id, radius)),
+        })
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+from datetime import timedelta
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -48,19 +49,29 @@ AUTH_USER_MODEL = 'accounts.CustomUser'
 
 
 REST_FRAMEWORK = {
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'LQ_Tasks.pagination.KeysetPagination',
     'PAGE_SIZE': 10,
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.BasicAuthentication',
+        # Signature check only; Basic re-hashes the password on every request
+        'accounts.authentication.StatelessJWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
+        'rest_framework.authentication.BasicAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
 }
 
+SIMPLE_JWT = {
+    'ACCESS_TOKEN_LIFETIME': timedelta(minutes=15),
+    'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
+    'AUTH_HEADER_TYPES': ('Bearer',),
+}
+
 
 MIDDLEWARE = [
+    # First, so its total covers the rest of the stack
+    'LQ_Tasks.timing.TimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -68,6 +79,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'LQ_Tasks.replicas.ReplicaMiddleware',
 ]
 
 ROOT_URLCONF = 'lifequest.urls'
@@ -98,9 +110,75 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Writers take the lock at BEGIN and queue there, instead of
+            # failing when a transaction that has read tries to write
+            'transaction_mode': 'IMMEDIATE',
+            # Seconds a connection waits for the lock (SQLite busy_timeout)
+            'timeout': 5,
+            'init_command': (
+                # Readers and the writer no longer block each other
+                'PRAGMA journal_mode=WAL;'
+                # fsync at checkpoints only; safe against crashes of the app
+                'PRAGMA synchronous=NORMAL;'
+                'PRAGMA mmap_size=268435456;'
+                # Page cache per connection, in KiB when negative
+                'PRAGMA cache_size=-20000;'
+            ),
+        },
     }
 }
 
+# Attempts to get the write lock again, with a growing pause starting at
+# DATABASE_LOCK_RETRY_PAUSE seconds, once the timeout above runs out
+DATABASE_LOCK_RETRIES = 3
+DATABASE_LOCK_RETRY_PAUSE = 0.05
+
+# Run each write request of the API in one write_atomic() transaction;
+# False leaves the views in autocommit
+WRITE_REQUEST_TRANSACTIONS = True
+
+# Aliases in DATABASES that replicate 'default'. Safe requests read
+# REPLICA_APPS models from one of them; writes and the reads that follow a
+# user's write, for REPLICA_PIN_SECONDS, go to 'default'. The pin has to
+# outlast the replication lag.
+DATABASE_REPLICAS = []
+DATABASE_ROUTERS = ['LQ_Tasks.replicas.ReplicaRouter']
+REPLICA_APPS = ['LQ_Tasks']
+REPLICA_PIN_SECONDS = 5
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# Alias of the cache holding per-user data versions and cached task responses
+TASKS_RESPONSE_CACHE = 'default'
+TASKS_RESPONSE_CACHE_TIMEOUT = 300
+
+# Per-request timing: Server-Timing header and a JSON log line per request
+REQUEST_TIMING_HEADER = True
+REQUEST_TIMING_SLOW_MS = 500
+# Statements kept per request for the slow-request log
+REQUEST_TIMING_MAX_QUERIES = 100
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        # Every request in production, only slow ones while developing
+        'LQ_Tasks.timing': {'handlers': ['console'], 'level': 'WARNING' if DEBUG else 'INFO', 'propagate': False},
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators